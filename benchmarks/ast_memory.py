@@ -0,0 +1,54 @@
+"""Peak memory (tracemalloc) of the AST as slotted objects against the flat
+arena (mylang/ast/arena.py), for parsing alone and for a whole compilation.
+
+    python benchmarks/ast_memory.py [copies of the example]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from parser import generate_source
+from resolver import many_symbols
+
+from mylang.compiler import compile_code
+from mylang.parser.code_parser import CodeParser
+from mylang.parser.fast_lexer import scan
+
+
+def measure(name: str, function):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>24}: {current / 2**20:7.1f} MiB kept, {peak / 2**20:7.1f} MiB peak, {seconds:6.2f} s")
+    return result
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    source = generate_source(copies)
+    print(f"{len(source) / 1024 / 1024:.1f} MiB of source")
+
+    code_parser = CodeParser("fast", "pratt")
+    tokens = scan(source)
+    module = measure("parse to objects", lambda: code_parser.parser.parse(tokens))
+    del module
+    arena = measure("parse to arena", lambda: code_parser.parser.parse_arena(tokens))
+    print(f"{len(arena)} nodes, {len(arena.strings)} distinct names")
+    del arena, tokens
+
+    # code generation keeps the whole llvmlite module, use a smaller program
+    # (the repeated example redeclares its functions)
+    source = many_symbols(max(copies // 10, 1))
+    for arena in (False, True):
+        name = "compile with arena" if arena else "compile with objects"
+        module_ir = measure(name, lambda: compile_code(source, code_parser=code_parser, arena=arena))
+        del module_ir
+
+
+if __name__ == "__main__":
+    main()
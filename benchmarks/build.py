@@ -0,0 +1,72 @@
+"""Multi-file builds (mylang/build.py): a cold build with one and with
+several worker processes, a build without changes, and rebuilds after
+editing a function body and a function signature of the first file.
+
+    python benchmarks/build.py [files] [functions per file]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from mylang.build import BuildOptions, build_project
+from mylang.jit import create_execution_engine, run_main
+
+
+def write_project(directory: str, files: int, functions: int):
+    """`files` modules calling into the first one, so all but the first
+    can be compiled in parallel."""
+    for index in range(files):
+        lines = ["import m0;"] if index else []
+        for function in range(functions):
+            lines.append(f"function m{index}_f{function}(a: int, b: int) -> int {{")
+            lines.extend(f"v{local}: int = a * {local} + b;" for local in range(20))
+            total = " + ".join(f"v{local}" for local in range(20))
+            if index:
+                total += f" + m0_f{function}(a, 1)"
+            lines.append(f"return {total};")
+            lines.append("}")
+        with open(os.path.join(directory, f"m{index}.mylang"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+    with open(os.path.join(directory, "main.mylang"), "w") as f:
+        f.write("".join(f"import m{index};\n" for index in range(files)))
+        f.write(f"print(m{files - 1}_f0(1, 2));\n")
+
+
+def edit(path: str, old: str, new: str):
+    with open(path) as f:
+        code = f.read()
+    with open(path, "w") as f:
+        f.write(code.replace(old, new, 1))
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    functions = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    jobs = os.cpu_count() or 1
+    options = BuildOptions(parser="pratt")
+    directory = tempfile.mkdtemp()
+    write_project(directory, files, functions)
+    entry = os.path.join(directory, "main.mylang")
+
+    def build(name: str, jobs: int, build_directory: str):
+        start = time.perf_counter()
+        llvm_module, report = build_project(entry, build_directory, options, jobs)
+        print(f"{name:>22}: {time.perf_counter() - start:6.2f} s, {report}")
+        return llvm_module
+
+    print(f"{files} files with {functions} functions each")
+    build("cold, -j 1", 1, os.path.join(directory, "serial"))
+    llvm_module = build(f"cold, -j {jobs}", jobs, os.path.join(directory, "parallel"))
+    build("no changes", jobs, os.path.join(directory, "parallel"))
+    edit(os.path.join(directory, "m0.mylang"), "a * 0 + b", "a * 0 + b + 1")
+    build("body of m0 edited", jobs, os.path.join(directory, "parallel"))
+    edit(os.path.join(directory, "m0.mylang"), "m0_f0(a: int, b: int)", "m0_f0(b: int, a: int)")
+    build("signature of m0 edited", jobs, os.path.join(directory, "parallel"))
+
+    engine = create_execution_engine(llvm_module)
+    assert run_main(engine) == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Throughput of many small programs: a fresh compilation per program
+(parser, module, target machine and pass managers built every time)
+against `mylang.api.Compiler.compile_many`, from one thread and from a
+thread pool.
+
+    python benchmarks/compile_many.py [programs]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mylang.api import Compiler
+from mylang.compiler import compile_code
+from mylang.emitter import emit_bytes
+from mylang.optimizer import optimize_module
+from mylang.parser.code_parser import CodeParser
+
+
+def snippet(index: int) -> str:
+    return f"""
+function scale(a: int) -> int {{
+    return a * {index} + {index % 7};
+}}
+function pick(a: int, b: int) -> int {{
+    if (a > b) {{
+        return scale(a);
+    }}
+    return scale(b);
+}}
+result: int = pick({index}, {index % 13});
+print(result);
+"""
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    threads = 4
+    sources = [snippet(index) for index in range(count)]
+    # one broken program, its error must not affect the others
+    sources[count // 2] = "function broken( -> int {"
+
+    def fresh(source: str) -> bytes:
+        module_ir = compile_code(source, code_parser=CodeParser("fast", "pratt"))
+        return emit_bytes(optimize_module(module_ir, "2")[0], "obj")
+
+    start = time.perf_counter()
+    expected = []
+    for source in sources:
+        try:
+            expected.append(fresh(source))
+        except Exception:
+            expected.append(None)
+    baseline = time.perf_counter() - start
+    print(f"{'fresh per program':>22}: {count / baseline:7.0f} programs/s")
+
+    compiler = Compiler(emit="obj", opt_level="2")
+    start = time.perf_counter()
+    results = compiler.compile_many(sources)
+    seconds = time.perf_counter() - start
+    print(f"{'compile_many':>22}: {count / seconds:7.0f} programs/s ({baseline / seconds:.1f}x)")
+    assert [result.artifact for result in results] == expected
+    assert [result.ok for result in results].count(False) == 1
+
+    batches = [sources[index::threads] for index in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        batch_results = list(executor.map(compiler.compile_many, batches))
+    seconds = time.perf_counter() - start
+    print(f"{f'{threads} threads, {os.cpu_count()} CPUs':>22}: {count / seconds:7.0f} programs/s ({baseline / seconds:.1f}x)")
+    for index, batch in enumerate(batch_results):
+        assert [result.artifact for result in batch] == expected[index::threads]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Code generation and LLVM time (-O0, to an object file) of a generated
+program full of constant expressions and dead branches, with and without
+the AST folding pass (mylang/folding.py).
+
+    python benchmarks/constant_folding.py [scale]
+"""
+import os
+import subprocess
+import sys
+import time
+
+from llvmlite import ir
+
+from mylang.compiler import create_main
+from mylang.emitter import emit_bytes
+from mylang.optimizer import count_instructions
+from mylang.parser.code_parser import CodeParser
+from mylang.resolver import annotate_symbols, assign_slots, resolve_symbols
+from mylang.symbol_table import create_symbol_table
+from mylang.target import create_target_machine, parse_module, set_module_target
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SECONDS_PER_DAY = 60 * 60 * 24
+
+
+def constant_heavy(scale: int) -> str:
+    """`scale` functions computing with constants, behind `if`s on
+    configuration constants as generated code often does. The operators
+    have no precedence, they group from the left."""
+    lines = []
+    for index in range(scale):
+        lines.append(f"function f{index}(n: int) -> int {{")
+        lines.append("    scale: int = 60 * 60 * 24;")
+        lines.append("    bonus: int = 1000 / 8;")
+        lines.append("    if (3 > 5) {")
+        lines.append(f"        print(n, {index} * 1000 + 7);")
+        lines.append("    }")
+        lines.append("    if (2 * 2 == 4) {")
+        lines.append("        return n * scale + bonus;")
+        lines.append("    } else {")
+        lines.append(f"        return 0 - 1 * {index};")
+        lines.append("    }")
+        lines.append("    print(n);")
+        lines.append("    return 0;")
+        lines.append("}")
+        lines.append(f"print(f{index}({index}));")
+    return "\n".join(lines) + "\n"
+
+
+def generate(source: str, fold: bool) -> ir.Module:
+    module = CodeParser("fast", "pratt").parse(source)
+    symbol_table = create_symbol_table(module)
+    if fold:
+        resolve_symbols(module, symbol_table)
+    else:
+        assign_slots(symbol_table)
+        annotate_symbols(module, symbol_table)
+    module_ir = ir.Module(name="module")
+    set_module_target(module_ir, create_target_machine())
+    return create_main(module_ir, module.body, symbol_table)
+
+
+def measure(source: str, fold: bool):
+    start = time.perf_counter()
+    module_ir = generate(source, fold)
+    llvm_module = parse_module(module_ir)
+    instructions = count_instructions(llvm_module)
+    emit_bytes(llvm_module, "obj")
+    return time.perf_counter() - start, instructions
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    source = constant_heavy(scale)
+    plain, plain_instructions = measure(source, fold=False)
+    folded, folded_instructions = measure(source, fold=True)
+    assert folded_instructions < plain_instructions
+    print(f"{'without folding':>16}: {plain * 1000:8.1f} ms, {plain_instructions} instructions")
+    print(
+        f"{'folded':>16}: {folded * 1000:8.1f} ms, {folded_instructions} instructions "
+        f"({plain / folded:.1f}x)"
+    )
+
+    # the folded program still prints the same
+    path = os.path.join(ROOT, "benchmarks", "constant_folding.mylang")
+    with open(path, "w") as f:
+        f.write(constant_heavy(50))
+    try:
+        output = subprocess.run(
+            [sys.executable, "-m", "mylang", path, "--run"],
+            env=dict(os.environ, PYTHONPATH=ROOT), check=True, capture_output=True, text=True,
+        ).stdout
+    finally:
+        os.remove(path)
+    expected = [str(index * SECONDS_PER_DAY + 125) for index in range(50)]
+    assert output.split() == expected, output
+    print("same output")
+
+
+if __name__ == "__main__":
+    main()
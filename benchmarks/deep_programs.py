@@ -0,0 +1,55 @@
+"""Compile machine generated programs that nest far deeper than the python
+recursion limit: a long operator chain, nested functions and nested ifs.
+Symbol resolution and code generation use explicit work stacks, so all of
+them compile with the default recursion limit.
+
+    python benchmarks/deep_programs.py [depth]
+"""
+import gc
+import sys
+import time
+
+from mylang.compiler import compile_code
+from mylang.parser.code_parser import CodeParser
+
+
+def operator_chain(depth: int) -> str:
+    chain = " + ".join("1" for _ in range(depth))
+    return f"print({chain});\n"
+
+
+def nested_functions(depth: int) -> str:
+    # the innermost function captures `x` through every enclosing function
+    opening = "function f0(x: int) -> int {\n" + "".join(
+        f"function f{index}() -> int {{\n" for index in range(1, depth)
+    )
+    closing = "return x;\n}\n" * depth
+    return f"{opening}{closing}print(f0(1));\n"
+
+
+def nested_ifs(depth: int) -> str:
+    opening = "if (a < 1) {\n" * depth
+    closing = "}\n" * depth
+    return f"a: int = 0;\n{opening}print(a);\n{closing}"
+
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    # the SLY parser is table driven and does not recurse either
+    code_parser = CodeParser()
+    for name, generate in [
+        ("operator chain", operator_chain),
+        ("nested functions", nested_functions),
+        ("nested ifs", nested_ifs),
+    ]:
+        source = generate(depth)
+        start = time.perf_counter()
+        module_ir = compile_code(source, code_parser=code_parser)
+        seconds = time.perf_counter() - start
+        print(f"{name:>16} at depth {depth}: {seconds:6.2f} s, {len(module_ir.functions)} functions")
+        del module_ir
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Rebuild time after editing one function of a large program, full
+compilation against function granularity incremental compilation
+(mylang/incremental.py).
+
+    python benchmarks/incremental.py [scale]
+"""
+import sys
+import tempfile
+import time
+
+from resolver import many_symbols
+
+from mylang.cache import CompilationCache
+from mylang.compiler import compile_code
+from mylang.incremental import compile_incremental
+from mylang.parser.code_parser import CodeParser
+from mylang.target import parse_module
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    code_parser = CodeParser("fast", "pratt")
+    cache = CompilationCache(tempfile.mkdtemp())
+    source = many_symbols(scale)
+    # the edit changes the body of the last function only
+    edited = source.replace(f"function f{scale - 1}(a: int, b: int) -> int {{\n", f"function f{scale - 1}(a: int, b: int) -> int {{\nprint(a);\n")
+
+    (_, report), first = timed(lambda: compile_incremental(source, cache, code_parser=code_parser))
+    print(f"first build: {first:6.2f} s, {report}")
+    full, full_time = timed(lambda: parse_module(compile_code(edited, code_parser=code_parser)))
+    print(f" full build: {full_time:6.2f} s")
+    (incremental, report), incremental_time = timed(
+        lambda: compile_incremental(edited, cache, code_parser=code_parser)
+    )
+    print(f"incremental: {incremental_time:6.2f} s, {report} ({full_time / incremental_time:.1f}x)")
+    assert str(incremental) == str(full), "IR differs"
+    print("identical IR")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Time to run a large program with the JIT when only a few of its
+functions are called, compiling everything up front against `--lazy`
+(mylang/lazy.py).
+
+    python benchmarks/lazy_jit.py [scale]
+"""
+import os
+import subprocess
+import sys
+import time
+
+from resolver import many_symbols
+
+from mylang.compiler import compile_code
+from mylang.jit import run_module
+from mylang.lazy import run_lazy
+from mylang.parser.code_parser import CodeParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def few_calls(scale: int, calls: int) -> str:
+    """`many_symbols` with only the last `calls` functions called."""
+    source = many_symbols(scale)
+    lines = [
+        line for line in source.split("\n")
+        if not line.startswith("print(f") or int(line[7:line.index("(", 7)]) >= scale - calls
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    calls = 3
+    code_parser = CodeParser("fast", "pratt")
+    source = few_calls(scale, calls)
+
+    start = time.perf_counter()
+    run_module(compile_code(source, code_parser=code_parser))
+    eager = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, report = run_lazy(source, code_parser=code_parser)
+    lazy = time.perf_counter() - start
+    assert report.materialized == calls, report
+
+    print(f"{'compile everything':>20}: {eager * 1000:8.1f} ms")
+    print(f"{'lazy':>20}: {lazy * 1000:8.1f} ms ({eager / lazy:.1f}x), {report}")
+
+    # same output as the eager JIT
+    path = os.path.join(ROOT, "benchmarks", "lazy_jit.mylang")
+    with open(path, "w") as f:
+        f.write(source)
+    try:
+        environment = dict(os.environ, PYTHONPATH=ROOT)
+        outputs = [
+            subprocess.run(
+                [sys.executable, "-m", "mylang", path, "--run", *flags],
+                env=environment, check=True, capture_output=True, text=True,
+            ).stdout
+            for flags in ([], ["--lazy"])
+        ]
+    finally:
+        os.remove(path)
+    assert outputs[0] == outputs[1] and outputs[0].count("\n") == calls, outputs
+    print("same output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Tokens per second of the SLY `CalcLexer` and the hand written scanner
+in mylang/parser/fast_lexer.py on a multi-megabyte generated source.
+
+    python benchmarks/lexer.py [size in MiB]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from mylang.parser.fast_lexer import scan, scan_file
+from mylang.parser.lexer import CalcLexer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE = os.path.join(ROOT, "examples", "example.mylang")
+
+
+def generate_source(size: int) -> str:
+    with open(EXAMPLE) as f:
+        example = f.read()
+    return example * (size // len(example) + 1)
+
+
+def report(name: str, seconds: float, count: int):
+    print(f"{name:>14}: {count / seconds / 1e6:6.2f} M tokens/s ({seconds:.2f} s)")
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1024 * 1024) if len(sys.argv) > 1 else 4 * 1024 * 1024
+    source = generate_source(size)
+
+    start = time.perf_counter()
+    count = sum(1 for _ in CalcLexer().tokenize(source))
+    report("sly", time.perf_counter() - start, count)
+
+    start = time.perf_counter()
+    tokens = scan(source)
+    report("fast", time.perf_counter() - start, len(tokens))
+
+    with tempfile.NamedTemporaryFile("w", suffix=".mylang") as f:
+        f.write(source)
+        f.flush()
+        start = time.perf_counter()
+        mapped_tokens = scan_file(f.name)
+        report("fast (mmap)", time.perf_counter() - start, len(mapped_tokens))
+
+    sly_tokens = [(t.type, t.value, t.lineno, t.index, t.end) for t in CalcLexer().tokenize(source)]
+    fast_tokens = [(t.type, t.value, t.lineno, t.index, t.end) for t in tokens.sly_tokens()]
+    assert fast_tokens == sly_tokens, "token streams differ"
+    print(f"{count} tokens, identical streams")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Run time of the example functions called from another file, optimized
+per file, with link time optimization (--lto) and as a single file.
+
+    python benchmarks/lto.py [repetitions]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from mylang.build import BuildOptions, build_project
+from mylang.compiler import compile_code
+from mylang.jit import create_execution_engine, run_main
+from mylang.optimizer import optimize_module
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "example.mylang")
+
+# the example's functions, without its top level statements
+LIBRARY_FUNCTIONS = ["multi", "pow", "fib", "fact", "conditional_statement"]
+
+DRIVER = """
+function sum_products(n: int) -> int {
+    if (n == 0) {
+        return 0;
+    }
+    return multi(n, conditional_statement(n, 3)) + sum_products(n - 1);
+}
+function repeat(times: int) -> int {
+    if (times == 0) {
+        return 0;
+    }
+    return sum_products(10000) + fib(20) + pow(2, 10) + fact(10) + repeat(times - 1);
+}
+print(repeat(REPETITIONS));
+"""
+
+
+def library_source() -> str:
+    with open(EXAMPLE) as f:
+        code = f.read()
+    functions = []
+    for name in LIBRARY_FUNCTIONS:
+        start = code.index(f"function {name}(")
+        functions.append(code[start : code.index("\n}\n", start) + 3])
+    return "\n".join(functions)
+
+
+def run_silently(llvm_module) -> float:
+    """Seconds `main` takes, with its output discarded."""
+    engine = create_execution_engine(llvm_module)
+    stdout = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        start = time.perf_counter()
+        run_main(engine)
+        return time.perf_counter() - start
+    finally:
+        os.dup2(stdout, 1)
+        os.close(devnull)
+        os.close(stdout)
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    directory = tempfile.mkdtemp()
+    driver = DRIVER.replace("REPETITIONS", str(repetitions))
+    with open(os.path.join(directory, "numbers.mylang"), "w") as f:
+        f.write(library_source())
+    entry = os.path.join(directory, "main.mylang")
+    with open(entry, "w") as f:
+        f.write("import numbers;\n" + driver)
+
+    builds = {
+        "per file -O2": lambda: build_project(entry, os.path.join(directory, "o2"), BuildOptions("2"), 1)[0],
+        "-O2 --lto": lambda: build_project(entry, os.path.join(directory, "lto"), BuildOptions("2", lto=True), 1)[0],
+        "single file -O2": lambda: optimize_module(compile_code(library_source() + driver), "2")[0],
+    }
+    baseline = None
+    for name, build in builds.items():
+        seconds = min(run_silently(build()) for _ in range(3))
+        baseline = baseline or seconds
+        print(f"{name:>16}: {seconds * 1000:8.1f} ms ({baseline / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Run time of recursive functions with `@memo` (mylang/memo.py) against
+the plain functions, and of the two policies of a table smaller than the
+number of distinct calls. The arguments come from a global so that the
+calls are not evaluated during compilation (mylang/pure_calls.py).
+
+    python benchmarks/memo.py [fib argument]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from math import comb
+
+from tail_calls import printed
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+FIB = """ANNOTATION
+function fib(n: int) -> int {
+    if (n < 2) {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+size: int = SIZE;
+print(fib(size));
+"""
+BINOMIAL = """ANNOTATION
+function binomial(n: int, k: int) -> int {
+    if (k == 0) {
+        return 1;
+    }
+    if (k == n) {
+        return 1;
+    }
+    return binomial(n - 1, k - 1) + binomial(n - 1, k);
+}
+size: int = SIZE;
+print(binomial(size, size / 2));
+"""
+
+
+def fib(n: int) -> int:
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+def run(source: str, opt_level: str):
+    with tempfile.NamedTemporaryFile("w", suffix=".mylang", delete=False) as f:
+        f.write(source)
+    try:
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-m", "mylang", f.name, "--run", f"-O{opt_level}"],
+            env=dict(os.environ, PYTHONPATH=ROOT), check=True, capture_output=True, text=True,
+        ).stdout
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(f.name)
+    return int(output.split()[0]), elapsed
+
+
+def measure(name: str, template: str, size: int, annotation: str, expected: int):
+    source = template.replace("ANNOTATION", annotation).replace("SIZE", str(size))
+    for opt_level in ("0", "2"):
+        result, elapsed = run(source, opt_level)
+        assert result == printed(expected), (name, annotation, result)
+        print(f"{name}({size}) {annotation or 'plain':>16} -O{opt_level}: {elapsed * 1000:8.1f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    for annotation in ("", "@memo"):
+        measure("fib", FIB, n, annotation, fib(n))
+    # 255 distinct calls for 30, more than the tables hold
+    for annotation in ("", "@memo(128)", "@memo(128, keep)", "@memo"):
+        measure("binomial", BINOMIAL, 30, annotation, comb(30, 15))
+
+
+if __name__ == "__main__":
+    main()
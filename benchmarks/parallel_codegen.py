@@ -0,0 +1,38 @@
+"""Compile time with the code generation sharded over 1, 2, 4 and 8 worker
+processes (mylang/parallel.py), checking that the output is the same.
+
+    python benchmarks/parallel_codegen.py [scale]
+"""
+import os
+import sys
+import time
+
+from resolver import many_symbols
+
+from mylang.compiler import compile_code
+from mylang.parallel import compile_parallel
+from mylang.parser.code_parser import CodeParser
+from mylang.target import parse_module
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    code_parser = CodeParser("fast", "pratt")
+    source = many_symbols(scale)
+    print(f"{scale} functions, {os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    serial = str(parse_module(compile_code(source, code_parser=code_parser)))
+    baseline = time.perf_counter() - start
+    print(f"-j 1: {baseline:6.2f} s")
+
+    for jobs in (2, 4, 8):
+        start = time.perf_counter()
+        output = str(compile_parallel(source, jobs, code_parser=code_parser))
+        seconds = time.perf_counter() - start
+        assert output == serial, f"-j {jobs} output differs"
+        print(f"-j {jobs}: {seconds:6.2f} s ({baseline / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
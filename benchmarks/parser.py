@@ -0,0 +1,52 @@
+"""Parse time of the SLY front end against the pratt parser
+(mylang/parser/pratt_parser.py) on a large generated source.
+
+    python benchmarks/parser.py [copies of the example]
+"""
+import gc
+import os
+import sys
+import time
+
+from mylang.parser.code_parser import CodeParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE = os.path.join(ROOT, "examples", "example.mylang")
+
+
+def generate_source(copies: int) -> str:
+    with open(EXAMPLE) as f:
+        example = f.read()
+    # plus a long operator chain, which the pratt parser handles in a loop
+    chain = " + ".join(str(number) for number in range(copies * 10))
+    return example * copies + f"print({chain});\n"
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    source = generate_source(copies)
+    print(f"{len(source) / 1024 / 1024:.1f} MiB of source")
+
+    modules = {}
+    timings = {}
+    for lexer, parser in [("sly", "sly"), ("fast", "sly"), ("fast", "pratt")]:
+        code_parser = CodeParser(lexer, parser)
+        start = time.perf_counter()
+        modules[lexer, parser] = code_parser.parse(source)
+        timings[lexer, parser] = time.perf_counter() - start
+        # keep the ASTs parsed so far out of the next run's garbage collections
+        gc.freeze()
+
+    baseline = timings["sly", "sly"]
+    for (lexer, parser), seconds in timings.items():
+        print(f"{lexer:>5} lexer, {parser:>5} parser: {seconds:6.2f} s ({baseline / seconds:.2f}x)")
+
+    # the comparison itself recurses through the operator chain
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), copies * 40))
+    reference = modules["sly", "sly"]
+    assert all(module == reference for module in modules.values()), "ASTs differ"
+    print("identical ASTs")
+
+
+if __name__ == "__main__":
+    main()
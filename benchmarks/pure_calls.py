@@ -0,0 +1,104 @@
+"""Compile and run time of a program that calls pure functions with
+constant arguments, with the calls evaluated during compilation
+(mylang/pure_calls.py) and with the calls left to run.
+
+    python benchmarks/pure_calls.py [fib argument]
+"""
+import ctypes
+import sys
+import time
+
+from llvmlite import ir
+
+from mylang.compiler import create_main
+from mylang.folding import fold_constants
+from mylang.jit import create_execution_engine, run_main
+from mylang.parser.code_parser import CodeParser
+from mylang.resolver import annotate_symbols, assign_slots, resolve_symbols
+from mylang.symbol_table import create_symbol_table
+from mylang.target import create_target_machine, parse_module, set_module_target
+
+PROGRAM = """function fib(n: int) -> int {
+    if (n < 2) {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+function fact(n: int) -> int {
+    if (n == 0) {
+        return 1;
+    }
+    return n * fact(n - 1);
+}
+function pow(base: int, exp: int) -> int {
+    if (exp == 0) {
+        return 1;
+    }
+    return base * pow(base, exp - 1);
+}
+function collatz(n: int) -> int {
+    steps: int = 0;
+    while (n > 1) {
+        if (n % 2 == 0) {
+            n = n / 2;
+        } else {
+            n = 3 * n;
+            n = n + 1;
+        }
+        steps = steps + 1;
+    }
+    return steps;
+}
+fib_result: int = fib(FIB);
+fact_result: int = fact(20);
+pow_result: int = pow(3, 30);
+collatz_result: int = collatz(27);
+"""
+RESULTS = ["fib_result", "fact_result", "pow_result", "collatz_result"]
+
+
+def fib(n: int) -> int:
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+def compile_program(source: str, evaluate: bool) -> ir.Module:
+    module = CodeParser().parse(source)
+    symbol_table = create_symbol_table(module)
+    if evaluate:
+        resolve_symbols(module, symbol_table)
+    else:
+        fold_constants(module)
+        assign_slots(symbol_table)
+        annotate_symbols(module, symbol_table)
+    module_ir = ir.Module(name="module")
+    set_module_target(module_ir, create_target_machine())
+    return create_main(module_ir, module.body, symbol_table)
+
+
+def measure(source: str, evaluate: bool):
+    start = time.perf_counter()
+    engine = create_execution_engine(parse_module(compile_program(source, evaluate)))
+    compiled = time.perf_counter()
+    run_main(engine)
+    ran = time.perf_counter()
+    results = [
+        ctypes.c_int64.from_address(engine.get_global_value_address(name)).value for name in RESULTS
+    ]
+    return compiled - start, ran - compiled, results
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 35
+    source = PROGRAM.replace("FIB", str(n))
+    expected = [fib(n), 2432902008176640000, 3 ** 30, 111]
+    for name, evaluate in (("calls at run time", False), ("evaluated", True)):
+        compile_seconds, run_seconds, results = measure(source, evaluate)
+        assert results == expected, (name, results)
+        print(f"{name:>18}: compile {compile_seconds * 1000:7.1f} ms, run {run_seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
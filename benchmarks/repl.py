@@ -0,0 +1,54 @@
+"""Per entry latency of the REPL (`python -m mylang repl`) as the session
+grows, against compiling and running the whole history for every entry.
+
+    python benchmarks/repl.py [entries]
+"""
+import ctypes
+import sys
+import time
+
+from mylang.compiler import compile_code
+from mylang.jit import run_module
+from mylang.parser.code_parser import CodeParser
+from mylang.repl import ReplSession
+
+
+def entry(index: int) -> str:
+    if index == 0:
+        return "total: int = 0;"
+    if index % 2:
+        return f"function step_{index}(n: int) -> int {{ return n + {index}; }}"
+    return f"total = step_{index - 1}(total);"
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    window = 100
+    session = ReplSession()
+    latencies = []
+    for index in range(entries):
+        start = time.perf_counter()
+        session.execute(entry(index))
+        latencies.append(time.perf_counter() - start)
+
+    address = session.engine.get_global_value_address("total")
+    expected = sum(range(1, entries - 1, 2))
+    assert ctypes.c_int64.from_address(address).value == expected
+
+    first = sum(latencies[:window]) / window * 1000
+    last = sum(latencies[-window:]) / window * 1000
+    # the whole history compiled again, the way a naive REPL runs the last entry
+    code_parser = CodeParser("fast", "pratt")
+    history = "\n".join(entry(index) for index in range(entries))
+    start = time.perf_counter()
+    run_module(compile_code(history, code_parser=code_parser))
+    rerun = (time.perf_counter() - start) * 1000
+
+    print(f"{'first ' + str(window) + ' entries':>24}: {first:7.2f} ms per entry")
+    print(f"{'last ' + str(window) + ' entries':>24}: {last:7.2f} ms per entry ({last / first:.2f}x)")
+    print(f"{'whole history':>24}: {rerun:7.2f} ms for entry {entries}")
+    assert last < first * 3, "the latency grows with the session"
+
+
+if __name__ == "__main__":
+    main()
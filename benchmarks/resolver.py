@@ -0,0 +1,72 @@
+"""Time of the symbol passes (symbol table, resolver) and of code generation
+on programs with thousands of symbols and with deeply nested closures.
+
+    python benchmarks/resolver.py [scale]
+"""
+import sys
+import time
+
+from llvmlite import ir
+
+from mylang.compiler import create_main
+from mylang.parser.code_parser import CodeParser
+from mylang.resolver import resolve_symbols
+from mylang.symbol_table import create_symbol_table
+
+
+def many_symbols(scale: int) -> str:
+    """`scale` globals and functions, each function with `scale` / 10 locals."""
+    lines = [f"g{index}: int = {index};" for index in range(scale)]
+    local_count = max(scale // 10, 1)
+    for function in range(scale):
+        lines.append(f"function f{function}(a: int, b: int) -> int {{")
+        lines.extend(f"v{index}: int = {index};" for index in range(local_count))
+        lines.extend(f"v{index} = v{index} + a * b - g{index};" for index in range(local_count))
+        total = " + ".join(f"v{index}" for index in range(local_count))
+        lines.append(f"return {total};")
+        lines.append("}")
+        lines.append(f"print(f{function}({function}, 2));")
+    return "\n".join(lines) + "\n"
+
+
+def nested_closures(scale: int) -> str:
+    """`scale` nested functions, the innermost one captures a local of each."""
+    depth = max(scale // 4, 1)
+    opening = "".join(
+        f"function f{index}(a{index}: int) -> int {{\nv{index}: int = {index};\n"
+        for index in range(depth)
+    )
+    total = " + ".join(f"v{index} + a{index}" for index in range(depth))
+    closing = "".join(
+        f"return f{index + 1}(a{index});\n}}\n" for index in reversed(range(depth - 1))
+    )
+    return f"{opening}return {total};\n}}\n{closing}print(f0(1));\n"
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    code_parser = CodeParser("fast", "pratt")
+    for name, generate in [("many symbols", many_symbols), ("nested closures", nested_closures)]:
+        module = code_parser.parse(generate(scale))
+
+        start = time.perf_counter()
+        symbol_table = create_symbol_table(module)
+        symbols = time.perf_counter() - start
+
+        start = time.perf_counter()
+        resolve_symbols(module, symbol_table)
+        resolve = time.perf_counter() - start
+
+        start = time.perf_counter()
+        create_main(ir.Module(name="module"), module.body, symbol_table)
+        codegen = time.perf_counter() - start
+
+        symbol_count = sum(len(table.symbols) for table in symbol_table.walk())
+        print(
+            f"{name:>15}: {symbol_count} symbols, symbol table {symbols:5.2f} s, "
+            f"resolver {resolve:5.2f} s, codegen {codegen:5.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
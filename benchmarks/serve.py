@@ -0,0 +1,56 @@
+"""Per request latency of the compile daemon (`python -m mylang serve`)
+against cold CLI runs, compiling the example program.
+
+    python benchmarks/serve.py [requests]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from mylang.client import request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+EXAMPLE = os.path.join(ROOT, "examples", "example.mylang")
+
+
+def mean_ms(function, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, "mylang.sock")
+    output = os.path.join(directory, "out.ll")
+    environment = dict(os.environ, PYTHONPATH=ROOT, MYLANG_SOCKET=socket_path)
+    arguments = [EXAMPLE, "-O2", "-o", output]
+
+    daemon = subprocess.Popen([sys.executable, "-m", "mylang", "serve"], env=environment, stderr=subprocess.PIPE)
+    try:
+        daemon.stderr.readline()  # type: ignore  # listening
+        cold = mean_ms(
+            lambda: subprocess.run([sys.executable, "-m", "mylang", *arguments], env=environment, check=True, capture_output=True),
+            count,
+        )
+        client = mean_ms(
+            lambda: subprocess.run([sys.executable, "-m", "mylang.client", *arguments], env=environment, check=True, capture_output=True),
+            count,
+        )
+        warm = mean_ms(lambda: request(arguments, socket_path), count)
+        assert request(arguments, socket_path)["status"] == 0
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+    print(f"{'cold CLI':>24}: {cold:7.1f} ms")
+    print(f"{'client process + daemon':>24}: {client:7.1f} ms ({cold / client:.1f}x)")
+    print(f"{'request to daemon':>24}: {warm:7.1f} ms ({cold / warm:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Load time of a snapshot (mylang/snapshot.py) against parsing and
+resolving the source again, with round trip checks of the AST, the symbol
+tables and the generated IR.
+
+    python benchmarks/snapshot.py [scale]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from resolver import many_symbols, nested_closures
+
+from mylang.compiler import compile_code, resolve_arena
+from mylang.parser.code_parser import CodeParser
+from mylang.snapshot import create_snapshot, load_snapshot, save_snapshot
+
+
+def describe_symbols(symbol_table) -> list:
+    return [
+        (
+            table.context_name,
+            [
+                (symbol.name, repr(symbol.type), symbol.load_type, symbol.arg_index, symbol.slot)
+                for symbol in table.symbols.values()
+            ],
+        )
+        for table in symbol_table.walk()
+    ]
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    code_parser = CodeParser("fast", "pratt")
+    path = os.path.join(tempfile.mkdtemp(), "program.snapshot")
+    for name, source in [
+        ("many symbols", many_symbols(scale)),
+        ("nested closures", nested_closures(scale)),
+    ]:
+        arena, parse = timed(lambda: code_parser.parse_arena(source))
+        symbol_table, resolve = timed(lambda: resolve_arena(arena))
+        snapshot = create_snapshot(source, code_parser)
+        _, save = timed(lambda: save_snapshot(snapshot, path))
+        loaded, load = timed(lambda: load_snapshot(path))
+
+        print(
+            f"{name:>15}: parse {parse:6.3f} s + resolve {resolve:6.3f} s, "
+            f"snapshot load {load:6.3f} s ({(parse + resolve) / load:.0f}x), "
+            f"save {save:6.3f} s, {os.path.getsize(path) / 1024:.0f} KiB"
+        )
+
+        assert loaded.arena.to_module() == code_parser.parse(source), "ASTs differ"
+        assert describe_symbols(loaded.symbol_table) == describe_symbols(symbol_table), "symbols differ"
+        assert str(loaded.to_ir()) == str(compile_code(source, code_parser=code_parser)), "IR differs"
+    print("identical ASTs, symbol tables and IR")
+
+
+if __name__ == "__main__":
+    main()
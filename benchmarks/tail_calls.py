@@ -0,0 +1,109 @@
+"""Recursion at depths of 10^6 and more, with the self calls in tail
+position lowered to loops (mylang/tail_calls.py), against a recursion the
+compiler cannot turn into a loop.
+
+    python benchmarks/tail_calls.py [max depth exponent]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROGRAMS = {
+    # a plain tail call
+    "count": """function count(n: int, done: int) -> int {
+    if (n == 0) {
+        return done;
+    }
+    return count(n - 1, done + 1);
+}
+print(count(DEPTH, 0));
+""",
+    # value op self call, with an accumulator
+    "sum": """function sum(n: int) -> int {
+    if (n == 0) {
+        return 0;
+    }
+    return n + sum(n - 1);
+}
+print(sum(DEPTH));
+""",
+    "fact": """function fact(n: int) -> int {
+    if (n == 0) {
+        return 1;
+    }
+    return n * fact(n - 1);
+}
+print(fact(DEPTH));
+""",
+    # the result goes through a local, the call is not in tail position
+    "not tail": """function sum(n: int) -> int {
+    if (n == 0) {
+        return 0;
+    }
+    rest: int = sum(n - 1);
+    return n + rest;
+}
+print(sum(DEPTH));
+""",
+}
+
+
+def printed(value: int) -> int:
+    """What print shows of an int: its format is %d, the low 32 bits."""
+    value &= (1 << 32) - 1
+    return value - (1 << 32) if value >= 1 << 31 else value
+
+
+def expected(name: str, depth: int) -> int:
+    if name == "count":
+        return depth
+    if name == "fact":
+        result = 1
+        for factor in range(2, depth + 1):
+            result = result * factor & (1 << 64) - 1
+        return printed(result)
+    return printed(depth * (depth + 1) // 2)
+
+
+def run(source: str, opt_level: str):
+    with tempfile.NamedTemporaryFile("w", suffix=".mylang", delete=False) as f:
+        f.write(source)
+    try:
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-m", "mylang", f.name, "--run", f"-O{opt_level}"],
+            env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(f.name)
+    if process.returncode < 0:
+        return None, elapsed
+    return int(process.stdout.split()[0]), elapsed
+
+
+def main():
+    max_exponent = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    for exponent in range(6, max_exponent + 1):
+        depth = 10 ** exponent
+        for name, template in PROGRAMS.items():
+            if name == "fact" and exponent > 7:
+                continue  # the check is computed in python
+            for opt_level in ("0", "2"):
+                result, elapsed = run(template.replace("DEPTH", str(depth)), opt_level)
+                if result is None:
+                    status = "crashed (stack overflow)"
+                else:
+                    assert result == expected(name, depth), (name, depth, result)
+                    status = "ok"
+                print(f"10^{exponent} {name:>8} -O{opt_level}: {elapsed * 1000:8.1f} ms  {status}")
+                if name != "not tail":
+                    assert result is not None, f"{name} crashed at depth 10^{exponent}"
+
+
+if __name__ == "__main__":
+    main()
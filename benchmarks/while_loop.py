@@ -0,0 +1,82 @@
+"""A sum over 10^5 to 10^8 numbers written as a `while` loop, against the
+same sum written as a recursion, which takes a call frame per number.
+
+    python benchmarks/while_loop.py [max count exponent]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from tail_calls import printed
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROGRAMS = {
+    "while": """function sum(n: int) -> int {
+    total: int = 0;
+    while (n > 0) {
+        day: int = n % 7;
+        total = total + day;
+        n = n - 1;
+    }
+    return total;
+}
+print(sum(COUNT));
+""",
+    # the result goes through a local, so it is not lowered to a loop either
+    "recursion": """function sum(n: int) -> int {
+    if (n == 0) {
+        return 0;
+    }
+    rest: int = sum(n - 1);
+    day: int = n % 7;
+    return day + rest;
+}
+print(sum(COUNT));
+""",
+}
+
+
+def expected(count: int) -> int:
+    weeks, days = divmod(count, 7)
+    return printed(weeks * 21 + days * (days + 1) // 2)
+
+
+def run(source: str, opt_level: str):
+    with tempfile.NamedTemporaryFile("w", suffix=".mylang", delete=False) as f:
+        f.write(source)
+    try:
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-m", "mylang", f.name, "--run", f"-O{opt_level}"],
+            env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(f.name)
+    if process.returncode < 0:
+        return None, elapsed
+    return int(process.stdout.split()[0]), elapsed
+
+
+def main():
+    max_exponent = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    for exponent in range(5, max_exponent + 1):
+        count = 10 ** exponent
+        for name, template in PROGRAMS.items():
+            for opt_level in ("0", "2"):
+                result, elapsed = run(template.replace("COUNT", str(count)), opt_level)
+                if result is None:
+                    status = "crashed (stack overflow)"
+                else:
+                    assert result == expected(count), (name, count, result)
+                    status = "ok"
+                print(f"10^{exponent} {name:>9} -O{opt_level}: {elapsed * 1000:8.1f} ms  {status}")
+                if name == "while":
+                    assert result is not None, f"the while loop crashed at 10^{exponent}"
+
+
+if __name__ == "__main__":
+    main()
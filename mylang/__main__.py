@@ -1,37 +1,179 @@
 import argparse
-from llvmlite import ir
-from mylang.parser.code_parser import CodeParser
-from mylang.symbol_table import create_symbol_table
-from mylang.compiler import create_main
+import os
+import sys
+from mylang.emitter import EMIT_DESCRIPTIONS, EMIT_KINDS, default_output
+from mylang.optimizer import OPT_LEVELS
+from mylang.parser.code_parser import LEXERS, PARSERS
+from mylang.target import TargetOptions
 
 
 def create_arg_parser():
     parser = argparse.ArgumentParser(description='MyLang Compiler CLI')
     parser.add_argument('input_file', help='Input file containing MyLang code')
-    parser.add_argument('-o', '--output', help='Output LLVM IR file (default: out.ll)', default='out.ll')
+    parser.add_argument('-o', '--output', help='Output file (default: out.ll, out.bc, out.s, out.o or out depending on --emit)')
+    parser.add_argument('--emit', choices=EMIT_KINDS, default='ll', help='Kind of output to write (default: ll)')
+    parser.add_argument('--run', action='store_true', help='JIT compile and run the program instead of writing the output file')
+    parser.add_argument('--lazy', action='store_true', help='With --run, generate and compile every function on its first call only')
+    parser.add_argument('-O', dest='opt_level', choices=OPT_LEVELS, default='0', help='Optimization level: -O0, -O1, -O2, -O3 or -Os (default: -O0)')
+    parser.add_argument('--target', help='Target triple (default: the host triple)')
+    parser.add_argument('--cpu', default='', help='Target CPU name, "native" for the host CPU (default: generic)')
+    parser.add_argument('--features', default='', help='Target CPU features, e.g. "+avx2,+fma" (default: all host features with --cpu native)')
+    parser.add_argument('--lexer', choices=LEXERS, default='sly', help='Lexer used by the front end (default: sly)')
+    parser.add_argument('--parser', choices=PARSERS, default='sly', help='Parser used by the front end, pratt implies the fast lexer (default: sly)')
+    parser.add_argument('--arena', action='store_true', help='Keep the AST in a flat array arena while compiling, lowers the peak memory on large programs (best with --parser pratt)')
+    parser.add_argument('--snapshot', help='Parse and resolve the program from this snapshot file, it is (re)written when missing or taken from another source')
+    parser.add_argument('--opt-report', action='store_true', help='Print instruction counts before and after optimization')
+    parser.add_argument('--cache-dir', default=os.environ.get('MYLANG_CACHE_DIR'), help='Directory of the compilation cache (default: $MYLANG_CACHE_DIR, no caching if unset)')
+    parser.add_argument('--cache-size', type=int, default=256, help='Maximum size of the compilation cache in MiB (default: 256)')
+    parser.add_argument('--cache-stats', action='store_true', help='Print compilation cache hits and misses')
+    parser.add_argument('--incremental', action='store_true', help='Keep the IR of every function in the cache and only regenerate the functions that changed, needs --cache-dir')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Generate the code of the functions in this many worker processes (default: 1)')
+    parser.add_argument('--no-fold', dest='fold', action='store_false', help='Do not fold constants or evaluate calls of pure functions during compilation')
     return parser
 
 
-def main():
+def create_build_arg_parser():
+    parser = argparse.ArgumentParser(prog='mylang build', description='Compile a multi-file MyLang project, every imported file separately')
+    parser.add_argument('input_file', help='Entry file, its imports are looked up next to it as <name>.mylang')
+    parser.add_argument('-o', '--output', help='Output file (default: out.ll, out.bc, out.s, out.o or out depending on --emit)')
+    parser.add_argument('--emit', choices=EMIT_KINDS, default='ll', help='Kind of output to write (default: ll)')
+    parser.add_argument('--run', action='store_true', help='JIT compile and run the program instead of writing the output file')
+    parser.add_argument('-O', dest='opt_level', choices=OPT_LEVELS, default='0', help='Optimization level of every file: -O0, -O1, -O2, -O3 or -Os (default: -O0)')
+    parser.add_argument('--target', help='Target triple (default: the host triple)')
+    parser.add_argument('--cpu', default='', help='Target CPU name, "native" for the host CPU (default: generic)')
+    parser.add_argument('--features', default='', help='Target CPU features, e.g. "+avx2,+fma" (default: all host features with --cpu native)')
+    parser.add_argument('--lexer', choices=LEXERS, default='sly', help='Lexer used by the front end (default: sly)')
+    parser.add_argument('--parser', choices=PARSERS, default='sly', help='Parser used by the front end, pratt implies the fast lexer (default: sly)')
+    parser.add_argument('--build-dir', help='Directory of the compiled files (default: .mylang-build next to the entry file)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of files compiled in parallel (default: the number of CPUs)')
+    parser.add_argument('--lto', action='store_true', help='Link time optimization: compile the files unoptimized, then optimize the linked program as a whole at the -O level (-O2 unless given)')
+    parser.add_argument('--no-fold', dest='fold', action='store_false', help='Do not fold constants or evaluate calls of pure functions during compilation')
+    return parser
+
+
+def build(argv):
+    from mylang.build import BuildOptions, build_project
+    args = create_build_arg_parser().parse_args(argv)
+    target_options = None
+    if args.target or args.cpu or args.features:
+        target_options = TargetOptions(args.target, args.cpu, args.features)
+
+    opt_level = '2' if args.lto and args.opt_level == '0' else args.opt_level
+    options = BuildOptions(opt_level, target_options, args.lexer, args.parser, args.lto, args.fold)
+    llvm_module, report = build_project(args.input_file, args.build_dir, options, args.jobs)
+    print(report, file=sys.stderr)
+
+    if args.run:
+        from mylang.jit import run_module
+        return run_module(llvm_module, target_options)
+
+    from mylang.emitter import emit
+    output = args.output or default_output(args.emit)
+    emit(llvm_module, args.emit, output, target_options)
+    print(f'{EMIT_DESCRIPTIONS[args.emit]} saved to {output}')
+    return 0
+
+
+def compile_module(mylang_code, args, target_options, cache=None):
+    # imported lazily, a cache hit never needs the front end
+    from mylang.compiler import compile_code
+    from mylang.parser.code_parser import CodeParser
+    code_parser = CodeParser(args.lexer, args.parser)
+    if args.incremental:
+        from mylang.incremental import compile_incremental
+        module_ir, incremental_report = compile_incremental(mylang_code, cache, target_options, code_parser, args.fold)
+        print(incremental_report, file=sys.stderr)
+    elif args.jobs > 1:
+        from mylang.parallel import compile_parallel
+        module_ir = compile_parallel(mylang_code, args.jobs, target_options, code_parser, args.fold)
+    elif args.snapshot:
+        from mylang.snapshot import load_or_create_snapshot
+        snapshot, _ = load_or_create_snapshot(mylang_code, args.snapshot, code_parser)
+        module_ir = snapshot.to_ir(target_options, args.fold)
+    else:
+        module_ir = compile_code(mylang_code, target_options, code_parser, args.arena, args.fold)
+
+    if args.opt_level != '0' or args.opt_report:
+        from mylang.optimizer import optimize_module
+        module_ir, report = optimize_module(module_ir, args.opt_level, target_options)
+        if args.opt_report:
+            print(report, file=sys.stderr)
+
+    return module_ir
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['build']:
+        return build(argv[1:])
+    if argv[:1] == ['serve']:
+        from mylang.server import serve_main
+        return serve_main(argv[1:])
+    if argv[:1] == ['repl']:
+        from mylang.repl import repl_main
+        return repl_main(argv[1:])
+
     parser = create_arg_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.incremental and not args.cache_dir:
+        parser.error('--incremental needs --cache-dir')
+    if args.incremental and (args.arena or args.snapshot):
+        parser.error('--incremental cannot be combined with --arena or --snapshot')
+    if args.jobs > 1 and (args.arena or args.snapshot or args.incremental):
+        parser.error('-j cannot be combined with --arena, --snapshot or --incremental')
+    if args.lazy and not args.run:
+        parser.error('--lazy needs --run')
+    if args.lazy and (args.arena or args.snapshot or args.incremental or args.jobs > 1):
+        parser.error('--lazy cannot be combined with --arena, --snapshot, --incremental or -j')
 
     with open(args.input_file, 'r') as f:
         mylang_code = f.read()
 
-    code_parser = CodeParser()
-    module = code_parser.parse(mylang_code)
-    symbol_table = create_symbol_table(module)
+    target_options = None
+    if args.target or args.cpu or args.features:
+        target_options = TargetOptions(args.target, args.cpu, args.features)
+
+    if args.lazy:
+        # nothing to cache, the code is generated while the program runs
+        from mylang.lazy import run_lazy
+        from mylang.parser.code_parser import CodeParser
+        exit_code, lazy_report = run_lazy(mylang_code, args.opt_level, target_options, CodeParser(args.lexer, args.parser), args.fold)
+        print(lazy_report, file=sys.stderr)
+        return exit_code
 
-    module_ir = ir.Module(name='module')
-    module_ir.triple = 'x86_64-pc-linux-gnu'
+    # the JIT loads cached modules back from bitcode
+    kind = 'bc' if args.run else args.emit
+    artifact = None
+    if args.cache_dir:
+        from mylang.cache import CompilationCache
+        from mylang.emitter import emit_bytes
+        cache = CompilationCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        key = cache.make_key(mylang_code, kind, args.opt_level, target_options, args.fold)
+        artifact = cache.get(key)
+        if artifact is None:
+            artifact = emit_bytes(compile_module(mylang_code, args, target_options, cache), kind, target_options)
+            cache.put(key, artifact)
+        if args.cache_stats:
+            print(cache.report(), file=sys.stderr)
+    else:
+        module_ir = compile_module(mylang_code, args, target_options)
 
-    create_main(module_ir, module.body, symbol_table)
+    if args.run:
+        from mylang.jit import run_module
+        if artifact is not None:
+            from llvmlite import binding
+            module_ir = binding.parse_bitcode(artifact)
+        return run_module(module_ir, target_options)
 
-    with open(args.output, 'w') as f:
-        f.write(str(module_ir))
+    from mylang.emitter import emit, write_artifact
+    output = args.output or default_output(args.emit)
+    if artifact is not None:
+        write_artifact(artifact, args.emit, output)
+    else:
+        emit(module_ir, args.emit, output, target_options)
 
-    print(f'LLVM IR saved to {args.output}')
+    print(f'{EMIT_DESCRIPTIONS[args.emit]} saved to {output}')
+    return 0
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Embedding API: compile many small programs in a long lived process.
+
+    from mylang.api import Compiler
+
+    compiler = Compiler(emit="obj", opt_level="2")
+    for result in compiler.compile_many(sources):
+        if result.error:
+            ...
+        else:
+            use(result.artifact)
+
+A `Compiler` keeps a pool of `CompilerContext`s, each with the pieces that
+are expensive to build and cannot be shared between threads: a parser, an
+LLVM context, a target machine, the optimization pipeline and, with
+`jit=True`, an execution engine. Every call borrows one context, so the
+compiler can be used from a thread pool; the LLVM work (llvmlite releases
+the GIL) then runs in parallel, each thread in its own LLVM context.
+"""
+import ctypes
+import queue
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+from llvmlite import binding, ir
+
+from mylang.compiler import MAIN_FUNCTION, create_main
+from mylang.emitter import emit_bytes
+from mylang.jit import flush_c_stdout, load_libc
+from mylang.optimizer import OptimizationReport, Optimizer, internalize
+from mylang.parser.code_parser import CodeParser
+from mylang.resolver import resolve_symbols
+from mylang.symbol_table import create_symbol_table
+from mylang.target import TargetOptions, create_target_machine, initialize_llvm
+
+# everything but exe, which has to be linked into a file
+API_EMIT_KINDS = ["ll", "bc", "asm", "obj"]
+
+
+@dataclass
+class CompileResult:
+    # output of the `emit` kind, None when the compilation failed
+    artifact: Optional[bytes] = None
+    error: Optional[Exception] = None
+    report: Optional[OptimizationReport] = None
+    # value returned by main, with run=True
+    exit_code: Optional[int] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class CompilerContext:
+    """The reusable state of one compilation at a time."""
+
+    def __init__(self, compiler: "Compiler"):
+        self.compiler = compiler
+        self.code_parser = CodeParser(compiler.lexer, compiler.parser)  # type: ignore
+        self.llvm_context = binding.create_context()
+        self.target_machine = create_target_machine(compiler.target_options, reloc="pic")
+        self.triple = self.target_machine.triple
+        self.data_layout = str(self.target_machine.target_data)
+        self.optimizer = Optimizer(compiler.opt_level, self.target_machine)
+        self.engine: Optional[binding.ExecutionEngine] = None
+        self.programs_run = 0
+
+    def front_end(self, source: str) -> ir.Module:
+        module = self.code_parser.parse(source)
+        symbol_table = resolve_symbols(module, create_symbol_table(module), self.compiler.fold)
+        module_ir = ir.Module(name="module")
+        module_ir.triple = self.triple
+        module_ir.data_layout = self.data_layout
+        return create_main(module_ir, module.body, symbol_table)
+
+    def back_end(self, module_ir: ir.Module, run: bool) -> CompileResult:
+        llvm_module = binding.parse_assembly(str(module_ir), self.llvm_context)
+        llvm_module.verify()
+        report = self.optimizer.run(llvm_module)
+        artifact = emit_bytes(llvm_module, self.compiler.emit, target_machine=self.target_machine)
+        exit_code = self.run(llvm_module) if run else None
+        return CompileResult(artifact, report=report, exit_code=exit_code)
+
+    def run(self, llvm_module: binding.ModuleRef) -> int:
+        if self.engine is None:
+            load_libc()
+            # the programs are added to and removed from an empty module's
+            # engine. It gets its own target machine: MCJIT miscompiles calls
+            # to internal functions of later modules with pic relocations
+            base = binding.parse_assembly("", self.llvm_context)
+            base.triple = self.triple
+            self.engine = binding.create_mcjit_compiler(
+                base, create_target_machine(self.compiler.target_options)
+            )
+
+        # the engine keeps the symbols of every program it loaded, so the
+        # program's own ones are made internal and main gets a unique name
+        internalize(llvm_module)
+        entry = f"{MAIN_FUNCTION}.{self.programs_run}"
+        llvm_module.get_function(MAIN_FUNCTION).name = entry
+        self.programs_run += 1
+
+        self.engine.add_module(llvm_module)
+        try:
+            self.engine.finalize_object()
+            main = ctypes.CFUNCTYPE(ctypes.c_int32)(self.engine.get_function_address(entry))
+            try:
+                return main()
+            finally:
+                flush_c_stdout()
+        finally:
+            self.engine.remove_module(llvm_module)
+
+
+class Compiler:
+    """Thread safe compiler of many programs with the same options.
+
+    `emit` is the kind of `CompileResult.artifact` (ll, bc, asm or obj).
+    With `jit=True` the `run` argument of the compile methods also
+    executes the programs; their output goes to the process' stdout and
+    the machine code of every program run stays loaded as long as the
+    compiler lives. `fold=False` leaves the constants and the calls of pure
+    functions to run time, as `--no-fold` does.
+    """
+
+    def __init__(
+        self,
+        emit: str = "obj",
+        opt_level: str = "0",
+        target_options: Optional[TargetOptions] = None,
+        lexer: str = "fast",
+        parser: str = "pratt",
+        jit: bool = False,
+        fold: bool = True,
+    ):
+        if emit not in API_EMIT_KINDS:
+            raise Exception(f"Unknown emit kind {emit}, expected one of {', '.join(API_EMIT_KINDS)}")
+        self.emit = emit
+        self.opt_level = opt_level
+        self.target_options = target_options
+        self.lexer = lexer
+        self.parser = parser
+        self.jit = jit
+        self.fold = fold
+        initialize_llvm()
+        self._idle: "queue.SimpleQueue[CompilerContext]" = queue.SimpleQueue()
+        self._idle.put(CompilerContext(self))
+
+    @contextmanager
+    def context(self) -> Iterator[CompilerContext]:
+        try:
+            context = self._idle.get_nowait()
+        except queue.Empty:
+            context = CompilerContext(self)
+        try:
+            yield context
+        finally:
+            self._idle.put(context)
+
+    def compile(self, source: str, run: bool = False) -> CompileResult:
+        return self.compile_many([source], run)[0]
+
+    def compile_many(self, sources: Iterable[str], run: bool = False) -> List[CompileResult]:
+        """One result per source, in order. A failing source gets its error
+        in its result and does not affect the others.
+
+        The python front end runs for the whole batch first, then the LLVM
+        work, so the LLVM context, target machine and pass managers stay
+        hot across the batch.
+        """
+        if run and not self.jit:
+            raise Exception("Running programs needs Compiler(jit=True)")
+        with self.context() as context:
+            results: List[CompileResult] = []
+            modules: List[Optional[ir.Module]] = []
+            for source in sources:
+                try:
+                    modules.append(context.front_end(source))
+                    results.append(CompileResult())
+                except Exception as error:
+                    modules.append(None)
+                    results.append(CompileResult(error=error))
+
+            for index, module_ir in enumerate(modules):
+                if module_ir is None:
+                    continue
+                try:
+                    results[index] = context.back_end(module_ir, run)
+                except Exception as error:
+                    results[index] = CompileResult(error=error)
+            return results
@@ -0,0 +1,284 @@
+"""Flat, array backed storage for an AST.
+
+Every node is a row in a set of parallel arrays (kind, name, type, value and
+the range of its children in `children`), names are interned in `strings`
+and types in `type_table`. Subtrees are stored in postorder, so the nodes of
+a subtree occupy a contiguous index range ending at its root and children
+always come before their parent.
+
+The passes work on regular `ast_objects` nodes: `to_ast` materializes one
+subtree at a time (see `mylang.compiler.resolve_arena`), so a large program
+never needs to exist as objects all at once.
+"""
+from array import array
+from enum import IntEnum
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from mylang.ast.ast_objects import (
+    Body,
+    BoolType,
+    Call,
+    Function,
+    If,
+    LiteralValue,
+    Load,
+    Memo,
+    Module,
+    MyLangType,
+    NullType,
+    Operator,
+    Parameter,
+    PrimitiveType,
+    Return,
+    Store,
+    Term,
+    VariableDeclaration,
+    While,
+)
+
+
+class NodeKind(IntEnum):
+    BODY = 0
+    FUNCTION = 1
+    VARIABLE_DECLARATION = 2
+    STORE = 3
+    LOAD = 4
+    OPERATOR = 5
+    CALL = 6
+    RETURN = 7
+    IF = 8
+    LITERAL_VALUE = 9
+    # literal that does not fit the 64 bit `values` array, kept in `constants`
+    LARGE_LITERAL_VALUE = 10
+    WHILE = 11
+
+
+NO_INDEX = -1
+
+NODE_KINDS: Dict[type, NodeKind] = {
+    Body: NodeKind.BODY,
+    Function: NodeKind.FUNCTION,
+    VariableDeclaration: NodeKind.VARIABLE_DECLARATION,
+    Store: NodeKind.STORE,
+    Load: NodeKind.LOAD,
+    Operator: NodeKind.OPERATOR,
+    Call: NodeKind.CALL,
+    Return: NodeKind.RETURN,
+    If: NodeKind.IF,
+    LiteralValue: NodeKind.LITERAL_VALUE,
+    While: NodeKind.WHILE,
+}
+
+
+def node_children(term: Term, kind: NodeKind) -> List[Term]:
+    match kind:
+        case NodeKind.BODY:
+            return term.statements  # type: ignore
+        case NodeKind.FUNCTION:
+            return [term.body]  # type: ignore
+        case NodeKind.VARIABLE_DECLARATION | NodeKind.STORE | NodeKind.RETURN:
+            return [term.value]  # type: ignore
+        case NodeKind.OPERATOR:
+            return [term.left, term.right]  # type: ignore
+        case NodeKind.CALL:
+            return term.arguments  # type: ignore
+        case NodeKind.IF:
+            if term.otherwise:  # type: ignore
+                return [term.condition, term.then, term.otherwise]  # type: ignore
+            return [term.condition, term.then]  # type: ignore
+        case NodeKind.WHILE:
+            return [term.condition, term.body]  # type: ignore
+        case _:
+            return []
+
+
+class AstArena:
+    def __init__(self, name: str = "module"):
+        self.name = name
+        self.kinds = array("B")
+        self.names = array("i")
+        self.types = array("i")
+        self.values = array("q")
+        self.child_starts = array("i")
+        self.child_counts = array("i")
+        self.children = array("i")
+        # roots of the top level statements, in source order
+        self.statements = array("i")
+
+        self.strings: List[str] = []
+        self.type_table: List[MyLangType] = []
+        self.parameter_lists: List[List[Parameter]] = []
+        self.constants: List[int] = []
+        # `@memo` of the annotated functions, by node index
+        self.memos: Dict[int, Memo] = {}
+        self._string_index: Dict[str, int] = {}
+        self._type_index: Dict[object, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @classmethod
+    def from_ast(cls, module: Module) -> "AstArena":
+        arena = cls(module.name)
+        for statement in module.body.statements:
+            arena.append(statement)
+        return arena
+
+    def to_module(self) -> Module:
+        return Module(Body([self.to_ast(index) for index in self.statements]), self.name)
+
+    def append(self, statement: Term) -> int:
+        """Store a top level statement."""
+        root = self.add(statement)
+        self.statements.append(root)
+        return root
+
+    # Interning
+    def intern_string(self, string: str) -> int:
+        index = self._string_index.get(string)
+        if index is None:
+            index = self._string_index[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def intern_type(self, value_type: MyLangType) -> int:
+        # primitive types are singletons, function types are kept by identity
+        key = value_type if isinstance(value_type, PrimitiveType) else id(value_type)
+        index = self._type_index.get(key)
+        if index is None:
+            index = self._type_index[key] = len(self.type_table)
+            self.type_table.append(value_type)
+        return index
+
+    # Building
+    def add(self, term: Term) -> int:
+        """Store the subtree `term` in postorder and return its root index."""
+        results: List[int] = []
+        stack: List[Tuple[Term, Optional[NodeKind], int]] = [(term, None, 0)]
+        while stack:
+            node, kind, child_count = stack.pop()
+            if kind is None:
+                kind = NODE_KINDS.get(type(node))
+                if kind is None:
+                    raise Exception(f"Cannot store {type(node).__name__} in an arena")
+                children = node_children(node, kind)
+                stack.append((node, kind, len(children)))
+                stack.extend((child, None, 0) for child in reversed(children))
+                continue
+            split = len(results) - child_count
+            index = self.add_node(node, kind, results[split:])
+            del results[split:]
+            results.append(index)
+        return results[0]
+
+    def add_node(self, term: Term, kind: NodeKind, child_indices: List[int]) -> int:
+        name = value_type = NO_INDEX
+        value = 0
+        match kind:
+            case NodeKind.FUNCTION:
+                name = self.intern_string(term.name)  # type: ignore
+                value_type = self.intern_type(term.return_type)  # type: ignore
+                value = len(self.parameter_lists)
+                self.parameter_lists.append(term.parameters)  # type: ignore
+            case NodeKind.VARIABLE_DECLARATION:
+                name = self.intern_string(term.name)  # type: ignore
+                value_type = self.intern_type(term.value_type)  # type: ignore
+            case NodeKind.STORE | NodeKind.LOAD | NodeKind.CALL:
+                name = self.intern_string(term.name)  # type: ignore
+            case NodeKind.OPERATOR:
+                name = self.intern_string(term.op)  # type: ignore
+            case NodeKind.LITERAL_VALUE:
+                value_type = self.intern_type(term.value_type)  # type: ignore
+                value = int(term.value or 0)  # type: ignore
+                if not -(2**63) <= value < 2**63:
+                    kind = NodeKind.LARGE_LITERAL_VALUE
+                    value = len(self.constants)
+                    self.constants.append(term.value)  # type: ignore
+
+        index = len(self.kinds)
+        if kind == NodeKind.FUNCTION and term.memo is not None:  # type: ignore
+            self.memos[index] = term.memo  # type: ignore
+        self.kinds.append(kind)
+        self.names.append(name)
+        self.types.append(value_type)
+        self.values.append(value)
+        self.child_starts.append(len(self.children))
+        self.child_counts.append(len(child_indices))
+        self.children.extend(child_indices)
+        return index
+
+    # Walking
+    def children_of(self, index: int) -> array:
+        start = self.child_starts[index]
+        return self.children[start : start + self.child_counts[index]]
+
+    def subtree_start(self, index: int) -> int:
+        """Lowest index of the subtree rooted at `index`, its leftmost leaf."""
+        while self.child_counts[index]:
+            index = self.children[self.child_starts[index]]
+        return index
+
+    def walk(self, index: int) -> Iterator[int]:
+        """The nodes of a subtree, children before their parent."""
+        return iter(range(self.subtree_start(index), index + 1))
+
+    def node_name(self, index: int) -> str:
+        return self.strings[self.names[index]]
+
+    def to_ast(self, index: int) -> Term:
+        """Materialize the subtree rooted at `index` as `ast_objects` nodes."""
+        start = self.subtree_start(index)
+        nodes: List[Term] = []
+        for node in range(start, index + 1):
+            child_start = self.child_starts[node]
+            children = [
+                nodes[child - start]
+                for child in self.children[child_start : child_start + self.child_counts[node]]
+            ]
+            nodes.append(self.build_node(node, children))
+        return nodes[-1]
+
+    def build_node(self, index: int, children: List[Term]) -> Term:
+        strings = self.strings
+        match self.kinds[index]:
+            case NodeKind.BODY:
+                return Body(children)
+            case NodeKind.FUNCTION:
+                return Function(
+                    strings[self.names[index]],
+                    self.parameter_lists[self.values[index]],
+                    children[0],  # type: ignore
+                    self.type_table[self.types[index]],
+                    self.memos.get(index),
+                )
+            case NodeKind.VARIABLE_DECLARATION:
+                return VariableDeclaration(
+                    strings[self.names[index]], self.type_table[self.types[index]], children[0]
+                )
+            case NodeKind.STORE:
+                return Store(strings[self.names[index]], children[0])
+            case NodeKind.LOAD:
+                return Load(strings[self.names[index]])
+            case NodeKind.OPERATOR:
+                return Operator(strings[self.names[index]], children[0], children[1])  # type: ignore
+            case NodeKind.CALL:
+                return Call(strings[self.names[index]], children)
+            case NodeKind.RETURN:
+                return Return(children[0])
+            case NodeKind.IF:
+                otherwise = children[2] if len(children) == 3 else None
+                return If(children[0], children[1], otherwise)  # type: ignore
+            case NodeKind.WHILE:
+                return While(children[0], children[1])  # type: ignore
+            case NodeKind.LITERAL_VALUE:
+                value_type = self.type_table[self.types[index]]
+                value: int | bool | None = self.values[index]
+                if isinstance(value_type, BoolType):
+                    value = bool(value)
+                elif isinstance(value_type, NullType):
+                    value = None
+                return LiteralValue(value_type, value)
+            case NodeKind.LARGE_LITERAL_VALUE:
+                return LiteralValue(self.type_table[self.types[index]], self.constants[self.values[index]])
+            case kind:
+                raise Exception(f"Unknown node kind {kind}")
@@ -1,40 +1,58 @@
-from abc import ABC
 from dataclasses import dataclass, field
-from typing import Literal as LiteralType, Optional
+from typing import TYPE_CHECKING, ClassVar, Dict, Literal as LiteralType, Optional
 
+if TYPE_CHECKING:
+    from mylang.symbol_table import Symbol, SymbolTable
 
-class Term(ABC):
-    pass
 
+# Nodes and types are slotted dataclasses without an instance __dict__,
+# large generated programs allocate millions of them. The bases are plain
+# classes rather than ABCs, so the passes' isinstance/match checks stay cheap.
+class Term:
+    __slots__ = ()
 
-class MyLangType(ABC):
-    pass
+
+class MyLangType:
+    __slots__ = ()
+
+
+class PrimitiveType(MyLangType):
+    """Type without parameters, interned: `IntType() is IntType()`."""
+
+    __slots__ = ()
+    _instances: ClassVar[Dict[type, "PrimitiveType"]] = {}
+
+    def __new__(cls):
+        instance = PrimitiveType._instances.get(cls)
+        if instance is None:
+            instance = PrimitiveType._instances[cls] = super().__new__(cls)
+        return instance
 
 
 BinOpName = LiteralType[
     "add", "sub", "mul", "div", "mod", "gt", "lt", "ge", "le", "eq", "ne", "or", "and", "not", "xor",
 ]
 
-@dataclass
-class IntType(MyLangType):
+@dataclass(frozen=True, slots=True)
+class IntType(PrimitiveType):
     size = 64
 
 
-@dataclass
-class BoolType(MyLangType):
+@dataclass(frozen=True, slots=True)
+class BoolType(PrimitiveType):
     size = 8
 
 
-@dataclass
-class NullType(MyLangType):
+@dataclass(frozen=True, slots=True)
+class NullType(PrimitiveType):
     pass
 
-@dataclass
+@dataclass(slots=True)
 class Parameter:
     name: str
     value_type: MyLangType
 
-@dataclass
+@dataclass(slots=True)
 class FunctionType(MyLangType):
     parameters: list[Parameter]
     return_type: MyLangType
@@ -61,76 +79,114 @@ class FunctionType(MyLangType):
         raise Exception(f"Environment {name} not found")
 
 
-@dataclass
+@dataclass(slots=True)
 class LiteralValue(Term):
     value_type: MyLangType
     value: int | bool | None
 
 
-@dataclass
+@dataclass(slots=True)
 class VariableDeclaration(Term):
     name: str
     value_type: MyLangType
     value: Term
+    # set by mylang.resolver
+    symbol: Optional["Symbol"] = field(default=None, compare=False, repr=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Store(Term):
     name: str
     value: Term
+    # set by mylang.resolver
+    symbol: Optional["Symbol"] = field(default=None, compare=False, repr=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Load(Term):
     name: str
+    # set by mylang.resolver
+    symbol: Optional["Symbol"] = field(default=None, compare=False, repr=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Operator(Term):
     op: BinOpName
     left: Term
     right: Term
 
 
-@dataclass
+@dataclass(slots=True)
 class Body(Term):
     statements: list[Term]
 
 
-@dataclass
+MemoPolicy = LiteralType["replace", "keep"]
+
+
+@dataclass(frozen=True, slots=True)
+class Memo:
+    """`@memo(capacity, policy)` on a function: its results are kept in a
+    table of `capacity` entries (see mylang/memo.py). On a collision the
+    new result replaces the stored one, or the stored one is kept."""
+    capacity: int = 1024
+    policy: MemoPolicy = "replace"
+
+
+@dataclass(slots=True)
 class Function(Term):
     name: str
     parameters: list[Parameter]
     body: Body
     return_type: MyLangType = NullType()
+    memo: Optional[Memo] = None
+    value_type: FunctionType = field(init=False, compare=False, repr=False)
+    # set by mylang.resolver
+    symbol: Optional["Symbol"] = field(default=None, compare=False, repr=False)
+    scope: Optional["SymbolTable"] = field(default=None, compare=False, repr=False)
 
-    @property
-    def value_type(self) -> FunctionType:
-        return FunctionType(
-            parameters=[param for param in self.parameters],
-            return_type=self.return_type,
-        )
+    def __post_init__(self):
+        # built once, the symbol table declares the function with this type
+        self.value_type = FunctionType(self.parameters, self.return_type)
 
 
-@dataclass
+@dataclass(slots=True)
 class Return(Term):
     value: Term
 
 
-@dataclass
+@dataclass(slots=True)
 class Call(Term):
     name: str
     arguments: list[Term]
+    # set by mylang.resolver, None for the C functions (print)
+    symbol: Optional["Symbol"] = field(default=None, compare=False, repr=False)
+    environment: list["Symbol"] = field(default_factory=list, compare=False, repr=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class If(Term):
     condition: Term
     then: Body
     otherwise: Body | None = None
 
 
-@dataclass
+@dataclass(slots=True)
+class While(Term):
+    condition: Term
+    body: Body
+
+
+@dataclass(slots=True)
+class Import(Term):
+    module: str
+    # exported functions of the imported module, loaded by mylang.build
+    interface: Optional[list[Parameter]] = field(default=None, compare=False, repr=False)
+    # set by mylang.resolver
+    symbols: list["Symbol"] = field(default_factory=list, compare=False, repr=False)
+
+
+@dataclass(slots=True)
 class Module(Term):
     body: Body
     name: str = "module"
@@ -0,0 +1,403 @@
+"""Separate compilation of multi-file projects (`mylang build`).
+
+`import name;` makes the top level functions of `name.mylang`, next to the
+entry file, callable from the importing file. Every file is a unit compiled
+to its own LLVM module: its top level functions are exported, everything
+else is internal, and the top level statements of an imported file become
+the function `<name>.init`, which the entry file's `main` calls before its
+own statements, dependencies first.
+
+Units are compiled in a process pool as soon as the interfaces (exported
+function signatures) of their imports are known. The build directory keeps
+the bitcode and the interface of every unit together with a key over its
+source, its imports' interfaces and the build options; a unit whose key is
+unchanged is not compiled again, so editing a function body only rebuilds
+the files that import it when its signature changes.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from llvmlite import binding, ir
+
+from mylang.ast.ast_objects import (
+    BoolType,
+    Function,
+    FunctionType,
+    Import,
+    IntType,
+    MyLangType,
+    NullType,
+    Parameter,
+)
+from mylang.cache import compiler_version
+from mylang.optimizer import OptimizationReport, link_time_optimize, optimize_module
+from mylang.parser.code_parser import CodeParser
+from mylang.parser.fast_lexer import IMPORT, SYMBOL, scan
+from mylang.target import TargetOptions, create_target_machine, initialize_llvm, set_module_target
+
+SOURCE_EXTENSION = ".mylang"
+BUILD_DIRECTORY = ".mylang-build"
+
+
+@dataclass
+class BuildOptions:
+    opt_level: str = "0"
+    target_options: Optional[TargetOptions] = None
+    lexer: str = "sly"
+    parser: str = "sly"
+    # optimize the linked program as a whole instead of every file
+    lto: bool = False
+    # fold constants and evaluate pure calls (not with --no-fold)
+    fold: bool = True
+
+
+@dataclass
+class SourceFile:
+    name: str
+    path: str
+    code: str
+    imports: List[str]
+
+
+@dataclass
+class UnitJob:
+    """Everything a worker needs to compile one file."""
+
+    source: SourceFile
+    entry: bool
+    # interface text of each import, by module name
+    interfaces: Dict[str, str]
+    # init functions the entry's main calls, dependencies first
+    initializers: List[str]
+    options: BuildOptions
+
+    def key(self) -> str:
+        target_options = (self.options.target_options or TargetOptions()).resolve()
+        digest = hashlib.sha256()
+        for part in (
+            compiler_version(),
+            self.source.name,
+            str(self.entry),
+            self.options.opt_level,
+            "fold" if self.options.fold else "no-fold",
+            target_options.triple or "",
+            target_options.cpu,
+            target_options.features,
+            self.source.code,
+            *self.initializers,
+            *(f"{name}:{self.interfaces[name]}" for name in self.source.imports),
+        ):
+            digest.update(part.encode("utf8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+
+@dataclass
+class BuildReport:
+    modules: int = 0
+    compiled: List[str] = field(default_factory=list)
+    optimization: Optional[OptimizationReport] = None
+
+    def __str__(self) -> str:
+        up_to_date = self.modules - len(self.compiled)
+        summary = f"build: {self.modules} modules, {len(self.compiled)} compiled, {up_to_date} up to date"
+        if self.optimization:
+            summary += f", link time {self.optimization}"
+        return summary
+
+
+# Interfaces
+def encode_type(value_type: MyLangType):
+    match value_type:
+        case IntType():
+            return "int"
+        case BoolType():
+            return "bool"
+        case NullType():
+            return "null"
+        case FunctionType() as function_type:
+            return {
+                "parameters": [
+                    [parameter.name, encode_type(parameter.value_type)]
+                    for parameter in function_type.parameters
+                ],
+                "return": encode_type(function_type.return_type),
+            }
+        case _:
+            raise Exception(f"Cannot export type {value_type}")
+
+
+def decode_type(description) -> MyLangType:
+    match description:
+        case "int":
+            return IntType()
+        case "bool":
+            return BoolType()
+        case "null":
+            return NullType()
+        case {"parameters": parameters, "return": return_type}:
+            return FunctionType(
+                [Parameter(name, decode_type(value_type)) for name, value_type in parameters],
+                decode_type(return_type),
+            )
+        case _:
+            raise Exception(f"Unknown type {description!r} in interface")
+
+
+def encode_interface(functions: List[Function]) -> str:
+    return json.dumps([[function.name, encode_type(function.value_type)] for function in functions])
+
+
+def decode_interface(interface: str) -> List[Parameter]:
+    return [Parameter(name, decode_type(value_type)) for name, value_type in json.loads(interface)]
+
+
+def init_function(module_name: str) -> str:
+    return f"{module_name}.init"
+
+
+# Sources
+def scan_imports(code: str) -> List[str]:
+    """Names imported by `code`, from the tokens alone."""
+    tokens = scan(code)
+    kinds = tokens.kinds
+    names = (
+        tokens.value(index + 1)
+        for index, kind in enumerate(kinds)
+        if kind == IMPORT and index + 1 < len(kinds) and kinds[index + 1] == SYMBOL
+    )
+    return list(dict.fromkeys(names))
+
+
+def discover_sources(entry_path: str) -> List[SourceFile]:
+    """The entry file and everything it imports, dependencies first."""
+    directory = os.path.dirname(os.path.abspath(entry_path))
+    entry_name = os.path.splitext(os.path.basename(entry_path))[0]
+    sources: Dict[str, SourceFile] = {}
+    order: List[SourceFile] = []
+    # (name, importer, imports done) depth first, `visiting` is the import chain
+    visiting: List[str] = []
+    stack: List[Tuple[str, Optional[str], bool]] = [(entry_name, None, False)]
+    while stack:
+        name, importer, done = stack.pop()
+        if done:
+            visiting.pop()
+            order.append(sources[name])
+            continue
+        if name in visiting:
+            cycle = " -> ".join(visiting[visiting.index(name):] + [name])
+            raise Exception(f"Import cycle: {cycle}")
+        if name in sources:
+            continue
+
+        path = entry_path if importer is None else os.path.join(directory, name + SOURCE_EXTENSION)
+        try:
+            with open(path, "r") as f:
+                code = f.read()
+        except FileNotFoundError:
+            raise Exception(f"Module {name} imported by {importer} not found: {path}")
+        sources[name] = SourceFile(name, path, code, scan_imports(code))
+        visiting.append(name)
+        stack.append((name, importer, True))
+        stack.extend((imported, name, False) for imported in reversed(sources[name].imports))
+    return order
+
+
+# Compilation of one unit, runs in the worker processes
+_code_parsers: Dict[Tuple[str, str], CodeParser] = {}
+
+
+def compile_unit(job: UnitJob) -> Tuple[bytes, str]:
+    """Bitcode and interface of one file."""
+    from mylang.compiler import MAIN_FUNCTION, create_main
+    from mylang.resolver import resolve_symbols
+    from mylang.symbol_table import create_symbol_table
+
+    options = job.options
+    code_parser = _code_parsers.get((options.lexer, options.parser))
+    if code_parser is None:
+        code_parser = _code_parsers[options.lexer, options.parser] = CodeParser(
+            options.lexer, options.parser  # type: ignore
+        )
+
+    try:
+        module = code_parser.parse(job.source.code)
+        for statement in module.body.statements:
+            if isinstance(statement, Import):
+                statement.interface = decode_interface(job.interfaces[statement.module])
+        symbol_table = resolve_symbols(module, create_symbol_table(module), options.fold)
+    except Exception as error:
+        raise Exception(f"{job.source.path}: {error}") from error
+
+    exported = [statement for statement in module.body.statements if isinstance(statement, Function)]
+    name = MAIN_FUNCTION if job.entry else init_function(job.source.name)
+    module_ir = ir.Module(name=job.source.name)
+    set_module_target(module_ir, create_target_machine(options.target_options))
+    create_main(module_ir, module.body, symbol_table, name=name, initializers=job.initializers)
+
+    public = {name} | {function.name for function in exported}
+    for function in module_ir.functions:
+        if not function.is_declaration and function.name not in public:
+            function.linkage = "internal"
+
+    initialize_llvm()
+    llvm_module = binding.parse_assembly(str(module_ir))
+    llvm_module.verify()
+    if options.opt_level != "0":
+        llvm_module, _ = optimize_module(llvm_module, options.opt_level, options.target_options)
+    return llvm_module.as_bitcode(), encode_interface(exported)
+
+
+def _run_inline(function, *args) -> Future:
+    future: Future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def _write_atomic(path: str, data: bytes):
+    file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(file_descriptor, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class Builder:
+    def __init__(
+        self,
+        entry_path: str,
+        build_directory: Optional[str] = None,
+        options: Optional[BuildOptions] = None,
+        jobs: Optional[int] = None,
+    ):
+        self.entry_path = entry_path
+        self.build_directory = build_directory or os.path.join(
+            os.path.dirname(os.path.abspath(entry_path)), BUILD_DIRECTORY
+        )
+        self.options = options or BuildOptions()
+        self.jobs = jobs or os.cpu_count() or 1
+
+    def path(self, name: str, extension: str) -> str:
+        return os.path.join(self.build_directory, name + extension)
+
+    def read_unit(self, name: str, key: str) -> Optional[str]:
+        """Interface of the stored unit `name`, if it was built with `key`."""
+        try:
+            with open(self.path(name, ".key"), "r") as f:
+                if f.read() != key:
+                    return None
+            with open(self.path(name, ".interface"), "r") as f:
+                interface = f.read()
+        except FileNotFoundError:
+            return None
+        return interface if os.path.exists(self.path(name, ".bc")) else None
+
+    def write_unit(self, name: str, key: str, bitcode: bytes, interface: str):
+        # the key goes last, a unit without a matching key is rebuilt
+        _write_atomic(self.path(name, ".bc"), bitcode)
+        _write_atomic(self.path(name, ".interface"), interface.encode("utf8"))
+        _write_atomic(self.path(name, ".key"), key.encode("utf8"))
+
+    def build(self) -> Tuple[binding.ModuleRef, BuildReport]:
+        os.makedirs(self.build_directory, exist_ok=True)
+        sources = discover_sources(self.entry_path)
+        entry = sources[-1]
+        initializers = [init_function(source.name) for source in sources[:-1]]
+        report = BuildReport(len(sources))
+        # with link time optimization the files are compiled unoptimized
+        options = replace(self.options, opt_level="0") if self.options.lto else self.options
+
+        interfaces: Dict[str, str] = {}
+        waiting = {source.name: set(source.imports) for source in sources}
+        dependents: Dict[str, List[str]] = {source.name: [] for source in sources}
+        for source in sources:
+            for imported in source.imports:
+                dependents[imported].append(source.name)
+        by_name = {source.name: source for source in sources}
+        ready = [source.name for source in sources if not source.imports]
+        running: Dict[Future, Tuple[str, str]] = {}
+
+        def finish(name: str, interface: str):
+            interfaces[name] = interface
+            for dependent in dependents[name]:
+                waiting[dependent].discard(name)
+                if not waiting[dependent]:
+                    ready.append(dependent)
+
+        executor = ProcessPoolExecutor(self.jobs) if self.jobs > 1 and len(sources) > 1 else None
+        try:
+            while ready or running:
+                while ready:
+                    source = by_name[ready.pop(0)]
+                    job = UnitJob(
+                        source,
+                        source is entry,
+                        {name: interfaces[name] for name in source.imports},
+                        initializers if source is entry else [],
+                        options,
+                    )
+                    key = job.key()
+                    interface = self.read_unit(source.name, key)
+                    if interface is not None:
+                        finish(source.name, interface)
+                        continue
+                    if executor:
+                        future = executor.submit(compile_unit, job)
+                    else:
+                        future = _run_inline(compile_unit, job)
+                    running[future] = (source.name, key)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key = running.pop(future)
+                    bitcode, interface = future.result()
+                    self.write_unit(name, key, bitcode, interface)
+                    report.compiled.append(name)
+                    finish(name, interface)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        llvm_module = self.link([source.name for source in sources])
+        if self.options.lto:
+            llvm_module, report.optimization = link_time_optimize(
+                llvm_module, self.options.opt_level, self.options.target_options
+            )
+        return llvm_module, report
+
+    def link(self, names: List[str]) -> binding.ModuleRef:
+        """One module of the stored units, in dependency order."""
+        initialize_llvm()
+        linked = None
+        for name in names:
+            with open(self.path(name, ".bc"), "rb") as f:
+                llvm_module = binding.parse_bitcode(f.read())
+            if linked is None:
+                linked = llvm_module
+                continue
+            try:
+                linked.link_in(llvm_module)
+            except RuntimeError as error:
+                raise Exception(f"Linking module {name} failed: {error}") from error
+        linked.verify()  # type: ignore
+        return linked  # type: ignore
+
+
+def build_project(
+    entry_path: str,
+    build_directory: Optional[str] = None,
+    options: Optional[BuildOptions] = None,
+    jobs: Optional[int] = None,
+) -> Tuple[binding.ModuleRef, BuildReport]:
+    return Builder(entry_path, build_directory, options, jobs).build()
@@ -0,0 +1,140 @@
+import functools
+import hashlib
+import os
+import tempfile
+import time
+from typing import Optional
+
+from mylang import __version__
+from mylang.target import TargetOptions
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+# temporary files older than this were left by a process that died writing
+STALE_TEMP_AGE = 60 * 60
+PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_version() -> str:
+    """The version with a hash of the compiler's own sources, for the keys
+    of stored artifacts: any change to the compiler invalidates them, even
+    without a version bump."""
+    digest = hashlib.sha256(__version__.encode("utf8"))
+    for root, directories, files in os.walk(PACKAGE_DIRECTORY):
+        directories.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, PACKAGE_DIRECTORY).encode("utf8") + b"\x00")
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return f"{__version__}+{digest.hexdigest()[:16]}"
+
+
+class CompilationCache:
+    """Content addressed store of compiled artifacts.
+
+    Entries are keyed by the source text, compiler version (including a
+    hash of its sources), target and optimization flags, so a hit can skip
+    the whole front end. Files are written atomically and the least
+    recently used ones are evicted once the directory grows over
+    `max_size` bytes, which keeps the cache safe to share between
+    concurrent compiler processes.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(
+        code: str,
+        kind: str,
+        opt_level: str,
+        target_options: Optional[TargetOptions] = None,
+        fold: bool = True,
+    ) -> str:
+        target_options = (target_options or TargetOptions()).resolve()
+        digest = hashlib.sha256()
+        for part in (
+            compiler_version(),
+            kind,
+            opt_level,
+            "fold" if fold else "no-fold",
+            target_options.triple or "",
+            target_options.cpu,
+            target_options.features,
+            code,
+        ):
+            digest.update(part.encode("utf8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                artifact = f.read()
+            # the modification time is the LRU clock
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return artifact
+
+    def put(self, key: str, artifact: bytes, evict: bool = True):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=".tmp-"
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as f:
+                f.write(artifact)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        # callers storing many entries at once evict after the last one
+        if evict:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.startswith(".tmp-"):
+                        # another process may still be writing a recent one
+                        if now - stat.st_mtime > STALE_TEMP_AGE:
+                            os.unlink(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                # another process evicted it first
+                pass
+            total_size -= size
+
+    def report(self) -> str:
+        return f"cache: {self.hits} hits, {self.misses} misses ({self.directory})"
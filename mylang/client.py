@@ -0,0 +1,68 @@
+"""Thin client of the compile daemon (`python -m mylang serve`).
+
+    python -m mylang.client example.mylang -O2 --run
+
+takes the same arguments as `python -m mylang` and sends them to the
+daemon, which compiles in its warm process and answers with the exit code
+and the output. Without a running daemon the client compiles in its own
+process. Only the standard library is imported before the request is
+sent, the compiler is imported by the fallback alone.
+
+Protocol: one JSON object per line in both directions, the request
+{"argv", "cwd", "environment"} and the response {"status", "stdout",
+"stderr"}.
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+SOCKET_ENV = "MYLANG_SOCKET"
+# environment variables the CLI reads, sent along with every request
+FORWARDED_ENVIRONMENT = ["MYLANG_CACHE_DIR"]
+
+
+def default_socket_path() -> str:
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"mylang-{os.getuid()}.sock")
+
+
+def request(argv: List[str], socket_path: Optional[str] = None) -> Dict:
+    message = {
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "environment": {
+            name: os.environ[name] for name in FORWARDED_ENVIRONMENT if name in os.environ
+        },
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path or default_socket_path())
+        connection.sendall(json.dumps(message).encode("utf8") + b"\n")
+        with connection.makefile("rb") as f:
+            response = f.readline()
+    if not response:
+        raise Exception("The compile daemon closed the connection")
+    return json.loads(response)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        response = request(argv)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # no daemon listening, compile here
+        from mylang.__main__ import main as cli_main
+
+        return cli_main(argv)
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["status"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
+from typing import AbstractSet, Dict, Iterable, Iterator, List, Optional, Type
+
 from llvmlite import ir, binding
 
+from mylang.ast.arena import AstArena, NodeKind
 from mylang.ast.ast_objects import (
     Body,
     BoolType,
@@ -7,6 +10,7 @@ from mylang.ast.ast_objects import (
     Function,
     FunctionType,
     If,
+    Import,
     IntType,
     LiteralValue,
     Load,
@@ -19,9 +23,18 @@ from mylang.ast.ast_objects import (
     Store,
     Term,
     VariableDeclaration,
+    While,
 )
+from mylang.folding import fold_constants
+from mylang.memo import compute_name, generate_memo_wrapper
 from mylang.parser.code_parser import CodeParser
-from mylang.symbol_table import SymbolTable, create_symbol_table, print_symbol_table
+from mylang.pure_calls import check_memoized, function_calls, memoized_functions, pure_keys
+from mylang.resolver import annotate_symbols, assign_slots, resolve_symbols
+from mylang.symbol_table import Symbol, SymbolTable, create_symbol_table, print_symbol_table
+from mylang.tail_calls import ACCUMULATORS, TailLoop, find_tail_loop
+from mylang.target import TargetOptions, create_target_machine, set_module_target
+
+MAIN_FUNCTION = "main"
 
 # Globals
 i1 = ir.IntType(1)
@@ -138,200 +151,409 @@ def to_llvm_bool(builder: ir.IRBuilder, llvm_named_value):
     return builder.trunc(llvm_named_value, i1)
 
 
-def create_statement(
-    builder: ir.IRBuilder, module: ir.Module, statement: Term, symbol_table: SymbolTable
-):
-    match statement:
-        case Operator() as operator:
-            left_value = create_statement(builder, module, operator.left, symbol_table)
-            right_value = create_statement(
-                builder, module, operator.right, symbol_table
-            )
-            result = parse_operator(builder, operator, left_value, right_value)  # type: ignore
-            return result
+class HoistingBuilder(ir.IRBuilder):
+    """Builder of a function body. Once the function has a loop, every
+    alloca goes to the entry block: in the loop it would take more stack on
+    each iteration, and mem2reg only promotes the entry block's."""
+
+    hoist_allocas = False
+
+    def alloca(self, typ, size=None, name=""):
+        if not self.hoist_allocas:
+            return super().alloca(typ, size, name)
+        with self.goto_entry_block():
+            return super().alloca(typ, size, name)
 
-        case VariableDeclaration() as variable_declaration:
-            if symbol_table.context_name != "module":
-                value = create_statement(
-                    builder, module, variable_declaration.value, symbol_table
-                )
-                value_type = convert_types(variable_declaration.value_type)
-                var_ptr = builder.alloca(
-                    value_type, name=variable_declaration.name + "_ptr"
-                )
-                builder.store(value, var_ptr)
-                symbol = symbol_table.lookup(variable_declaration.name)
-                symbol.llvm_lite_pointer = var_ptr
-            elif symbol_table.context_name == "module":
-                value = create_statement(
-                    builder, module, variable_declaration.value, symbol_table
-                )
-                value_type = convert_types(variable_declaration.value_type)
-                var_ptr = ir.GlobalVariable(
-                    module, value_type, name=variable_declaration.name
-                )
-                var_ptr.linkage = "internal"
-                var_ptr.initializer = generate_global_initializer(variable_declaration.value_type)  # type: ignore
-                symbol = symbol_table.lookup(variable_declaration.name)
-                symbol.llvm_lite_pointer = var_ptr
-                builder.store(value, var_ptr)
-
-        case Load() as load:
-            symbol = symbol_table.lookup(load.name)
-            if symbol.load_type == "argument" and symbol.llvm_lite_pointer is None:
-                arg_index = symbol_table.lookup(symbol_table.context_name).type.get_argument_index(load.name)  # type: ignore
-                return builder.function.args[arg_index]
 
-            return builder.load(symbol.llvm_lite_pointer, name=load.name)
+class TailLoopBuilder(HoistingBuilder):
+    """Builder of a function lowered to a loop (see mylang/tail_calls.py)."""
 
-        case Store() as store:
-            value = create_statement(builder, module, store.value, symbol_table)
-            symbol = symbol_table.lookup(store.name)
+    hoist_allocas = True
+
+    def __init__(self, block: ir.Block, tail_loop: TailLoop):
+        super().__init__(block)
+        self.tail_loop = tail_loop
+
+
+class StatementGenerator:
+    """Lowers statements to IR with an explicit work stack.
+
+    Machine generated programs nest operators, bodies and functions far
+    deeper than the python stack allows, so instead of recursing every node
+    schedules the work for its children on `tasks` and finishes once their
+    values are on `values`. Each node leaves exactly one value (None for
+    statements) on the value stack.
+
+    Functions named in `reused` are only declared, their definitions come
+    from an earlier build (see mylang/incremental.py).
+    """
+
+    def __init__(self, module: ir.Module, reused: AbstractSet[str] = frozenset()):
+        self.module = module
+        self.reused = reused
+        self.tasks: list = []
+        self.values: list = []
+
+    def run(self):
+        tasks = self.tasks
+        while tasks:
+            handler, node, node_builder, node_symbol_table = tasks.pop()
+            handler(node, node_builder, node_symbol_table)
+
+    def generate(
+        self, builder: ir.IRBuilder, statement: Term, symbol_table: SymbolTable
+    ):
+        self.schedule(self.visit, statement, builder, symbol_table)
+        self.run()
+        return self.values.pop()
+
+    def generate_declarations(self, statements: list[Term], symbol_table: SymbolTable):
+        """Only the module level definitions of `statements`: the functions
+        (which are generated unless reused) and the global variables."""
+        self.schedule_declarations(statements, symbol_table)
+        self.run()
+
+    def schedule(self, handler, node, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        self.tasks.append((handler, node, builder, symbol_table))
+
+    def schedule_statements(
+        self, statements: list[Term], builder: ir.IRBuilder, symbol_table: SymbolTable
+    ):
+        # pushed in reverse, so they run in source order
+        for statement in reversed(statements):
+            self.schedule(self.discard, None, builder, symbol_table)
+            self.schedule(self.visit, statement, builder, symbol_table)
+
+    def discard(self, node, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        self.values.pop()
+
+    def schedule_declarations(self, statements: list[Term], symbol_table: SymbolTable):
+        for statement in reversed(statements):
+            self.schedule(self.declare, statement, None, symbol_table)  # type: ignore
+
+    def declare(self, statement: Term, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        match statement:
+            case Function() as function:
+                self.visit_function(function, builder, symbol_table)
+                self.values.pop()
+            case VariableDeclaration() as variable_declaration if symbol_table.context_name == "module":
+                self.create_global(variable_declaration)
+            case Import() as import_statement:
+                self.declare_imports(import_statement)
+            case If() as if_statement:
+                if if_statement.otherwise:
+                    self.schedule_declarations(if_statement.otherwise.statements, symbol_table)
+                self.schedule_declarations(if_statement.then.statements, symbol_table)
+            case While() as while_statement:
+                self.schedule_declarations(while_statement.body.statements, symbol_table)
+            case _:
+                pass
+
+    def visit(self, statement: Term, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        values = self.values
+        match statement:
+            case Operator() as operator:
+                self.schedule(self.finish_operator, operator, builder, symbol_table)
+                self.schedule(self.visit, operator.right, builder, symbol_table)
+                self.schedule(self.visit, operator.left, builder, symbol_table)
+
+            case VariableDeclaration() as variable_declaration:
+                self.schedule(self.finish_variable_declaration, variable_declaration, builder, symbol_table)
+                self.schedule(self.visit, variable_declaration.value, builder, symbol_table)
+
+            case Load() as load:
+                symbol = load.symbol
+                if symbol.load_type == "argument" and symbol.llvm_lite_pointer is None:
+                    values.append(builder.function.args[symbol.slot])
+                else:
+                    values.append(builder.load(symbol.llvm_lite_pointer, name=load.name))
+
+            case Store() as store:
+                self.schedule(self.finish_store, store, builder, symbol_table)
+                self.schedule(self.visit, store.value, builder, symbol_table)
+
+            case LiteralValue() as literal_value:
+                values.append(convert_literals(literal_value.value_type, literal_value.value))
+
+            case Function() as function:
+                self.visit_function(function, builder, symbol_table)
+
+            case Return() as return_statement:
+                if isinstance(builder, TailLoopBuilder) and id(return_statement) in builder.tail_loop.calls:
+                    self.visit_tail_call(return_statement, builder, symbol_table)
+                else:
+                    self.schedule(self.finish_return, return_statement, builder, symbol_table)
+                    self.schedule(self.visit, return_statement.value, builder, symbol_table)
+
+            case Call() as call:
+                self.visit_call(call, builder, symbol_table)
+
+            case If() as if_statement:
+                self.schedule(self.finish_if_condition, if_statement, builder, symbol_table)
+                self.schedule(self.visit, if_statement.condition, builder, symbol_table)
+
+            case While() as while_statement:
+                self.visit_while(while_statement, builder, symbol_table)
+
+            case Import() as import_statement:
+                self.declare_imports(import_statement)
+                values.append(None)
+
+            case _:
+                values.append(None)
+
+    def finish_operator(self, operator: Operator, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        right_value = self.values.pop()
+        left_value = self.values.pop()
+        self.values.append(parse_operator(builder, operator, left_value, right_value))
+
+    def finish_variable_declaration(
+        self,
+        variable_declaration: VariableDeclaration,
+        builder: ir.IRBuilder,
+        symbol_table: SymbolTable,
+    ):
+        value = self.values.pop()
+        if symbol_table.context_name != "module":
+            value_type = convert_types(variable_declaration.value_type)
+            var_ptr = builder.alloca(value_type, name=variable_declaration.name + "_ptr")
+            builder.store(value, var_ptr)
+            variable_declaration.symbol.llvm_lite_pointer = var_ptr
+        else:
+            var_ptr = self.create_global(variable_declaration)
+            builder.store(value, var_ptr)
+        self.values.append(None)
+
+    def create_global(self, variable_declaration: VariableDeclaration) -> ir.GlobalVariable:
+        value_type = convert_types(variable_declaration.value_type)
+        var_ptr = ir.GlobalVariable(self.module, value_type, name=variable_declaration.name)
+        var_ptr.linkage = "internal"
+        var_ptr.initializer = generate_global_initializer(variable_declaration.value_type)  # type: ignore
+        variable_declaration.symbol.llvm_lite_pointer = var_ptr
+        return var_ptr
+
+    def declare_imports(self, import_statement: Import):
+        # defined in the module of the imported file, linked by mylang.build
+        for symbol in import_statement.symbols:
+            symbol.llvm_lite_pointer = ir.Function(
+                self.module, convert_types(symbol.type), name=symbol.name
+            )
+
+    def finish_store(self, store: Store, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        value = self.values.pop()
+        symbol = store.symbol
+        if symbol.load_type == "argument" and symbol.llvm_lite_pointer is None:
+            arg = builder.function.args[symbol.slot]
+            arg_ptr = builder.alloca(arg.type)
+            builder.store(arg, arg_ptr)
+            builder.store(value, arg_ptr)
+            symbol.llvm_lite_pointer = arg_ptr
+        self.values.append(builder.store(value, symbol.llvm_lite_pointer))
+
+    def finish_return(self, return_statement: Return, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        value = self.values.pop()
+        if isinstance(builder, TailLoopBuilder) and builder.tail_loop.accumulator is not None:
+            tail_loop = builder.tail_loop
+            value = parse_operator(builder, tail_loop.operator, builder.load(tail_loop.accumulator), value)  # type: ignore
+        elif isinstance(value, ir.CallInstr) and not any(isinstance(argument.type, ir.PointerType) for argument in value.args):
+            # nothing of the caller's frame is passed, the callee can reuse it
+            value.tail = "tail"
+        builder.ret(value)
+        self.values.append(None)
+
+    def visit_tail_call(self, return_statement: Return, builder: TailLoopBuilder, symbol_table: SymbolTable):
+        call, operand = builder.tail_loop.calls[id(return_statement)]
+        self.schedule(self.finish_tail_call, return_statement, builder, symbol_table)
+        for argument in reversed(call.arguments):
+            self.schedule(self.visit, argument, builder, symbol_table)
+        if operand is not None:
+            self.schedule(self.visit, operand, builder, symbol_table)
+
+    def finish_tail_call(self, return_statement: Return, builder: TailLoopBuilder, symbol_table: SymbolTable):
+        tail_loop = builder.tail_loop
+        call, operand = tail_loop.calls[id(return_statement)]
+        values = self.values
+        arguments = values[len(values) - len(call.arguments):]
+        del values[len(values) - len(call.arguments):]
+        if operand is not None:
+            total = parse_operator(builder, tail_loop.operator, builder.load(tail_loop.accumulator), values.pop())  # type: ignore
+            builder.store(total, tail_loop.accumulator)
+        # all arguments are evaluated before the parameters change
+        for pointer, argument in zip(tail_loop.parameters, arguments):
+            builder.store(argument, pointer)
+        builder.branch(tail_loop.block)
+        values.append(None)
+
+    def enter_tail_loop(self, function: Function, builder: TailLoopBuilder, symbol_table: SymbolTable):
+        """Move the parameters to stack slots and start the loop block."""
+        tail_loop = builder.tail_loop
+        for parameter in function.parameters:
+            tail_loop.parameters.append(self.spill_argument(symbol_table.symbols[parameter.name], builder))
+        if tail_loop.operator is not None:
+            return_type = builder.function.function_type.return_type
+            tail_loop.accumulator = builder.alloca(return_type, name="accumulator")
+            builder.store(ir.Constant(return_type, ACCUMULATORS[tail_loop.operator.op]), tail_loop.accumulator)
+        tail_loop.block = builder.append_basic_block(name="loop")
+        builder.branch(tail_loop.block)
+        builder.position_at_end(tail_loop.block)
+
+    def spill_argument(self, symbol: Symbol, builder: ir.IRBuilder) -> ir.Value:
+        """Move an argument to a stack slot, where it can be assigned."""
+        argument = builder.function.args[symbol.slot]
+        pointer = builder.alloca(argument.type, name=symbol.name + "_ptr")
+        builder.store(argument, pointer)
+        symbol.llvm_lite_pointer = pointer
+        return pointer
+
+    def visit_while(self, while_statement: While, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        if isinstance(builder, HoistingBuilder):
+            builder.hoist_allocas = True
+        # the condition reads the arguments the body assigns
+        for symbol in symbol_table.symbols.values():
             if symbol.load_type == "argument" and symbol.llvm_lite_pointer is None:
-                arg_index = symbol_table.lookup(symbol_table.context_name).type.get_argument_index(store.name) # type: ignore
-                arg = builder.function.args[arg_index]
-                arg_ptr = builder.alloca(arg.type)
-                builder.store(arg, arg_ptr)
-                builder.store(value, arg_ptr)
-                symbol.llvm_lite_pointer = arg_ptr
-            return builder.store(value, symbol.llvm_lite_pointer)
-
-        case LiteralValue() as literal_value:
-            return convert_literals(literal_value.value_type, literal_value.value)
-
-        case Function() as function:
-            function_symbol = symbol_table.lookup(function.name)
-            function_type_llvm = convert_types(function_symbol.type)
-            function_llvm = ir.Function(module, function_type_llvm, name=function.name)
-            function_symbol.llvm_lite_pointer = function_llvm
-            function_block = function_llvm.append_basic_block(name="entry")
-            function_builder = ir.IRBuilder(function_block)
-            function_symbol_table = symbol_table.get_context(function.name)
-
-            # load closure environment
-            if function_symbol_table.context_type == "closure":
-                env_struct_type = function_builder.function.args[-1]
-                for env_var in function_symbol.type.closure_parameters:  # type: ignore
-                    env_index = function_symbol.type.get_environment_index(env_var.name)  # type: ignore
-                    env_ptr_ptr = function_builder.gep(
-                        env_struct_type, [i32(0), i32(env_index)]
-                    )
-                    env_ptr = function_builder.load(env_ptr_ptr)
-                    env_symbol = function_symbol_table.lookup(env_var.name)
-                    env_symbol.llvm_lite_pointer = env_ptr
-
-            # create closure environment
-            if function.value_type.is_clojure:
-                # create closure struct = { function, env }
-                env_struct_type = function_type_llvm.args[-1]  # type: ignore
-                closure_struct_type = ir.LiteralStructType(
-                    function_type_llvm, env_struct_type
+                self.spill_argument(symbol, builder)
+
+        header = builder.append_basic_block(name="while")
+        body = builder.append_basic_block(name="while.body")
+        end = builder.append_basic_block(name="while.end")
+        builder.branch(header)
+        builder.position_at_end(header)
+        self.schedule(self.finish_while_condition, (while_statement, header, body, end), builder, symbol_table)
+        self.schedule(self.visit, while_statement.condition, builder, symbol_table)
+
+    def finish_while_condition(self, node, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        while_statement, header, body, end = node
+        builder.cbranch(to_llvm_bool(builder, self.values.pop()), body, end)
+        builder.position_at_end(body)
+        self.values.append(None)
+        self.schedule(self.finish_while, (header, end), builder, symbol_table)
+        self.schedule_statements(while_statement.body.statements, builder, symbol_table)
+
+    def finish_while(self, node, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        header, end = node
+        if not builder.block.is_terminated:
+            builder.branch(header)
+        builder.position_at_end(end)
+
+    def visit_function(self, function: Function, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        module = self.module
+        function_symbol = function.symbol
+        function_type_llvm = convert_types(function_symbol.type)
+        function_llvm = ir.Function(module, function_type_llvm, name=function.name)
+        function_symbol.llvm_lite_pointer = function_llvm
+        function_symbol_table = function.scope
+        if function.name in self.reused:
+            # declared only, nested functions may still need to be generated
+            self.values.append(None)
+            self.schedule_declarations(function.body.statements, function_symbol_table)
+            return
+
+        tail_loop = None
+        if function.memo is not None:
+            # the body is generated into a function of its own, called by
+            # the lookup on a miss; recursive calls go through the lookup
+            compute = ir.Function(module, function_type_llvm, name=compute_name(function.name))
+            generate_memo_wrapper(function_llvm, compute, function.memo)
+            function_llvm = compute
+        else:
+            tail_loop = find_tail_loop(function)
+        function_block = function_llvm.append_basic_block(name="entry")
+        if tail_loop is None:
+            function_builder = HoistingBuilder(function_block)
+        else:
+            function_builder = TailLoopBuilder(function_block, tail_loop)
+
+        # load closure environment
+        if function_symbol.type.closure_parameters:  # type: ignore
+            env_struct_type = function_builder.function.args[-1]
+            for env_var in function_symbol.type.closure_parameters:  # type: ignore
+                env_symbol = function_symbol_table.symbols[env_var.name]
+                env_ptr_ptr = function_builder.gep(
+                    env_struct_type, [i32(0), i32(env_symbol.slot)]
                 )
-                closure_struct_ptr = function_builder.alloca(closure_struct_type)
-                function_ptr_ptr = function_builder.gep(
-                    closure_struct_ptr, [i32(0), i32(0)]
+                env_ptr = function_builder.load(env_ptr_ptr)
+                env_symbol.llvm_lite_pointer = env_ptr
+
+        if tail_loop is not None:
+            self.enter_tail_loop(function, function_builder, function_symbol_table)  # type: ignore
+        self.values.append(None)
+        self.schedule_statements(function.body.statements, function_builder, function_symbol_table)
+
+    def visit_call(self, call: Call, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        env_struct_ptr = None
+        if call.environment:
+            env_struct_type = call.symbol.llvm_lite_pointer.args[-1].type.pointee  # type: ignore
+            env_struct_ptr = builder.alloca(env_struct_type)
+            for env_index, symbol in enumerate(call.environment):
+                env_var_ptr = builder.gep(
+                    env_struct_ptr, [i32(0), i32(env_index)]
                 )
-                builder.store(function_llvm, function_ptr_ptr)
+                if symbol.load_type == "argument" and symbol.llvm_lite_pointer is None:
+                    argument_var_ptr = builder.alloca(convert_types(symbol.type))
+                    builder.store(builder.function.args[symbol.slot], argument_var_ptr)
+                    builder.store(argument_var_ptr, env_var_ptr)
+                else:
+                    builder.store(symbol.llvm_lite_pointer, env_var_ptr)
+
+        self.schedule(self.finish_call, (call, env_struct_ptr), builder, symbol_table)
+        for argument in reversed(call.arguments):
+            self.schedule(self.visit, argument, builder, symbol_table)
+
+    def finish_call(self, node, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        call, env_struct_ptr = node
+        values = self.values
+        args = values[len(values) - len(call.arguments):]
+        del values[len(values) - len(call.arguments):]
+        if call.name == "print":
+            call_printf(builder, args)
+            values.append(None)
+            return
+
+        if env_struct_ptr is not None:
+            args.append(env_struct_ptr)
+        values.append(builder.call(self.callee(call.symbol, builder), args))
+
+    def callee(self, symbol: Symbol, builder: ir.IRBuilder) -> ir.Value:
+        """The value a call of the function `symbol` calls."""
+        return symbol.llvm_lite_pointer  # type: ignore
+
+    def finish_if_condition(self, if_statement: If, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        condition_result = to_llvm_bool(builder, self.values.pop())  # type: ignore
+        # the branch context managers stay open while the blocks are lowered
+        self.values.append(None)
+        if if_statement.otherwise:
+            if_else = builder.if_else(condition_result)
+            then, otherwise = if_else.__enter__()
+            self.schedule(self.exit_context, if_else, builder, symbol_table)
+            self.schedule_block(otherwise, if_statement.otherwise, builder, symbol_table)
+            self.schedule_block(then, if_statement.then, builder, symbol_table)
+        else:
+            if_then = builder.if_then(condition_result)
+            self.schedule(self.exit_context, if_then, builder, symbol_table)
+            self.schedule_statements(if_statement.then.statements, builder, symbol_table)
+            if_then.__enter__()
 
-                # store env variables in env_struct_ptr
-                env_struct_ptr = function_builder.gep(
-                    closure_struct_ptr, [i32(0), i32(1)]
-                )
-                for closure_parameter in function.value_type.closure_parameters:  # type: ignore
-                    to_load_symbol = function_symbol_table.lookup(
-                        closure_parameter.name
-                    )
-                    env_var_ptr = function_builder.alloca(
-                        convert_types(to_load_symbol.type)
-                    )
-
-                    if to_load_symbol.load_type == "argument":
-                        arg_index = function_symbol.type.get_argument_index(to_load_symbol.name)  # type: ignore
-                        builder.store(builder.function.args[arg_index], env_var_ptr)
-                    else:
-                        builder.store(to_load_symbol.llvm_lite_pointer, env_var_ptr)
-
-                    closure_parameter_index = function.value_type.get_environment_index(closure_parameter.name)  # type: ignore
-                    # get the pointer inside of env_struct_ptr for the current closure parameter
-                    env_var_ptr_ptr = function_builder.gep(
-                        env_struct_ptr, [i32(0), i32(closure_parameter_index)]
-                    )
-                    builder.store(env_var_ptr, env_var_ptr_ptr)
-
-            for statement in function.body.statements:
-                create_statement(
-                    function_builder, module, statement, function_symbol_table
-                )
+    def schedule_block(self, context, body: Body, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        self.schedule(self.exit_context, context, builder, symbol_table)
+        self.schedule_statements(body.statements, builder, symbol_table)
+        self.schedule(self.enter_context, context, builder, symbol_table)
 
-        case Return() as return_statement:
-            value = create_statement(
-                builder, module, return_statement.value, symbol_table
-            )
-            builder.ret(value)
-            pass
-
-        case Call() as call:
-            if call.name == "print":
-                args = [
-                    create_statement(builder, module, argument, symbol_table)
-                    for argument in call.arguments
-                ]
-                call_printf(builder, args)
-                return
-            
-            function_symbol = symbol_table.lookup(call.name)
-            if function_symbol.type.is_clojure:  # type: ignore
-                env_struct_type = function_symbol.llvm_lite_pointer.args[-1].type.pointee  # type: ignore
-                env_struct_ptr = builder.alloca(env_struct_type)
-                for closure_parameter in function_symbol.type.closure_parameters:  # type: ignore
-                    symbol = symbol_table.lookup(closure_parameter.name)
-                    if symbol.load_type == "argument":
-                        env_var_ptr = builder.gep(
-                            env_struct_ptr, [i32(0), i32(symbol.arg_index)]
-                        )
-                        argument_var_ptr = builder.alloca(convert_types(symbol.type))
-                        builder.store(builder.function.args[symbol.arg_index], argument_var_ptr)
-                        builder.store(argument_var_ptr, env_var_ptr)
-                    else:
-                        env_var_ptr = builder.gep(
-                            env_struct_ptr, [i32(0), i32(closure_parameter.index)]
-                        )
-                        builder.store(symbol.llvm_lite_pointer, env_var_ptr)
-                args = [
-                    create_statement(builder, module, argument, symbol_table)
-                    for argument in call.arguments
-                ]
-                args.append(env_struct_ptr)
-                function_return_value = builder.call(function_symbol.llvm_lite_pointer, args,)
-                return function_return_value
-            else:
-                function_return_value = builder.call(
-                    function_symbol.llvm_lite_pointer,
-                    [
-                        create_statement(builder, module, argument, symbol_table)
-                        for argument in call.arguments
-                    ],
-                )
-            return function_return_value
+    def enter_context(self, context, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        context.__enter__()
+
+    def exit_context(self, context, builder: ir.IRBuilder, symbol_table: SymbolTable):
+        context.__exit__(None, None, None)
 
-        case If() as if_statement:
-            condition_result = create_statement(
-                builder, module, if_statement.condition, symbol_table
-            )
-            condition_result = to_llvm_bool(builder, condition_result)  # type: ignore
-            if if_statement.otherwise:
-                with builder.if_else(condition_result) as (then, otherwise):
-                    with then:
-                        for statement in if_statement.then.statements:
-                            create_statement(builder, module, statement, symbol_table)
-
-                    with otherwise:
-                        for statement in if_statement.otherwise.statements:
-                            create_statement(builder, module, statement, symbol_table)
-            else:
-                with builder.if_then(condition_result):
-                    for statement in if_statement.then.statements:
-                        create_statement(builder, module, statement, symbol_table)
+
+def create_statement(
+    builder: ir.IRBuilder,
+    module: ir.Module,
+    statement: Term,
+    symbol_table: SymbolTable,
+    reused: AbstractSet[str] = frozenset(),
+    generator_class: Type[StatementGenerator] = StatementGenerator,
+):
+    return generator_class(module, reused).generate(builder, statement, symbol_table)
 
 
 def create_string(string: str) -> ir.Constant:
@@ -342,18 +564,35 @@ def create_string(string: str) -> ir.Constant:
     return string_constant
 
 
-def create_main(module: ir.Module, module_body: Body, symbol_table: SymbolTable):
+def create_main(
+    module: ir.Module,
+    module_body: Body | Iterable[Term],
+    symbol_table: SymbolTable,
+    reused: AbstractSet[str] = frozenset(),
+    name: str = MAIN_FUNCTION,
+    initializers: Iterable[str] = (),
+    generator_class: Type[StatementGenerator] = StatementGenerator,
+):
+    """Generate the top level statements as the function `name`, after
+    calling the (i32 ()) functions `initializers` in order."""
     printf_type = ir.FunctionType(
         ir.IntType(32), [ir.PointerType(ir.IntType(8))], var_arg=True
     )
     ir.Function(module, printf_type, name="printf")
     
     function_type = ir.FunctionType(ir.IntType(32), [])
-    function_ir = ir.Function(module, function_type, name="main")
+    function_ir = ir.Function(module, function_type, name=name)
+    statements = module_body.statements if isinstance(module_body, Body) else module_body
+    if name in reused:
+        generator_class(module, reused).generate_declarations(list(statements), symbol_table)
+        return module
+
     block = function_ir.append_basic_block(name="entry")
-    builder = ir.IRBuilder(block)
-    for statement in module_body.statements:
-        create_statement(builder, module, statement, symbol_table)
+    builder = HoistingBuilder(block)
+    for initializer in initializers:
+        builder.call(ir.Function(module, function_type, name=initializer), [])
+    for statement in statements:
+        create_statement(builder, module, statement, symbol_table, reused, generator_class)
 
     # declare printf
     printf_type = ir.FunctionType(
@@ -405,6 +644,91 @@ def call_printf(builder: ir.IRBuilder, args):
     printf_function = builder.module.get_global("printf")
     builder.call(printf_function, [format_string_ptr] + args)
 
+def resolve_arena(ast_arena: AstArena) -> SymbolTable:
+    """Symbol passes over an arena, one top level statement at a time.
+
+    Only the statement being processed exists as objects, so the peak memory
+    is the arena plus the largest top level statement.
+    """
+    symbol_table = SymbolTable("module")
+    for index in ast_arena.statements:
+        create_symbol_table(ast_arena.to_ast(index), symbol_table)
+    assign_slots(symbol_table)
+    if ast_arena.memos:
+        check_arena_memoized(ast_arena, symbol_table)
+    return symbol_table
+
+
+def check_arena_memoized(ast_arena: AstArena, symbol_table: SymbolTable):
+    """The `@memo` check of `mylang.pure_calls` over a resolved arena. Only
+    the top level functions are materialized, one at a time, and only the
+    memoized ones are kept."""
+    calls: Dict[int, Optional[List[Symbol]]] = {}
+    memoized: List[Function] = []
+    for index in ast_arena.statements:
+        if ast_arena.kinds[index] != NodeKind.FUNCTION:
+            continue
+        # folded and annotated as the whole module would be
+        body = fold_constants(Body([ast_arena.to_ast(index)]))
+        annotate_symbols(body, symbol_table)
+        function: Function = body.statements[0]  # type: ignore
+        calls[id(function.symbol)] = function_calls(function)
+        memoized.extend(memoized_functions(body))
+    check_memoized(memoized, pure_keys(calls))
+
+
+def arena_statements(ast_arena: AstArena, symbol_table: SymbolTable, fold: bool = True) -> Iterator[Term]:
+    """The top level statements of a resolved arena, folded (unless not
+    `fold`) and annotated one by one."""
+    for index in ast_arena.statements:
+        # in a body of its own, a constant if can be replaced by its branch
+        body = Body([ast_arena.to_ast(index)])
+        if fold:
+            fold_constants(body)
+        annotate_symbols(body, symbol_table)
+        yield from body.statements  # type: ignore
+
+
+def reset_symbols(symbol_table: SymbolTable):
+    """Forget the IR values of an earlier code generation, the symbols
+    would still point into its module."""
+    for table in symbol_table.walk():
+        for symbol in table.symbols.values():
+            symbol.llvm_lite_pointer = None
+
+
+def compile_arena(
+    ast_arena: AstArena,
+    symbol_table: SymbolTable,
+    target_options: TargetOptions | None = None,
+    fold: bool = True,
+) -> ir.Module:
+    reset_symbols(symbol_table)
+    module_ir = ir.Module(name="module")
+    set_module_target(module_ir, create_target_machine(target_options))
+    create_main(module_ir, arena_statements(ast_arena, symbol_table, fold), symbol_table)
+    return module_ir
+
+
+def compile_code(
+    code: str,
+    target_options: TargetOptions | None = None,
+    code_parser: CodeParser | None = None,
+    arena: bool = False,
+    fold: bool = True,
+) -> ir.Module:
+    code_parser = code_parser or CodeParser()
+    if arena:
+        ast_arena = code_parser.parse_arena(code)
+        return compile_arena(ast_arena, resolve_arena(ast_arena), target_options, fold)
+
+    module = code_parser.parse(code)
+    symbol_table = resolve_symbols(module, create_symbol_table(module), fold)
+    module_ir = ir.Module(name="module")
+    set_module_target(module_ir, create_target_machine(target_options))
+    create_main(module_ir, module.body, symbol_table)
+    return module_ir
+
 if __name__ == "__main__":
     code_parser = CodeParser()
     code = """
@@ -418,8 +742,8 @@ if __name__ == "__main__":
     print(outer_result);
     """
     module = code_parser.parse(code)
-    symbol_table = create_symbol_table(module)
+    symbol_table = resolve_symbols(module, create_symbol_table(module))
     module_ir = ir.Module(name="module")
-    module_ir.triple = "x86_64-pc-linux-gnu"
+    set_module_target(module_ir, create_target_machine())
     create_main(module_ir, module.body, symbol_table)
     print(module_ir)
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import tempfile
+from typing import Dict
+
+from llvmlite import binding, ir
+
+from mylang.target import TargetOptions, create_target_machine, parse_module
+
+EMIT_KINDS = ["ll", "bc", "asm", "obj", "exe"]
+
+EMIT_EXTENSIONS: Dict[str, str] = {
+    "ll": ".ll",
+    "bc": ".bc",
+    "asm": ".s",
+    "obj": ".o",
+    "exe": "",
+}
+
+EMIT_DESCRIPTIONS: Dict[str, str] = {
+    "ll": "LLVM IR",
+    "bc": "LLVM bitcode",
+    "asm": "Assembly",
+    "obj": "Object file",
+    "exe": "Executable",
+}
+
+
+def default_output(kind: str) -> str:
+    return "out" + EMIT_EXTENSIONS[kind]
+
+
+def emit_object(
+    llvm_module: binding.ModuleRef, target_options: TargetOptions | None = None
+) -> bytes:
+    # executables are linked as PIE by default on most distributions
+    target_machine = create_target_machine(target_options, reloc="pic")
+    return target_machine.emit_object(llvm_module)
+
+
+def link_executable(object_code: bytes, output: str, linker: str = "cc"):
+    with tempfile.TemporaryDirectory() as directory:
+        object_path = os.path.join(directory, "module.o")
+        with open(object_path, "wb") as f:
+            f.write(object_code)
+        result = subprocess.run(
+            [linker, object_path, "-o", output], capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise Exception(f"Linking with {linker} failed:\n{result.stderr}")
+
+
+def emit_bytes(
+    module: ir.Module | binding.ModuleRef,
+    kind: str,
+    target_options: TargetOptions | None = None,
+    target_machine: binding.TargetMachine | None = None,
+) -> bytes:
+    """Lower the module to the in-memory artifact for `kind`.
+
+    For `exe` that is the object file, it still has to be linked. A
+    `target_machine` (position independent) replaces `target_options`
+    when one is at hand.
+    """
+    if kind not in EMIT_KINDS:
+        raise Exception(f"Unknown emit kind {kind}")
+
+    if kind == "ll":
+        return str(module).encode("utf8")
+
+    llvm_module = parse_module(module) if isinstance(module, ir.Module) else module
+    match kind:
+        case "bc":
+            return llvm_module.as_bitcode()
+        case "asm":
+            target_machine = target_machine or create_target_machine(target_options, reloc="pic")
+            return target_machine.emit_assembly(llvm_module).encode("utf8")
+        case _:
+            if target_machine:
+                return target_machine.emit_object(llvm_module)
+            return emit_object(llvm_module, target_options)
+
+
+def write_artifact(artifact: bytes, kind: str, output: str):
+    if kind == "exe":
+        link_executable(artifact, output)
+        return
+    with open(output, "wb") as f:
+        f.write(artifact)
+
+
+def emit(
+    module: ir.Module | binding.ModuleRef,
+    kind: str,
+    output: str,
+    target_options: TargetOptions | None = None,
+):
+    write_artifact(emit_bytes(module, kind, target_options), kind, output)
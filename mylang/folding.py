@@ -0,0 +1,210 @@
+"""Constant folding and dead code elimination on the AST.
+
+Run between the symbol passes and code generation, so neither the front end
+nor LLVM (which does nothing at -O0) spends time on code that is known at
+compile time:
+
+- an `Operator` on two literals becomes a literal, with the wrapping and
+  truncating semantics of the generated instructions;
+- an `If` or `While` on a literal condition is replaced by the statements
+  that run, if any;
+- the statements after a `Return` are dropped.
+
+A dead branch that declares a variable or a function is kept: the symbol
+table already has the declaration and other statements may use it (a global
+declared in an `if (False)` branch reads as 0).
+"""
+from typing import Callable, Dict, List, Optional, Set
+
+from mylang.ast.ast_objects import (
+    BinOpName,
+    Body,
+    BoolType,
+    Call,
+    Function,
+    If,
+    Import,
+    IntType,
+    LiteralValue,
+    Module,
+    Operator,
+    Return,
+    Store,
+    Term,
+    VariableDeclaration,
+    While,
+)
+
+INT_BITS = IntType.size
+INT_MIN = -(1 << INT_BITS - 1)
+
+COMPARISONS = {
+    "gt": lambda left, right: left > right,
+    "lt": lambda left, right: left < right,
+    "ge": lambda left, right: left >= right,
+    "le": lambda left, right: left <= right,
+    "eq": lambda left, right: left == right,
+    "ne": lambda left, right: left != right,
+}
+BITWISE = {
+    "or": lambda left, right: left | right,
+    "and": lambda left, right: left & right,
+    "xor": lambda left, right: left ^ right,
+}
+
+
+def wrap(value: int) -> int:
+    """`value` as a signed 64 bit integer."""
+    value &= (1 << INT_BITS) - 1
+    return value - (1 << INT_BITS) if value >= 1 << INT_BITS - 1 else value
+
+
+def evaluate(op: BinOpName, left: LiteralValue, right: LiteralValue) -> Optional[LiteralValue]:
+    """The literal `left op right` evaluates to, None when it is not
+    folded: mixed or null types, or a division the CPU would trap on."""
+    if type(left.value_type) is not type(right.value_type) or not isinstance(left.value_type, (IntType, BoolType)):
+        return None
+    a, b = int(left.value), int(right.value)  # type: ignore
+    if op in COMPARISONS:
+        return LiteralValue(BoolType(), COMPARISONS[op](a, b))
+    if isinstance(left.value_type, BoolType):
+        if op in BITWISE:
+            return LiteralValue(BoolType(), bool(BITWISE[op](a, b)))
+        return None
+    match op:
+        case "add":
+            value = a + b
+        case "sub":
+            value = a - b
+        case "mul":
+            value = a * b
+        case "div" | "mod":
+            if b == 0 or (a == INT_MIN and b == -1):
+                return None
+            # sdiv and srem round towards zero
+            quotient = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)
+            value = quotient if op == "div" else a - b * quotient
+        case _ if op in BITWISE:
+            value = BITWISE[op](a, b)
+        case _:
+            return None
+    return LiteralValue(IntType(), wrap(value))
+
+
+def is_true(literal: LiteralValue) -> bool:
+    # a condition is truncated to i1, only its lowest bit counts
+    return bool(int(literal.value) & 1)  # type: ignore
+
+
+def declares(statement: Term, declaring: Set[int]) -> bool:
+    """Whether `statement` declares something, `declaring` holds the ids
+    of the bodies already known to."""
+    match statement:
+        case VariableDeclaration() | Function() | Import():
+            return True
+        case If() as if_statement:
+            return id(if_statement.then) in declaring or id(if_statement.otherwise) in declaring
+        case While() as while_statement:
+            return id(while_statement.body) in declaring
+    return False
+
+
+def live_statements(statement: Term, declaring: Set[int]) -> Optional[List[Term]]:
+    """What runs in place of an `If` or `While` on a literal condition,
+    None to keep `statement` as it is."""
+    match statement:
+        case If(condition=LiteralValue() as condition) as if_statement:
+            if is_true(condition):
+                run, dead = if_statement.then.statements, if_statement.otherwise
+            else:
+                run, dead = (if_statement.otherwise.statements if if_statement.otherwise else []), if_statement.then
+            if id(dead) not in declaring:
+                return run
+        case While(condition=LiteralValue() as condition) as while_statement:
+            if not is_true(condition) and id(while_statement.body) not in declaring:
+                return []
+    return None
+
+
+def fold_constants(
+    ast: Term, evaluate_call: Optional[Callable[[Call], Optional[LiteralValue]]] = None
+) -> Term:
+    """Fold the constants and drop the dead statements of `ast`, in place.
+    `evaluate_call` gives the literal a call with folded arguments returns,
+    if known (see mylang/pure_calls.py)."""
+    expressions: List[Operator | Call] = []
+    # nodes with expression fields, to point to the folded literals
+    parents: List[Term] = []
+    bodies: List[Body] = []
+    stack: List[Optional[Term]] = [ast]
+    while stack:
+        term = stack.pop()
+        match term:
+            case Module() as module:
+                stack.append(module.body)
+            case Body() as body:
+                bodies.append(body)
+                stack.extend(body.statements)
+            case Function() as function:
+                stack.append(function.body)
+            case Operator() as operator:
+                expressions.append(operator)
+                stack.append(operator.left)
+                stack.append(operator.right)
+            case Call() as call:
+                expressions.append(call)
+                stack.extend(call.arguments)
+            case VariableDeclaration() | Store() | Return():
+                parents.append(term)
+                stack.append(term.value)  # type: ignore
+            case If() as if_statement:
+                parents.append(if_statement)
+                stack.extend((if_statement.condition, if_statement.then, if_statement.otherwise))
+            case While() as while_statement:
+                parents.append(while_statement)
+                stack.extend((while_statement.condition, while_statement.body))
+
+    # operands are found after their operator, fold them first
+    folded: Dict[int, LiteralValue] = {}
+    for expression in reversed(expressions):
+        literal = None
+        if isinstance(expression, Call):
+            if folded:
+                expression.arguments = [folded.get(id(argument), argument) for argument in expression.arguments]
+            if evaluate_call is not None:
+                literal = evaluate_call(expression)
+        else:
+            left = folded.get(id(expression.left), expression.left)
+            right = folded.get(id(expression.right), expression.right)
+            if isinstance(left, LiteralValue) and isinstance(right, LiteralValue):
+                literal = evaluate(expression.op, left, right)
+            if literal is None:
+                expression.left, expression.right = left, right
+        if literal is not None:
+            folded[id(expression)] = literal
+
+    if folded:
+        for parent in parents:
+            match parent:
+                case If() | While():
+                    parent.condition = folded.get(id(parent.condition), parent.condition)  # type: ignore
+                case _:
+                    parent.value = folded.get(id(parent.value), parent.value)  # type: ignore
+
+    # nested bodies first, so a spliced branch is already simplified
+    declaring: Set[int] = set()
+    for body in reversed(bodies):
+        statements: List[Term] = []
+        for statement in body.statements:
+            if id(statement) in folded:
+                continue  # an evaluated call, without effects
+            live = live_statements(statement, declaring)
+            statements.extend([statement] if live is None else live)
+        for index, statement in enumerate(statements):
+            if isinstance(statement, Return):
+                del statements[index + 1:]
+                break
+        body.statements = statements
+        if any(declares(statement, declaring) for statement in statements):
+            declaring.add(id(body))
+    return ast
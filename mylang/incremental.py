@@ -0,0 +1,187 @@
+"""Function granularity incremental compilation.
+
+Every function (and `main`, the top level statements) gets a fingerprint
+of everything its IR depends on: its own AST without the bodies of nested
+functions, its signature and closure parameters, and the resolved symbol
+of every name it uses, including the signatures and environments of the
+functions it calls. The IR of each function is stored in the compilation
+cache under its fingerprint; on the next build only the functions whose
+fingerprint is not cached are generated, the others are declared and their
+stored definitions are linked back in.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from llvmlite import binding, ir
+
+from mylang.ast.ast_objects import (
+    Body,
+    Call,
+    Function,
+    If,
+    LiteralValue,
+    Load,
+    Module,
+    Operator,
+    Return,
+    Store,
+    Term,
+    VariableDeclaration,
+    While,
+)
+from mylang.cache import CompilationCache, compiler_version
+from mylang.compiler import MAIN_FUNCTION, create_main
+from mylang.memo import compute_name, table_name
+from mylang.parser.code_parser import CodeParser
+from mylang.resolver import resolve_symbols
+from mylang.symbol_table import Symbol, create_symbol_table
+from mylang.target import TargetOptions, create_target_machine, set_module_target
+
+
+@dataclass
+class IncrementalReport:
+    rebuilt: int
+    reused: int
+
+    def __str__(self) -> str:
+        return f"incremental: {self.rebuilt} functions rebuilt, {self.reused} reused"
+
+
+def describe_symbol(symbol: Optional[Symbol]) -> tuple:
+    if symbol is None:
+        return ()
+    return (symbol.name, symbol.load_type, symbol.slot, repr(symbol.type))
+
+
+def describe_node(term: Term) -> tuple:
+    """The part of a node its function's IR depends on, without children."""
+    match term:
+        case Function() as function:
+            return ("Function", function.name, repr(function.symbol.type), repr(function.memo))  # type: ignore
+        case VariableDeclaration() as variable_declaration:
+            return (
+                "VariableDeclaration",
+                repr(variable_declaration.value_type),
+                describe_symbol(variable_declaration.symbol),
+            )
+        case Store() as store:
+            return ("Store", describe_symbol(store.symbol))
+        case Load() as load:
+            return ("Load", describe_symbol(load.symbol))
+        case Call() as call:
+            return (
+                "Call",
+                call.name,
+                len(call.arguments),
+                describe_symbol(call.symbol),
+                tuple(describe_symbol(symbol) for symbol in call.environment),
+            )
+        case Operator() as operator:
+            return ("Operator", operator.op)
+        case LiteralValue() as literal_value:
+            return ("LiteralValue", repr(literal_value.value_type), repr(literal_value.value))
+        case Body() as body:
+            return ("Body", len(body.statements))
+        case Return():
+            return ("Return",)
+        case If() as if_statement:
+            return ("If", if_statement.otherwise is not None)
+        case _:
+            return (type(term).__name__,)
+
+
+def function_nodes(module: Module) -> Iterator[Tuple[Term, str]]:
+    """Every node of a module with the name of the LLVM function its code
+    goes to, in source order. A nested function node belongs to its
+    enclosing function, its body to the function itself."""
+    stack: List[Tuple[Term, str]] = [
+        (statement, MAIN_FUNCTION) for statement in reversed(module.body.statements)
+    ]
+    while stack:
+        term, owner = stack.pop()
+        yield term, owner
+        match term:
+            case Function() as function:
+                stack.append((function.body, function.name))
+            case VariableDeclaration() | Store() | Return():
+                stack.append((term.value, owner))  # type: ignore
+            case Operator() as operator:
+                stack.append((operator.right, owner))
+                stack.append((operator.left, owner))
+            case Call() as call:
+                stack.extend((argument, owner) for argument in reversed(call.arguments))
+            case Body() as body:
+                stack.extend((statement, owner) for statement in reversed(body.statements))
+            case If() as if_statement:
+                if if_statement.otherwise:
+                    stack.append((if_statement.otherwise, owner))
+                stack.append((if_statement.then, owner))
+                stack.append((if_statement.condition, owner))
+            case While() as while_statement:
+                stack.append((while_statement.body, owner))
+                stack.append((while_statement.condition, owner))
+
+
+def fingerprint_functions(module: Module) -> Dict[str, str]:
+    """Fingerprints of a resolved module, by LLVM function name."""
+    hashes = {MAIN_FUNCTION: hashlib.sha256(compiler_version().encode("utf8"))}
+    for term, owner in function_nodes(module):
+        description = repr(describe_node(term)).encode("utf8")
+        hashes[owner].update(description)
+        if isinstance(term, Function):
+            # the body belongs to the function, its owner only sees the signature
+            digest = hashes[term.name] = hashlib.sha256(compiler_version().encode("utf8"))
+            digest.update(description)
+    return {name: digest.hexdigest() for name, digest in hashes.items()}
+
+
+def definition_text(module_ir: ir.Module, name: str) -> str:
+    """Text of the definition of the function `name`, with the body and
+    the table of a memoized function (see mylang/memo.py)."""
+    parts = [str(module_ir.get_global(name)).rstrip("\n")]
+    for extra in (compute_name(name), table_name(name)):
+        if extra in module_ir.globals:
+            parts.append(str(module_ir.get_global(extra)).rstrip("\n"))
+    return "\n".join(parts)
+
+
+def link_definitions(module_ir: ir.Module, definitions: Dict[str, str]) -> str:
+    """Text of `module_ir` with the declarations of the reused functions
+    replaced by their stored definitions."""
+    declarations = {
+        str(module_ir.get_global(name)).rstrip("\n"): definition
+        for name, definition in definitions.items()
+    }
+    return "\n".join(declarations.get(line, line) for line in str(module_ir).split("\n"))
+
+
+def compile_incremental(
+    code: str,
+    cache: CompilationCache,
+    target_options: Optional[TargetOptions] = None,
+    code_parser: Optional[CodeParser] = None,
+    fold: bool = True,
+) -> Tuple[binding.ModuleRef, IncrementalReport]:
+    module = (code_parser or CodeParser()).parse(code)
+    symbol_table = resolve_symbols(module, create_symbol_table(module), fold)
+    fingerprints = fingerprint_functions(module)
+
+    definitions: Dict[str, str] = {}
+    for name, fingerprint in fingerprints.items():
+        definition = cache.get(fingerprint)
+        if definition is not None:
+            definitions[name] = definition.decode("utf8")
+
+    module_ir = ir.Module(name="module")
+    set_module_target(module_ir, create_target_machine(target_options))
+    create_main(module_ir, module.body, symbol_table, definitions.keys())
+
+    for name, fingerprint in fingerprints.items():
+        if name not in definitions:
+            cache.put(fingerprint, definition_text(module_ir, name).encode("utf8"), evict=False)
+    cache.evict()
+
+    llvm_module = binding.parse_assembly(link_definitions(module_ir, definitions))
+    llvm_module.verify()
+    return llvm_module, IncrementalReport(len(fingerprints) - len(definitions), len(definitions))
@@ -0,0 +1,58 @@
+import ctypes
+import ctypes.util
+
+from llvmlite import binding, ir
+
+from mylang.target import TargetOptions, create_target_machine, initialize_llvm, parse_module
+
+_libc_loaded = False
+
+
+def load_libc():
+    """Make the host libc symbols (printf, ...) visible to the JIT linker."""
+    global _libc_loaded
+    if _libc_loaded:
+        return
+    libc_path = ctypes.util.find_library("c")
+    if libc_path is None:
+        raise Exception("Could not find the host C library")
+    binding.load_library_permanently(libc_path)
+    _libc_loaded = True
+
+
+def create_execution_engine(
+    llvm_module: binding.ModuleRef, target_options: TargetOptions | None = None
+) -> binding.ExecutionEngine:
+    initialize_llvm()
+    load_libc()
+    # the code runs right here, so tune it for the host unless told otherwise
+    target_machine = create_target_machine(target_options or TargetOptions(cpu="native"))
+    llvm_module.triple = target_machine.triple
+    engine = binding.create_mcjit_compiler(llvm_module, target_machine)
+    engine.finalize_object()
+    engine.run_static_constructors()
+    return engine
+
+
+def flush_c_stdout():
+    # printf writes through the C stdio buffer, which python never flushes
+    ctypes.CDLL(None).fflush(None)
+
+
+def run_main(engine: binding.ExecutionEngine) -> int:
+    main_address = engine.get_function_address("main")
+    if not main_address:
+        raise Exception("Function main not found in module")
+    main_function = ctypes.CFUNCTYPE(ctypes.c_int32)(main_address)
+    try:
+        return main_function()
+    finally:
+        flush_c_stdout()
+
+
+def run_module(
+    module: ir.Module | binding.ModuleRef, target_options: TargetOptions | None = None
+) -> int:
+    llvm_module = parse_module(module) if isinstance(module, ir.Module) else module
+    engine = create_execution_engine(llvm_module, target_options)
+    return run_main(engine)
@@ -0,0 +1,231 @@
+"""Lazy JIT compilation (`--run --lazy`): functions are lowered and
+compiled to machine code on their first call.
+
+Up front only `main` (the top level statements) is generated. Every call
+to a function goes through a pointer in a global slot, `<name>.address`,
+defined by the module of `main`. The slots start out pointing to stubs,
+ctypes callbacks that generate the IR of the function's body into a module
+of its own, add it to the engine and patch the slot with the address of
+the machine code before forwarding the call. Later calls load the patched
+slot and jump straight to the compiled function. A function generated this
+way calls itself directly, its nested functions are lazy on their own.
+
+The functions of the later modules reach the globals of `main`'s module by
+name, so those are defined with external linkage. A function that fails to
+materialize aborts the program with the error and exit status 1, an
+exception cannot return through the machine code that called the stub.
+"""
+import ctypes
+import os
+import sys
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from llvmlite import binding, ir
+
+from mylang.ast.ast_objects import Body, Function, If, Load, Module, Store, Term, While
+from mylang.compiler import StatementGenerator, convert_types, create_main
+from mylang.incremental import function_nodes
+from mylang.jit import flush_c_stdout, load_libc, run_main
+from mylang.optimizer import Optimizer
+from mylang.parser.code_parser import CodeParser
+from mylang.resolver import resolve_symbols
+from mylang.symbol_table import Symbol, SymbolTable, create_symbol_table
+from mylang.target import TargetOptions, create_target_machine, initialize_llvm, set_module_target
+
+
+@dataclass
+class LazyReport:
+    functions: int
+    materialized: int
+    # spent generating and compiling the materialized functions
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"lazy: {self.materialized} of {self.functions} functions materialized "
+            f"({self.seconds * 1000:.1f} ms)"
+        )
+
+
+def slot_name(function_name: str) -> str:
+    return f"{function_name}.address"
+
+
+class LazyStatementGenerator(StatementGenerator):
+    """Calls the functions through their slots, unless the callee is
+    defined in the module being generated."""
+
+    def callee(self, symbol: Symbol, builder: ir.IRBuilder) -> ir.Value:
+        function = symbol.llvm_lite_pointer
+        if isinstance(function, ir.Function) and function.module is self.module and not function.is_declaration:
+            return function
+        slot = self.module.globals.get(slot_name(symbol.name))
+        if slot is None:
+            slot = ir.GlobalVariable(
+                self.module, convert_types(symbol.type).as_pointer(), name=slot_name(symbol.name)
+            )
+        return builder.load(slot)
+
+
+def collect_functions(module: Module) -> Dict[str, Function]:
+    """Every function of the module by name, nested ones included. Only
+    the statements are walked, functions never appear in expressions."""
+    functions: Dict[str, Function] = {}
+    stack: List[Term] = list(reversed(module.body.statements))
+    while stack:
+        match stack.pop():
+            case Function() as function:
+                functions[function.name] = function
+                stack.extend(reversed(function.body.statements))
+            case If() as if_statement:
+                if if_statement.otherwise:
+                    stack.extend(reversed(if_statement.otherwise.statements))
+                stack.extend(reversed(if_statement.then.statements))
+            case While() as while_statement:
+                stack.extend(reversed(while_statement.body.statements))
+    return functions
+
+
+def ctypes_type(llvm_type: ir.Type):
+    if isinstance(llvm_type, ir.VoidType):
+        return None
+    if isinstance(llvm_type, ir.PointerType):
+        return ctypes.c_void_p
+    return {8: ctypes.c_int8, 32: ctypes.c_int32, 64: ctypes.c_int64}[llvm_type.width]  # type: ignore
+
+
+class LazyProgram:
+    def __init__(
+        self,
+        module: Module,
+        symbol_table: SymbolTable,
+        opt_level: str = "0",
+        target_options: Optional[TargetOptions] = None,
+    ):
+        initialize_llvm()
+        load_libc()
+        self.symbol_table = symbol_table
+        self.functions = collect_functions(module)
+        self.report = LazyReport(len(self.functions), 0)
+        # the code runs right here, so tune it for the host unless told otherwise
+        self.target_machine = create_target_machine(target_options or TargetOptions(cpu="native"))
+        self.optimizer = Optimizer(opt_level, self.target_machine)
+
+        main_module = self.compile(self.generate_main(module))
+        self.engine = binding.create_mcjit_compiler(main_module, self.target_machine)
+        self.engine.finalize_object()
+        # the callbacks must live as long as the slots point to them
+        self.stubs: List[Callable] = []
+        self.prototypes: Dict[str, type] = {}
+        for name in self.functions:
+            self.stubs.append(self.create_stub(name))
+            self.patch(name, ctypes.cast(self.stubs[-1], ctypes.c_void_p).value)  # type: ignore
+
+    def create_module(self, name: str) -> ir.Module:
+        module_ir = ir.Module(name=name)
+        set_module_target(module_ir, self.target_machine)
+        printf_type = ir.FunctionType(ir.IntType(32), [ir.PointerType(ir.IntType(8))], var_arg=True)
+        ir.Function(module_ir, printf_type, name="printf")
+        return module_ir
+
+    def compile(self, module_ir: ir.Module) -> binding.ModuleRef:
+        llvm_module = binding.parse_assembly(str(module_ir))
+        llvm_module.verify()
+        self.optimizer.run(llvm_module)
+        return llvm_module
+
+    def generate_main(self, module: Module) -> ir.Module:
+        module_ir = ir.Module(name="module")
+        set_module_target(module_ir, self.target_machine)
+        create_main(
+            module_ir, module.body, self.symbol_table, self.functions.keys(),
+            generator_class=LazyStatementGenerator,
+        )
+        for name, function in self.functions.items():
+            slot = module_ir.globals.get(slot_name(name))
+            if slot is None:
+                slot = ir.GlobalVariable(
+                    module_ir, convert_types(function.symbol.type).as_pointer(), name=slot_name(name)  # type: ignore
+                )
+            slot.initializer = ir.Constant(slot.type.pointee, None)  # type: ignore
+        for value in module_ir.global_values:
+            if isinstance(value, ir.GlobalVariable):
+                value.linkage = ""
+        return module_ir
+
+    def generate_function(self, name: str) -> ir.Module:
+        function = self.functions[name]
+        module_ir = self.create_module(name)
+        # the globals the function itself uses, nested functions declare their own
+        declared: Set[str] = set()
+        for term, owner in function_nodes(Module(Body([function]))):
+            if owner != name or not isinstance(term, (Load, Store)):
+                continue
+            symbol: Symbol = term.symbol  # type: ignore
+            if symbol.load_type == "global" and symbol.name not in declared:
+                declared.add(symbol.name)
+                symbol.llvm_lite_pointer = ir.GlobalVariable(
+                    module_ir, convert_types(symbol.type), name=symbol.name
+                )
+
+        generator = LazyStatementGenerator(module_ir, self.functions.keys() - {name})
+        generator.visit_function(function, None, function.scope)  # type: ignore
+        generator.run()
+        return module_ir
+
+    def materialize(self, name: str) -> int:
+        start = time.perf_counter()
+        self.engine.add_module(self.compile(self.generate_function(name)))
+        self.engine.finalize_object()
+        address = self.engine.get_function_address(name)
+        self.patch(name, address)
+        self.report.materialized += 1
+        self.report.seconds += time.perf_counter() - start
+        return address
+
+    def patch(self, name: str, address: int):
+        slot_address = self.engine.get_global_value_address(slot_name(name))
+        ctypes.c_void_p.from_address(slot_address).value = address
+
+    def create_stub(self, name: str) -> Callable:
+        function_type = convert_types(self.functions[name].symbol.type)  # type: ignore
+        prototype = self.prototypes.get(str(function_type))
+        if prototype is None:
+            prototype = self.prototypes[str(function_type)] = ctypes.CFUNCTYPE(
+                ctypes_type(function_type.return_type),  # type: ignore
+                *(ctypes_type(argument) for argument in function_type.args),  # type: ignore
+            )
+
+        def stub(*arguments):
+            try:
+                address = self.materialize(name)
+            except BaseException:
+                # an exception cannot unwind through the machine code that
+                # called the stub, ctypes would print it and return 0
+                flush_c_stdout()
+                traceback.print_exc()
+                sys.stderr.flush()
+                os._exit(1)
+            return prototype(address)(*arguments)  # type: ignore
+
+        return prototype(stub)
+
+    def run(self) -> int:
+        return run_main(self.engine)
+
+
+def run_lazy(
+    code: str,
+    opt_level: str = "0",
+    target_options: Optional[TargetOptions] = None,
+    code_parser: Optional[CodeParser] = None,
+    fold: bool = True,
+) -> Tuple[int, LazyReport]:
+    module = (code_parser or CodeParser()).parse(code)
+    symbol_table = resolve_symbols(module, create_symbol_table(module), fold)
+    program = LazyProgram(module, symbol_table, opt_level, target_options)
+    exit_code = program.run()
+    return exit_code, program.report
@@ -0,0 +1,112 @@
+"""Memoized functions (`@memo`).
+
+The body of a memoized function `f` is generated as `f.compute`, and `f`
+becomes a wrapper that looks the arguments up in a table, `f.memo`, before
+calling it. The recursive calls of the body go through the wrapper, so
+`fib(n - 1) + fib(n - 2)` computes every `fib(k)` once. Only pure top level
+functions can be memoized (checked by mylang/pure_calls.py), their results
+only depend on their arguments.
+
+The table has `capacity` entries and lives as long as the program:
+
+- a function of one argument has a dense table indexed by the argument,
+  arguments outside of [0, capacity) are computed without the table;
+- otherwise a hash of the arguments picks one entry, which stores the
+  arguments next to the result. When the entry holds other arguments, the
+  `replace` policy stores the new result in their place, `keep` keeps the
+  old one and leaves the new result uncached.
+"""
+from llvmlite import ir
+
+from mylang.ast.ast_objects import Memo
+
+i8 = ir.IntType(8)
+i32 = ir.IntType(32)
+i64 = ir.IntType(64)
+
+# 64 bit FNV-1a
+FNV_OFFSET = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+
+
+def compute_name(name: str) -> str:
+    return f"{name}.compute"
+
+
+def table_name(name: str) -> str:
+    return f"{name}.memo"
+
+
+def key_value(builder: ir.IRBuilder, argument: ir.Value) -> ir.Value:
+    """The argument as an i64 table key."""
+    if not isinstance(argument.type, ir.IntType):
+        raise Exception(f"Cannot memoize {builder.function.name}, it takes a {argument.type}")
+    if argument.type.width < 64:
+        return builder.zext(argument, i64)
+    return argument
+
+
+def generate_memo_wrapper(wrapper: ir.Function, compute: ir.Function, memo: Memo):
+    """Define `wrapper` as the lookup of its arguments in a new table,
+    calling `compute` (same type, the function's body) on a miss."""
+    builder = ir.IRBuilder(wrapper.append_basic_block(name="entry"))
+    arguments = list(wrapper.args)
+    keys = [key_value(builder, argument) for argument in arguments]
+    dense = len(arguments) <= 1
+    # filled flag, the arguments unless dense, the result
+    fields = [i8] + ([] if dense else [i64] * len(keys)) + [wrapper.function_type.return_type]
+    table_type = ir.ArrayType(ir.LiteralStructType(fields), memo.capacity)
+    table = ir.GlobalVariable(wrapper.module, table_type, name=table_name(wrapper.name))
+    table.initializer = ir.Constant(table_type, None)  # type: ignore
+    capacity = ir.Constant(i64, memo.capacity)
+
+    lookup = wrapper.append_basic_block(name="lookup")
+    if dense:
+        index = keys[0] if keys else ir.Constant(i64, 0)
+        uncached = wrapper.append_basic_block(name="uncached")
+        builder.cbranch(builder.icmp_unsigned("<", index, capacity), lookup, uncached)
+        builder.position_at_end(uncached)
+        builder.ret(builder.call(compute, arguments))
+    else:
+        digest: ir.Value = ir.Constant(i64, FNV_OFFSET)
+        for key in keys:
+            digest = builder.mul(builder.xor(digest, key), ir.Constant(i64, FNV_PRIME))
+        digest = builder.xor(digest, builder.lshr(digest, ir.Constant(i64, 32)))
+        index = builder.urem(digest, capacity)
+        builder.branch(lookup)
+
+    builder.position_at_end(lookup)
+    entry = builder.gep(table, [i32(0), index])
+
+    def field(position: int) -> ir.Value:
+        return builder.gep(entry, [i32(0), i32(position)])
+
+    filled = builder.icmp_unsigned("!=", builder.load(field(0)), ir.Constant(i8, 0))
+    hit = filled
+    if not dense:
+        for position, key in enumerate(keys, 1):
+            hit = builder.and_(hit, builder.icmp_unsigned("==", builder.load(field(position)), key))
+    found = wrapper.append_basic_block(name="found")
+    missing = wrapper.append_basic_block(name="missing")
+    builder.cbranch(hit, found, missing)
+
+    builder.position_at_end(found)
+    builder.ret(builder.load(field(len(fields) - 1)))
+
+    builder.position_at_end(missing)
+    result = builder.call(compute, arguments)
+    if not dense and memo.policy == "keep":
+        keep = wrapper.append_basic_block(name="keep")
+        store = wrapper.append_basic_block(name="store")
+        # the recursive calls may have filled the entry since the lookup
+        filled = builder.icmp_unsigned("!=", builder.load(field(0)), ir.Constant(i8, 0))
+        builder.cbranch(filled, keep, store)
+        builder.position_at_end(keep)
+        builder.ret(result)
+        builder.position_at_end(store)
+    builder.store(ir.Constant(i8, 1), field(0))
+    if not dense:
+        for position, key in enumerate(keys, 1):
+            builder.store(key, field(position))
+    builder.store(result, field(len(fields) - 1))
+    builder.ret(result)
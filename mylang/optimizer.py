@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from llvmlite import binding, ir
+
+from mylang.target import TargetOptions, create_target_machine, parse_module
+
+OPT_LEVELS = ["0", "1", "2", "3", "s"]
+
+# (opt_level, size_level, inlining threshold) matching clang's defaults
+_PIPELINES: Dict[str, Tuple[int, int, int]] = {
+    "0": (0, 0, 0),
+    "1": (1, 0, 225),
+    "2": (2, 0, 225),
+    "3": (3, 0, 275),
+    "s": (2, 1, 75),
+}
+
+
+@dataclass
+class OptimizationReport:
+    opt_level: str
+    instructions_before: int
+    instructions_after: int
+
+    def __str__(self) -> str:
+        return (
+            f"-O{self.opt_level}: {self.instructions_before} -> "
+            f"{self.instructions_after} instructions"
+        )
+
+
+def count_instructions(llvm_module: binding.ModuleRef) -> int:
+    return sum(
+        len(list(block.instructions))
+        for function in llvm_module.functions
+        for block in function.blocks
+    )
+
+
+def create_pass_manager_builder(opt_level: str) -> binding.PassManagerBuilder:
+    level, size_level, inlining_threshold = _PIPELINES[opt_level]
+    pass_manager_builder = binding.PassManagerBuilder()
+    pass_manager_builder.opt_level = level
+    pass_manager_builder.size_level = size_level
+    pass_manager_builder.inlining_threshold = inlining_threshold
+    pass_manager_builder.loop_vectorize = level >= 2 and size_level == 0
+    pass_manager_builder.slp_vectorize = level >= 2 and size_level == 0
+    return pass_manager_builder
+
+
+class Optimizer:
+    """The pass pipeline of one optimization level, built once and run on
+    any number of modules. Only the function pass manager is per module."""
+
+    def __init__(self, opt_level: str, target_machine: binding.TargetMachine):
+        if opt_level not in _PIPELINES:
+            raise Exception(f"Unknown optimization level -O{opt_level}")
+        self.opt_level = opt_level
+        # the pass managers borrow the target machine analyses, keep it alive
+        self.target_machine = target_machine
+        self.pass_manager_builder = create_pass_manager_builder(opt_level)
+        self.module_pass_manager = binding.ModulePassManager()
+        target_machine.add_analysis_passes(self.module_pass_manager)
+        self.pass_manager_builder.populate(self.module_pass_manager)
+        # the builder only adds it from -O2 on, recursion is our only loop
+        self.module_pass_manager.add_tail_call_elimination_pass()
+
+    def run(self, llvm_module: binding.ModuleRef) -> OptimizationReport:
+        instructions_before = count_instructions(llvm_module)
+        if self.opt_level != "0":
+            function_pass_manager = binding.FunctionPassManager(llvm_module)
+            self.target_machine.add_analysis_passes(function_pass_manager)
+            self.pass_manager_builder.populate(function_pass_manager)
+            function_pass_manager.initialize()
+            for function in llvm_module.functions:
+                function_pass_manager.run(function)
+            function_pass_manager.finalize()
+            self.module_pass_manager.run(llvm_module)
+        return OptimizationReport(
+            self.opt_level, instructions_before, count_instructions(llvm_module)
+        )
+
+
+def optimize_module(
+    module: ir.Module | binding.ModuleRef,
+    opt_level: str = "2",
+    target_options: TargetOptions | None = None,
+) -> Tuple[binding.ModuleRef, OptimizationReport]:
+    llvm_module = parse_module(module) if isinstance(module, ir.Module) else module
+    optimizer = Optimizer(opt_level, create_target_machine(target_options))
+    return llvm_module, optimizer.run(llvm_module)
+
+
+def internalize(llvm_module: binding.ModuleRef, keep: Tuple[str, ...] = ("main",)):
+    """Give every definition except `keep` internal linkage, so the
+    optimizer sees the whole program: unused functions are dropped and
+    the others can be inlined or specialized across the former modules."""
+    for function in llvm_module.functions:
+        if not function.is_declaration and function.name not in keep:
+            function.linkage = "internal"
+    for global_variable in llvm_module.global_variables:
+        if not global_variable.is_declaration and global_variable.name not in keep:
+            global_variable.linkage = "internal"
+
+
+def link_time_optimize(
+    llvm_module: binding.ModuleRef,
+    opt_level: str = "2",
+    target_options: TargetOptions | None = None,
+) -> Tuple[binding.ModuleRef, OptimizationReport]:
+    """Optimize a module linked from separately compiled ones as a whole."""
+    internalize(llvm_module)
+    return optimize_module(llvm_module, opt_level, target_options)
@@ -0,0 +1,104 @@
+"""Code generation sharded over worker processes (`-j N`).
+
+After symbol resolution every function can be lowered on its own: it only
+needs the declarations of the other functions and the layouts of their
+closure environments, which the resolved program already has. The
+functions (and `main`) are split into one shard per worker, balanced by
+their number of AST nodes. A worker generates the whole program with the
+functions of the other shards only declared (the `reused` set of
+`StatementGenerator`) and returns the text of its own definitions, which
+the parent links into a module of declarations like
+`mylang.incremental.link_definitions` does.
+
+Every definition is generated with the same module state as in a serial
+build, so the output does not depend on the number of workers.
+"""
+import heapq
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
+
+from llvmlite import binding, ir
+
+from mylang.ast.ast_objects import Module
+from mylang.compiler import create_main, reset_symbols
+from mylang.incremental import definition_text, function_nodes, link_definitions
+from mylang.parser.code_parser import CodeParser
+from mylang.resolver import resolve_symbols
+from mylang.symbol_table import SymbolTable, create_symbol_table
+from mylang.target import TargetOptions, create_target_machine, initialize_llvm, set_module_target
+
+# The resolved program, set in the parent before the workers start. Forked
+# workers inherit it, the others parse the code themselves.
+_program: Optional[Tuple[Module, SymbolTable]] = None
+
+
+def resolve_program(code: str, code_parser: CodeParser, fold: bool = True) -> Tuple[Module, SymbolTable]:
+    module = code_parser.parse(code)
+    return module, resolve_symbols(module, create_symbol_table(module), fold)
+
+
+def load_program(code: str, lexer: str, parser: str, fold: bool):
+    global _program
+    if _program is None:
+        _program = resolve_program(code, CodeParser(lexer, parser), fold)  # type: ignore
+
+
+def shard_functions(sizes: Dict[str, int], shards: int) -> List[List[str]]:
+    """Split the functions into `shards` groups of about the same number of
+    nodes, largest first onto the smallest group."""
+    groups: List[List[str]] = [[] for _ in range(shards)]
+    heap = [(0, index) for index in range(shards)]
+    for name in sorted(sizes, key=lambda name: -sizes[name]):
+        size, index = heapq.heappop(heap)
+        groups[index].append(name)
+        heapq.heappush(heap, (size + sizes[name], index))
+    return [group for group in groups if group]
+
+
+def generate_shard(names: List[str], all_names: List[str]) -> Dict[str, str]:
+    """Text of the definitions of `names`, runs in a worker."""
+    module, symbol_table = _program  # type: ignore
+    # a worker may run several shards
+    reset_symbols(symbol_table)
+    module_ir = ir.Module(name="module")
+    create_main(module_ir, module.body, symbol_table, set(all_names) - set(names))
+    return {name: definition_text(module_ir, name) for name in names}
+
+
+def compile_parallel(
+    code: str,
+    jobs: Optional[int] = None,
+    target_options: Optional[TargetOptions] = None,
+    code_parser: Optional[CodeParser] = None,
+    fold: bool = True,
+) -> binding.ModuleRef:
+    global _program
+    code_parser = code_parser or CodeParser()
+    jobs = jobs or os.cpu_count() or 1
+    module, symbol_table = _program = resolve_program(code, code_parser, fold)
+    sizes = Counter(owner for _, owner in function_nodes(module))
+
+    definitions: Dict[str, str] = {}
+    try:
+        with ProcessPoolExecutor(
+            jobs,
+            initializer=load_program,
+            initargs=(code, code_parser.lexer_name, code_parser.parser_name, fold),
+        ) as executor:
+            shards = executor.map(generate_shard, shard_functions(sizes, jobs), repeat(list(sizes)))
+            for shard in shards:
+                definitions.update(shard)
+    finally:
+        _program = None
+
+    module_ir = ir.Module(name="module")
+    set_module_target(module_ir, create_target_machine(target_options))
+    create_main(module_ir, module.body, symbol_table, definitions.keys())
+
+    initialize_llvm()
+    llvm_module = binding.parse_assembly(link_definitions(module_ir, definitions))
+    llvm_module.verify()
+    return llvm_module
@@ -0,0 +1,27 @@
+"""Function annotations: `@name` or `@name(arguments)` before `function`.
+
+`@memo`, `@memo(capacity)` and `@memo(capacity, policy)` are the only ones.
+"""
+from typing import List
+
+from mylang.ast.ast_objects import Memo
+
+MEMO_POLICIES = ("replace", "keep")
+
+
+def create_memo(name: str, arguments: List[str]) -> Memo:
+    """The `Memo` of the annotation `@name(arguments)`."""
+    if name != "memo":
+        raise Exception(f"Unknown annotation @{name}")
+    if len(arguments) > 2:
+        raise Exception("@memo takes a capacity and a policy")
+    memo = Memo()
+    if arguments:
+        if not arguments[0].isdigit() or int(arguments[0]) == 0:
+            raise Exception(f"Invalid @memo capacity {arguments[0]}")
+        memo = Memo(int(arguments[0]))
+    if len(arguments) == 2:
+        if arguments[1] not in MEMO_POLICIES:
+            raise Exception(f"Unknown @memo policy {arguments[1]}, expected one of {', '.join(MEMO_POLICIES)}")
+        memo = Memo(memo.capacity, arguments[1])  # type: ignore
+    return memo
@@ -1,14 +1,40 @@
+from typing import Literal
+
+from mylang.ast.arena import AstArena
 from mylang.ast.ast_objects import Module
+from mylang.parser.fast_lexer import scan
 from mylang.parser.lexer import CalcLexer
 from mylang.parser.parser import CalcParser
+from mylang.parser.pratt_parser import PrattParser
+
+LexerName = Literal["sly", "fast"]
+ParserName = Literal["sly", "pratt"]
+LEXERS = ["sly", "fast"]
+PARSERS = ["sly", "pratt"]
 
 
 class CodeParser:
-    def __init__(self):
+    def __init__(self, lexer: LexerName = "sly", parser: ParserName = "sly"):
+        if lexer not in LEXERS:
+            raise Exception(f"Unknown lexer {lexer}")
+        if parser not in PARSERS:
+            raise Exception(f"Unknown parser {parser}")
+        # the pratt parser reads the fast lexer token arrays directly
+        self.lexer_name = "fast" if parser == "pratt" else lexer
+        self.parser_name = parser
         self.lexer = CalcLexer()
-        self.parser = CalcParser()
+        self.parser = PrattParser() if parser == "pratt" else CalcParser()
 
     def parse(self, code: str) -> Module:
-        tokens = self.lexer.tokenize(code)
-        ast = self.parser.parse(tokens)
+        if self.parser_name == "pratt":
+            ast = self.parser.parse(scan(code))
+        elif self.lexer_name == "fast":
+            ast = self.parser.parse(scan(code).sly_tokens())
+        else:
+            ast = self.parser.parse(self.lexer.tokenize(code))
         return Module(body=ast)
+
+    def parse_arena(self, code: str) -> AstArena:
+        if self.parser_name == "pratt":
+            return self.parser.parse_arena(scan(code))
+        return AstArena.from_ast(self.parse(code))
@@ -0,0 +1,189 @@
+"""Hand written scanner producing the same token stream as `CalcLexer`.
+
+Instead of one SLY `Token` object per token, `scan` fills parallel arrays
+of (kind, start, end, line). It works on bytes, so the input can be a
+`memoryview` or an `mmap` of the source file (`scan_file`).
+"""
+import mmap
+import re
+from array import array
+from itertools import accumulate, compress, repeat
+from operator import itemgetter, sub
+from typing import Dict, Iterator, List
+
+from sly.lex import LexError, Token
+
+TOKEN_NAMES: List[str] = [
+    "ARROW",
+    "SYMBOL_TYPE_ASSIGN",
+    "OPERATOR",
+    "ASSIGN",
+    "FUNCTION",
+    "L_PARENTHESIS",
+    "R_PARENTHESIS",
+    "L_BRACE",
+    "R_BRACE",
+    "COMMA",
+    "RETURN",
+    "IF",
+    "ELSE",
+    "END_STATEMENT",
+    "BOOL",
+    "SYMBOL",
+    "NUMBER",
+    "NULL",
+    "IMPORT",
+    "WHILE",
+    "AT",
+]
+(
+    ARROW,
+    SYMBOL_TYPE_ASSIGN,
+    OPERATOR,
+    ASSIGN,
+    FUNCTION,
+    L_PARENTHESIS,
+    R_PARENTHESIS,
+    L_BRACE,
+    R_BRACE,
+    COMMA,
+    RETURN,
+    IF,
+    ELSE,
+    END_STATEMENT,
+    BOOL,
+    SYMBOL,
+    NUMBER,
+    NULL,
+    IMPORT,
+    WHILE,
+    AT,
+) = range(len(TOKEN_NAMES))
+
+KEYWORDS = {
+    b"function": FUNCTION,
+    b"return": RETURN,
+    b"if": IF,
+    b"else": ELSE,
+    b"import": IMPORT,
+    b"while": WHILE,
+    b"null": NULL,
+    b"True": BOOL,
+    b"False": BOOL,
+    b"or": OPERATOR,
+    b"and": OPERATOR,
+    b"xor": OPERATOR,
+}
+
+# Internal kinds, never stored in TokenArrays
+_NEWLINE = 254
+_ERROR = 255
+
+# Every match is one token with the blanks in front of it, so the matches
+# cover the whole source and the token offsets follow from their lengths.
+_SCANNER = re.compile(
+    rb"[ \t]*(?:[a-zA-Z_][a-zA-Z0-9_]*|\d+|->|==|!=|>=|<=|\n[\n \t]*|[^ \t])"
+)
+
+# Kind of a token by its exact text, then by its first byte
+_EXACT_KINDS: Dict[bytes, int] = {
+    b"->": ARROW,
+    b"==": OPERATOR,
+    b"!=": OPERATOR,
+    b">=": OPERATOR,
+    b"<=": OPERATOR,
+    b":": SYMBOL_TYPE_ASSIGN,
+    b"=": ASSIGN,
+    b"(": L_PARENTHESIS,
+    b")": R_PARENTHESIS,
+    b"{": L_BRACE,
+    b"}": R_BRACE,
+    b",": COMMA,
+    b"@": AT,
+    b";": END_STATEMENT,
+    **{bytes([operator]): OPERATOR for operator in b"-+*/%<>"},
+    **KEYWORDS,
+}
+_FIRST_BYTE_KINDS: List[int] = [_ERROR] * 256
+for _byte in b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_":
+    _FIRST_BYTE_KINDS[_byte] = SYMBOL
+for _byte in b"0123456789":
+    _FIRST_BYTE_KINDS[_byte] = NUMBER
+_FIRST_BYTE_KINDS[ord("\n")] = _NEWLINE
+
+
+class TokenArrays:
+    """Tokens of one source as parallel arrays, index i is the i-th token."""
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array("B")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.lines = array("q")
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def value(self, index: int) -> str:
+        return bytes(self.source[self.starts[index] : self.ends[index]]).decode("ascii")
+
+    def tuples(self) -> Iterator[tuple]:
+        return zip(self.kinds, self.starts, self.ends, self.lines)
+
+    def sly_tokens(self) -> Iterator[Token]:
+        """The tokens as SLY `Token` objects, for `CalcParser.parse`."""
+        source = self.source
+        for kind, start, end, line in self.tuples():
+            token = Token()
+            token.type = TOKEN_NAMES[kind]
+            token.value = bytes(source[start:end]).decode("ascii")
+            token.lineno = line
+            token.index = start
+            token.end = end
+            yield token
+
+
+def scan(source) -> TokenArrays:
+    """Tokenize a bytes-like object (bytes, memoryview, mmap) or a str.
+
+    All the per token work is done by C level map/accumulate pipelines over
+    the scanner matches, no python code runs per token.
+    """
+    if isinstance(source, str):
+        source = source.encode("utf8")
+
+    lexemes = _SCANNER.findall(source)
+    ends = list(accumulate(map(len, lexemes)))
+    texts = list(map(bytes.lstrip, lexemes, repeat(b" \t")))
+    kinds = array(
+        "B",
+        map(
+            _EXACT_KINDS.get,
+            texts,
+            map(_FIRST_BYTE_KINDS.__getitem__, map(itemgetter(0), texts)),
+        ),
+    )
+    if _ERROR in kinds:
+        index = kinds.index(_ERROR)
+        start = ends[index] - len(texts[index])
+        character = texts[index].decode("utf8", "replace")
+        raise LexError(f"Illegal character {character!r} at index {start}", character, start)
+
+    is_token = list(map(_NEWLINE.__ne__, kinds))
+    lines = accumulate(map(bytes.count, texts, repeat(b"\n")), initial=1)
+
+    tokens = TokenArrays(source)
+    tokens.kinds = array("B", compress(kinds, is_token))
+    tokens.starts = array("q", compress(map(sub, ends, map(len, texts)), is_token))
+    tokens.ends = array("q", compress(ends, is_token))
+    tokens.lines = array("q", compress(lines, is_token))
+    return tokens
+
+
+def scan_file(path: str) -> TokenArrays:
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return scan(b"")
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return scan(source)
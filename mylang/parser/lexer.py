@@ -21,26 +21,38 @@ class CalcLexer(Lexer):
         "SYMBOL",
         "NUMBER",
         "NULL",
+        "IMPORT",
+        "WHILE",
+        "AT",
     }
 
     ARROW = r"->"
     SYMBOL_TYPE_ASSIGN = r":"
-    OPERATOR = r"[-+*/%]|==|!=|>=|<=|>|<|or|and|xor"
+    OPERATOR = r"[-+*/%]|==|!=|>=|<=|>|<"
     ASSIGN = r"="
-    FUNCTION = r"function "
     L_PARENTHESIS = r"\("
     R_PARENTHESIS = r"\)"
     L_BRACE = r"\{"
     R_BRACE = r"\}"
     COMMA = r","
-    RETURN = r"return"
-    IF = r"if"
-    ELSE = r"else"
+    AT = r"@"
     END_STATEMENT = r";"
-    BOOL = r"True|False"
     SYMBOL = r"[a-zA-Z_][a-zA-Z0-9_]*"
     NUMBER = r"\d+"
-    NULL = r"null"
+
+    # Keywords, matched as whole symbols so "order" or "iffy" stay symbols
+    SYMBOL["function"] = FUNCTION  # type: ignore
+    SYMBOL["return"] = RETURN  # type: ignore
+    SYMBOL["if"] = IF  # type: ignore
+    SYMBOL["else"] = ELSE  # type: ignore
+    SYMBOL["import"] = IMPORT  # type: ignore
+    SYMBOL["while"] = WHILE  # type: ignore
+    SYMBOL["null"] = NULL  # type: ignore
+    SYMBOL["True"] = BOOL  # type: ignore
+    SYMBOL["False"] = BOOL  # type: ignore
+    SYMBOL["or"] = "OPERATOR"
+    SYMBOL["and"] = "OPERATOR"
+    SYMBOL["xor"] = "OPERATOR"
     ignore = " \t"
 
     @_(r"\n+")  # type: ignore
@@ -17,7 +17,10 @@ from mylang.ast.ast_objects import (
     Return,
     Call,
     If,
+    Import,
+    While,
 )
+from mylang.parser.annotations import create_memo
 from mylang.parser.lexer import CalcLexer
 
 
@@ -49,6 +52,12 @@ class CalcParser(Parser):
 
     # debugfile = "parser.out"
 
+    def error(self, token):
+        # raise like the pratt parser, SLY would print the error and go on
+        if token:
+            raise Exception(f"Syntax error at line {token.lineno}, token={token.type}")
+        raise Exception("Parse error in input. EOF")
+
     @_("body statement")  # type: ignore
     def body(self, p):  # type: ignore
         p.body.statements.append(p.statement)
@@ -67,6 +76,11 @@ class CalcParser(Parser):
     def statement(self, p):  # type: ignore
         return If(p.expr, p.body0, p.body1)
 
+    # While loop
+    @_("WHILE L_PARENTHESIS expr R_PARENTHESIS L_BRACE body R_BRACE")  # type: ignore
+    def statement(self, p):  # type: ignore
+        return While(p.expr, p.body)
+
     # Function definition
     @_("FUNCTION SYMBOL function_type L_BRACE body R_BRACE")  # type: ignore
     def statement(self, p):  # type: ignore
@@ -74,6 +88,33 @@ class CalcParser(Parser):
             p.SYMBOL, p.function_type.parameters, p.body, p.function_type.return_type
         )
 
+    @_("annotation FUNCTION SYMBOL function_type L_BRACE body R_BRACE")  # type: ignore
+    def statement(self, p):  # type: ignore
+        return Function(
+            p.SYMBOL, p.function_type.parameters, p.body, p.function_type.return_type, p.annotation
+        )
+
+    @_("AT SYMBOL")  # type: ignore
+    def annotation(self, p):  # type: ignore
+        return create_memo(p.SYMBOL, [])
+
+    @_("AT SYMBOL L_PARENTHESIS annotation_arguments R_PARENTHESIS")  # type: ignore
+    def annotation(self, p):  # type: ignore
+        return create_memo(p.SYMBOL, p.annotation_arguments)
+
+    @_("annotation_arguments COMMA annotation_argument")  # type: ignore
+    def annotation_arguments(self, p):  # type: ignore
+        p.annotation_arguments.append(p.annotation_argument)
+        return p.annotation_arguments
+
+    @_("annotation_argument")  # type: ignore
+    def annotation_arguments(self, p):  # type: ignore
+        return [p.annotation_argument]
+
+    @_("NUMBER", "SYMBOL")  # type: ignore
+    def annotation_argument(self, p):  # type: ignore
+        return p[0]
+
     @_("L_PARENTHESIS R_PARENTHESIS return_definition")  # type: ignore
     def function_type(self, p):  # type: ignore
         return FunctionType([], p.return_definition)
@@ -82,9 +123,9 @@ class CalcParser(Parser):
     def function_type(self, p):  # type: ignore
         return FunctionType(p.parameters, p.return_definition)
 
-    @_("SYMBOL SYMBOL_TYPE_ASSIGN SYMBOL")  # type: ignore
+    @_("SYMBOL SYMBOL_TYPE_ASSIGN type_name")  # type: ignore
     def parameter(self, p):  # type: ignore
-        return Parameter(p.SYMBOL0, self.type_map[p.SYMBOL1])
+        return Parameter(p.SYMBOL, p.type_name)
 
     @_("SYMBOL SYMBOL_TYPE_ASSIGN function_type")  # type: ignore
     def parameter(self, p):  # type: ignore
@@ -98,22 +139,31 @@ class CalcParser(Parser):
     def parameters(self, p):  # type: ignore
         return [p.parameter]
 
-    @_("ARROW SYMBOL")  # type: ignore
+    @_("ARROW type_name")  # type: ignore
     def return_definition(self, p):  # type: ignore
-        return self.type_map[p.SYMBOL]
+        return p.type_name
 
     @_("ARROW function_type")  # type: ignore
     def return_definition(self, p):  # type: ignore
         return p.function_type
 
+    # null is a keyword, the other types are symbols
+    @_("SYMBOL", "NULL")  # type: ignore
+    def type_name(self, p):  # type: ignore
+        return self.type_map[p[0]]
+
+    @_("IMPORT SYMBOL END_STATEMENT")  # type: ignore
+    def statement(self, p):  # type: ignore
+        return Import(p.SYMBOL)
+
     @_("RETURN expr END_STATEMENT")  # type: ignore
     def statement(self, p):  # type: ignore
         return Return(p.expr)
 
     # Assignments
-    @_("SYMBOL SYMBOL_TYPE_ASSIGN SYMBOL ASSIGN expr END_STATEMENT")  # type: ignore
+    @_("SYMBOL SYMBOL_TYPE_ASSIGN type_name ASSIGN expr END_STATEMENT")  # type: ignore
     def statement(self, p):  # type: ignore
-        return VariableDeclaration(p.SYMBOL0, self.type_map[p.SYMBOL1], p.expr)
+        return VariableDeclaration(p.SYMBOL, p.type_name, p.expr)
 
     @_("SYMBOL ASSIGN expr END_STATEMENT")  # type: ignore
     def statement(self, p):  # type: ignore
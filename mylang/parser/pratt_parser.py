@@ -0,0 +1,322 @@
+"""Hand written parser for the `fast_lexer` token arrays.
+
+It accepts the same language as `CalcParser` and builds the same
+`ast_objects` nodes, without SLY's per reduction action calls and symbol
+objects. Statements are parsed with a stack of the open blocks rather
+than recursion. Expressions use precedence climbing: operator chains are
+parsed in a loop, so the recursion depth only grows with the number of
+precedence levels, never with the length of the chain.
+"""
+from typing import Dict, List, NoReturn, Optional, Tuple
+
+from mylang.ast.arena import AstArena
+from mylang.ast.ast_objects import (
+    Body,
+    BoolType,
+    Call,
+    Function,
+    FunctionType,
+    If,
+    Import,
+    IntType,
+    LiteralValue,
+    Load,
+    MyLangType,
+    NullType,
+    Operator,
+    Parameter,
+    Return,
+    Store,
+    Term,
+    VariableDeclaration,
+    While,
+)
+from mylang.parser.annotations import create_memo
+from mylang.parser.fast_lexer import (
+    ARROW,
+    ASSIGN,
+    AT,
+    BOOL,
+    COMMA,
+    ELSE,
+    END_STATEMENT,
+    FUNCTION,
+    IF,
+    IMPORT,
+    L_BRACE,
+    L_PARENTHESIS,
+    NULL,
+    NUMBER,
+    OPERATOR,
+    R_BRACE,
+    R_PARENTHESIS,
+    RETURN,
+    SYMBOL,
+    SYMBOL_TYPE_ASSIGN,
+    TOKEN_NAMES,
+    WHILE,
+    TokenArrays,
+)
+from mylang.parser.parser import CalcParser
+
+_END = -1
+
+
+class PrattParser:
+    op_map = CalcParser.op_map
+    type_map = CalcParser.type_map
+
+    # Binding power of each operator, higher binds tighter. The SLY grammar
+    # has no precedence (`expr OPERATOR term`), so every operator shares one
+    # left associative level to build the same trees.
+    precedence: Dict[str, int] = {op: 1 for op in CalcParser.op_map.values()}
+
+    def start(self, tokens: TokenArrays):
+        self.tokens = tokens
+        # two end markers, so peeking one token ahead never needs a bounds check
+        self.kinds = tokens.kinds.tolist() + [_END, _END]
+        self.position = 0
+
+    def parse(self, tokens: TokenArrays) -> Body:
+        self.start(tokens)
+        return self.parse_body(_END)
+
+    def parse_arena(self, tokens: TokenArrays) -> AstArena:
+        """Parse into an arena, storing each top level statement as soon as
+        it is parsed, so the whole program never exists as objects."""
+        self.start(tokens)
+        arena = AstArena()
+        if self.peek() == _END:
+            self.error()
+        while self.peek() != _END:
+            arena.append(self.parse_statement())
+        return arena
+
+    # Token helpers
+    def peek(self, offset: int = 0) -> int:
+        return self.kinds[self.position + offset]
+
+    def error(self) -> NoReturn:
+        if self.kinds[self.position] != _END:
+            line = self.tokens.lines[self.position]
+            token = TOKEN_NAMES[self.kinds[self.position]]
+            raise Exception(f"Syntax error at line {line}, token={token}")
+        raise Exception("Parse error in input. EOF")
+
+    def expect(self, kind: int) -> int:
+        position = self.position
+        if self.kinds[position] != kind:
+            self.error()
+        self.position = position + 1
+        return position
+
+    def expect_value(self, kind: int) -> str:
+        return self.tokens.value(self.expect(kind))
+
+    def parse_type(self) -> MyLangType:
+        # null is a keyword, the other types are symbols
+        if self.peek() == NULL:
+            self.position += 1
+            return self.type_map["null"]
+        name = self.expect_value(SYMBOL)
+        try:
+            return self.type_map[name]
+        except KeyError:
+            raise Exception(f"Unknown type {name}")
+
+    # Statements
+    def parse_body(self, end_kind: int) -> Body:
+        statements: List[Term] = []
+        while self.peek() != end_kind:
+            statements.append(self.parse_statement())
+        if not statements:
+            self.error()
+        return Body(statements)
+
+    def parse_statement(self) -> Term:
+        """One statement, with the statements of its blocks.
+
+        The blocks being parsed are kept on a stack instead of parsing each
+        one recursively, so the nesting depth of the program is not limited
+        by the python stack.
+        """
+        statement, body = self.parse_statement_head()
+        # innermost last, with the statement the block belongs to
+        blocks: List[Tuple[Term, Body]] = [] if body is None else [(statement, body)]
+        while blocks:
+            owner, body = blocks[-1]
+            if self.peek() != R_BRACE:
+                nested, nested_body = self.parse_statement_head()
+                body.statements.append(nested)
+                if nested_body is not None:
+                    blocks.append((nested, nested_body))
+                continue
+            if not body.statements:
+                self.error()
+            self.position += 1
+            blocks.pop()
+            if isinstance(owner, If) and body is owner.then and self.peek() == ELSE:
+                self.position += 1
+                owner.otherwise = self.open_block()
+                blocks.append((owner, owner.otherwise))
+        return statement
+
+    def open_block(self) -> Body:
+        """Start a block, its statements are added as they are parsed."""
+        self.expect(L_BRACE)
+        return Body([])
+
+    def parse_statement_head(self) -> Tuple[Term, Optional[Body]]:
+        """A statement up to the opening brace of its block, with the empty
+        block, or the whole statement when it has no block."""
+        kind = self.peek()
+        if kind == IF:
+            self.position += 1
+            self.expect(L_PARENTHESIS)
+            condition = self.parse_expression()
+            self.expect(R_PARENTHESIS)
+            then = self.open_block()
+            return If(condition, then), then
+
+        if kind == WHILE:
+            self.position += 1
+            self.expect(L_PARENTHESIS)
+            condition = self.parse_expression()
+            self.expect(R_PARENTHESIS)
+            body = self.open_block()
+            return While(condition, body), body
+
+        if kind == FUNCTION:
+            function = self.parse_function_head()
+            return function, function.body
+
+        if kind == AT:
+            self.position += 1
+            name = self.expect_value(SYMBOL)
+            arguments: List[str] = []
+            if self.peek() == L_PARENTHESIS:
+                self.position += 1
+                arguments.append(self.parse_annotation_argument())
+                while self.peek() == COMMA:
+                    self.position += 1
+                    arguments.append(self.parse_annotation_argument())
+                self.expect(R_PARENTHESIS)
+            function = self.parse_function_head()
+            function.memo = create_memo(name, arguments)
+            return function, function.body
+
+        if kind == IMPORT:
+            self.position += 1
+            module = self.expect_value(SYMBOL)
+            self.expect(END_STATEMENT)
+            return Import(module), None
+
+        if kind == RETURN:
+            self.position += 1
+            value = self.parse_expression()
+            self.expect(END_STATEMENT)
+            return Return(value), None
+
+        if kind == SYMBOL and self.peek(1) == SYMBOL_TYPE_ASSIGN:
+            name = self.expect_value(SYMBOL)
+            self.position += 1
+            value_type = self.parse_type()
+            self.expect(ASSIGN)
+            value = self.parse_expression()
+            self.expect(END_STATEMENT)
+            return VariableDeclaration(name, value_type, value), None
+
+        if kind == SYMBOL and self.peek(1) == ASSIGN:
+            name = self.expect_value(SYMBOL)
+            self.position += 1
+            value = self.parse_expression()
+            self.expect(END_STATEMENT)
+            return Store(name, value), None
+
+        expression = self.parse_expression()
+        self.expect(END_STATEMENT)
+        return expression, None
+
+    def parse_function_head(self) -> Function:
+        self.expect(FUNCTION)
+        name = self.expect_value(SYMBOL)
+        function_type = self.parse_function_type()
+        return Function(
+            name, function_type.parameters, self.open_block(), function_type.return_type
+        )
+
+    def parse_annotation_argument(self) -> str:
+        if self.peek() == NUMBER:
+            return self.expect_value(NUMBER)
+        return self.expect_value(SYMBOL)
+
+    # Types
+    def parse_function_type(self) -> FunctionType:
+        self.expect(L_PARENTHESIS)
+        parameters: List[Parameter] = []
+        if self.peek() != R_PARENTHESIS:
+            parameters.append(self.parse_parameter())
+            while self.peek() == COMMA:
+                self.position += 1
+                parameters.append(self.parse_parameter())
+        self.expect(R_PARENTHESIS)
+        self.expect(ARROW)
+        return FunctionType(parameters, self.parse_type_definition())
+
+    def parse_parameter(self) -> Parameter:
+        name = self.expect_value(SYMBOL)
+        self.expect(SYMBOL_TYPE_ASSIGN)
+        return Parameter(name, self.parse_type_definition())
+
+    def parse_type_definition(self) -> MyLangType:
+        if self.peek() == L_PARENTHESIS:
+            return self.parse_function_type()
+        return self.parse_type()
+
+    # Expressions
+    def parse_expression(self, min_precedence: int = 1) -> Term:
+        left = self.parse_term()
+        kinds = self.kinds
+        while kinds[self.position] == OPERATOR:
+            op = self.op_map[self.tokens.value(self.position)]
+            op_precedence = self.precedence[op]
+            if op_precedence < min_precedence:
+                break
+            self.position += 1
+            right = self.parse_expression(op_precedence + 1)
+            left = Operator(op, left, right)
+        return left
+
+    def parse_term(self) -> Term:
+        kind = self.peek()
+        if kind == SYMBOL:
+            name = self.expect_value(SYMBOL)
+            if self.peek() != L_PARENTHESIS:
+                return Load(name)
+            self.position += 1
+            arguments: List[Term] = []
+            if self.peek() != R_PARENTHESIS:
+                arguments.append(self.parse_expression())
+                if self.peek() != R_PARENTHESIS:
+                    self.expect(COMMA)
+                    # as in the SLY grammar, the arguments after the first
+                    # comma may be separated by commas, blanks or both
+                    while self.peek() != R_PARENTHESIS:
+                        if self.peek() == COMMA:
+                            self.position += 1
+                        else:
+                            arguments.append(self.parse_expression())
+            self.expect(R_PARENTHESIS)
+            return Call(name, arguments)
+
+        if kind == NUMBER:
+            return LiteralValue(IntType(), int(self.expect_value(NUMBER)))
+
+        if kind == BOOL:
+            return LiteralValue(BoolType(), self.expect_value(BOOL) == "True")
+
+        if kind == NULL:
+            self.position += 1
+            return LiteralValue(NullType(), None)
+
+        self.error()
@@ -0,0 +1,311 @@
+"""Compile-time evaluation of pure function calls with constant arguments.
+
+A top level function is pure when nothing in it, its nested functions
+included, has an effect or reads state a call could see changed: no
+`print`, no load or store of a global, no import, and every function it
+calls is pure or one of its own nested functions. Its result then only
+depends on its arguments.
+
+A call of a pure function whose arguments fold to literals is evaluated by
+an interpreter over the AST and replaced by the literal it returns, so
+`print(fact(10));` prints a constant. The interpreter gives up, leaving the
+call to run as before, when the evaluation takes more than `STEP_BUDGET`
+steps or `MAX_DEPTH` nested calls, divides by zero, or falls off the end
+of the function. All the calls of a module share `MODULE_STEP_BUDGET`
+steps, so the compile time does not grow with the number of call sites.
+Results of top level functions are memoized for the compilation, `fib` is
+linear.
+
+The functions annotated with `@memo` are checked to be pure here as well.
+
+Needs the whole module, so it is not done for `--arena`; the `@memo` check
+is (see `mylang.compiler.check_arena_memoized`).
+"""
+from typing import Container, Dict, Iterable, List, Optional, Set, Tuple
+
+from mylang.ast.ast_objects import (
+    Body,
+    BoolType,
+    Call,
+    Function,
+    If,
+    Import,
+    IntType,
+    LiteralValue,
+    Load,
+    Module,
+    Operator,
+    Return,
+    Store,
+    Term,
+    VariableDeclaration,
+    While,
+)
+from mylang.folding import evaluate, fold_constants, is_true
+from mylang.symbol_table import Symbol
+
+STEP_BUDGET = 100_000
+MODULE_STEP_BUDGET = 500_000
+MAX_DEPTH = 60
+
+Key = Tuple[int, Tuple[Tuple[bool, int], ...]]
+
+
+class Unevaluable(Exception):
+    pass
+
+
+def is_value_type(value_type) -> bool:
+    return isinstance(value_type, (IntType, BoolType))
+
+
+def function_calls(function: Function) -> Optional[List[Symbol]]:
+    """The functions a resolved top level function calls, its nested ones
+    aside, None when it is impure by itself."""
+    if (
+        not all(is_value_type(parameter.value_type) for parameter in function.parameters)
+        or not is_value_type(function.return_type)
+    ):
+        return None
+    nested: Set[int] = set()
+    calls: List[Symbol] = []
+    stack: List[Optional[Term]] = [function.body]
+    while stack:
+        match stack.pop():
+            case Body() as body:
+                stack.extend(body.statements)
+            case Function() as nested_function:
+                nested.add(id(nested_function.symbol))
+                stack.append(nested_function.body)
+            case Import():
+                return None
+            case Load() | Store() as access if access.symbol.load_type == "global":  # type: ignore
+                return None
+            case Store() | VariableDeclaration() | Return() as term:
+                stack.append(term.value)  # type: ignore
+            case Call() as call:
+                if call.symbol is None:
+                    return None
+                calls.append(call.symbol)
+                stack.extend(call.arguments)
+            case Operator() as operator:
+                stack.append(operator.left)
+                stack.append(operator.right)
+            case If() as if_statement:
+                stack.extend((if_statement.condition, if_statement.then, if_statement.otherwise))
+            case While() as while_statement:
+                stack.extend((while_statement.condition, while_statement.body))
+    return [symbol for symbol in calls if id(symbol) not in nested]
+
+
+def pure_keys(calls: Dict[int, Optional[List[Symbol]]]) -> Set[int]:
+    """The pure ones of the top level functions, given by id of their
+    symbol with what `function_calls` returns for them."""
+    impure = {key for key, symbols in calls.items() if symbols is None}
+    callers: Dict[int, Set[int]] = {}
+    for key, symbols in calls.items():
+        for symbol in symbols or ():
+            if id(symbol) not in calls:
+                impure.add(key)  # imported
+            callers.setdefault(id(symbol), set()).add(key)
+
+    # the callers of an impure function are impure
+    pending = list(impure)
+    while pending:
+        for caller in callers.get(pending.pop(), ()):
+            if caller not in impure:
+                impure.add(caller)
+                pending.append(caller)
+    return calls.keys() - impure
+
+
+def find_pure_functions(module: Module) -> Dict[int, Function]:
+    """The pure top level functions of a resolved module, by id of their
+    symbol."""
+    functions: Dict[int, Function] = {}
+    for statement in module.body.statements:
+        if isinstance(statement, Function):
+            functions[id(statement.symbol)] = statement
+    pure = pure_keys({key: function_calls(function) for key, function in functions.items()})
+    return {key: function for key, function in functions.items() if key in pure}
+
+
+class Frame:
+    """The variables of one call. Nested functions read and assign the
+    variables they capture in the frame they were defined in."""
+
+    __slots__ = ("variables", "functions", "outer")
+
+    def __init__(self, outer: Optional["Frame"] = None):
+        self.variables: Dict[str, LiteralValue] = {}
+        # nested functions defined in this call, by id of their symbol
+        self.functions: Dict[int, Tuple[Function, "Frame"]] = {}
+        self.outer = outer
+
+    def owner(self, name: str) -> "Frame":
+        frame: Optional[Frame] = self
+        while frame is not None:
+            if name in frame.variables:
+                return frame
+            frame = frame.outer
+        raise Unevaluable(name)
+
+    def nested_function(self, symbol: Symbol) -> Optional[Tuple[Function, "Frame"]]:
+        frame: Optional[Frame] = self
+        while frame is not None:
+            if id(symbol) in frame.functions:
+                return frame.functions[id(symbol)]
+            frame = frame.outer
+        return None
+
+
+class Interpreter:
+    def __init__(self, functions: Dict[int, Function]):
+        self.functions = functions
+        self.results: Dict[Key, LiteralValue] = {}
+        self.failed: Set[Key] = set()
+        self.steps = 0
+        self.depth = 0
+        # of MODULE_STEP_BUDGET, left to the next calls
+        self.remaining = MODULE_STEP_BUDGET
+
+    def evaluate_call(self, call: Call) -> Optional[LiteralValue]:
+        """The literal a call returns, None unless it can be evaluated."""
+        function = self.functions.get(id(call.symbol))
+        if function is None or not all(isinstance(argument, LiteralValue) for argument in call.arguments):
+            return None
+        key = self.key(function, call.arguments)  # type: ignore
+        if key in self.failed or self.remaining == 0:
+            return None
+        budget = self.steps = min(STEP_BUDGET, self.remaining)
+        self.depth = 0
+        try:
+            return self.call(function, call.arguments, None)  # type: ignore
+        except (Unevaluable, RecursionError):
+            self.failed.add(key)
+            return None
+        finally:
+            self.remaining = max(0, self.remaining - (budget - self.steps))
+
+    def key(self, function: Function, arguments: List[LiteralValue]) -> Key:
+        return (id(function), tuple((isinstance(argument.value_type, BoolType), int(argument.value)) for argument in arguments))  # type: ignore
+
+    def tick(self):
+        self.steps -= 1
+        if self.steps < 0:
+            raise Unevaluable("step budget")
+
+    def call(self, function: Function, arguments: List[LiteralValue], outer: Optional[Frame]) -> LiteralValue:
+        # nested functions depend on the variables they capture
+        key = self.key(function, arguments) if outer is None else None
+        if key in self.results:
+            return self.results[key]  # type: ignore
+        if self.depth == MAX_DEPTH:
+            raise Unevaluable("depth")
+        frame = Frame(outer)
+        for parameter, argument in zip(function.parameters, arguments):
+            if type(parameter.value_type) is not type(argument.value_type):
+                raise Unevaluable(parameter.name)
+            frame.variables[parameter.name] = argument
+        self.depth += 1
+        result = self.execute(function.body.statements, frame)
+        self.depth -= 1
+        if result is None or type(result.value_type) is not type(function.return_type):
+            raise Unevaluable(function.name)
+        if key is not None:
+            self.results[key] = result
+        return result
+
+    def execute(self, statements: List[Term], frame: Frame) -> Optional[LiteralValue]:
+        """Run the statements, the value returned if one of them returns."""
+        for statement in statements:
+            self.tick()
+            match statement:
+                case Return() as return_statement:
+                    return self.value(return_statement.value, frame)
+                case VariableDeclaration() as variable_declaration:
+                    frame.variables[variable_declaration.name] = self.value(variable_declaration.value, frame)
+                case Store() as store:
+                    value = self.value(store.value, frame)
+                    frame.owner(store.name).variables[store.name] = value
+                case Function() as function:
+                    frame.functions[id(function.symbol)] = (function, frame)
+                case If() as if_statement:
+                    if is_true(self.value(if_statement.condition, frame)):
+                        body: Optional[Body] = if_statement.then
+                    else:
+                        body = if_statement.otherwise
+                    if body is not None:
+                        result = self.execute(body.statements, frame)
+                        if result is not None:
+                            return result
+                case While() as while_statement:
+                    while is_true(self.value(while_statement.condition, frame)):
+                        self.tick()
+                        result = self.execute(while_statement.body.statements, frame)
+                        if result is not None:
+                            return result
+                case _:
+                    self.value(statement, frame)
+        return None
+
+    def value(self, term: Term, frame: Frame) -> LiteralValue:
+        match term:
+            case LiteralValue() as literal_value:
+                if not is_value_type(literal_value.value_type):
+                    raise Unevaluable("null")
+                return literal_value
+            case Load() as load:
+                return frame.owner(load.name).variables[load.name]
+            case Operator() as operator:
+                result = evaluate(operator.op, self.value(operator.left, frame), self.value(operator.right, frame))
+                if result is None:
+                    raise Unevaluable(operator.op)
+                return result
+            case Call() as call:
+                self.tick()
+                arguments = [self.value(argument, frame) for argument in call.arguments]
+                nested = frame.nested_function(call.symbol)  # type: ignore
+                if nested is not None:
+                    return self.call(nested[0], arguments, nested[1])
+                function = self.functions.get(id(call.symbol))
+                if function is None:
+                    raise Unevaluable(call.name)
+                return self.call(function, arguments, None)
+        raise Unevaluable(type(term).__name__)
+
+
+def memoized_functions(body: Body) -> List[Function]:
+    """The functions annotated with `@memo` in `body`, nested ones included."""
+    functions: List[Function] = []
+    stack: List[Optional[Term]] = [body]
+    while stack:
+        match stack.pop():
+            case Body() as body:
+                stack.extend(body.statements)
+            case Function() as function:
+                if function.memo is not None:
+                    functions.append(function)
+                stack.append(function.body)
+            case If() as if_statement:
+                stack.extend((if_statement.then, if_statement.otherwise))
+            case While() as while_statement:
+                stack.append(while_statement.body)
+    return functions
+
+
+def check_memoized(functions: Iterable[Function], pure: Container[int]):
+    """Raise if one of the `@memo` `functions` is not one of the `pure`
+    top level functions: its cached results could be wrong."""
+    for function in functions:
+        if id(function.symbol) not in pure:
+            raise Exception(f"Function {function.name} cannot be memoized: it is not a pure top level function")
+
+
+def evaluate_pure_calls(module: Module):
+    """Replace the calls of pure functions with constant arguments in a
+    resolved and folded module by their results, and fold again."""
+    functions = find_pure_functions(module)
+    check_memoized(memoized_functions(module.body), functions)
+    if functions:
+        fold_constants(module, Interpreter(functions).evaluate_call)
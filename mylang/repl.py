@@ -0,0 +1,195 @@
+"""Interactive session, `python -m mylang repl`.
+
+The session keeps one symbol table and one running JIT engine. Every entry
+(a function, a declaration, any statement) is resolved against the symbol
+table of the earlier entries and compiled on its own into a small module:
+its top level statements go into a fresh entry function, the functions
+and globals of earlier entries are only declared, and the module is added
+to the engine next to the earlier ones, whose code and globals stay live.
+An entry costs the same however long the session already is.
+
+The functions and globals of the top level have external linkage, so the
+JIT links the declarations of later modules to them. A failing entry
+leaves the session as it was.
+"""
+import argparse
+import ctypes
+import sys
+from typing import List, Optional
+
+from llvmlite import binding, ir
+
+from mylang.ast.ast_objects import Call, Load, Module, Store
+from mylang.compiler import MAIN_FUNCTION, convert_types, create_main
+from mylang.folding import fold_constants
+from mylang.incremental import function_nodes
+from mylang.jit import flush_c_stdout, load_libc
+from mylang.optimizer import OPT_LEVELS, Optimizer
+from mylang.parser.code_parser import LEXERS, PARSERS, CodeParser
+from mylang.pure_calls import check_memoized, evaluate_pure_calls, find_pure_functions, memoized_functions
+from mylang.resolver import annotate_symbols, assign_context_slots
+from mylang.symbol_table import Symbol, SymbolTable, create_symbol_table
+from mylang.target import TargetOptions, create_target_machine, initialize_llvm, set_module_target
+
+
+class ReplSession:
+    def __init__(
+        self,
+        opt_level: str = "0",
+        target_options: Optional[TargetOptions] = None,
+        code_parser: Optional[CodeParser] = None,
+        fold: bool = True,
+    ):
+        initialize_llvm()
+        load_libc()
+        self.code_parser = code_parser or CodeParser("fast", "pratt")
+        self.fold = fold
+        self.symbol_table = SymbolTable("module")
+        # the code runs right here, so tune it for the host unless told otherwise
+        self.target_machine = create_target_machine(target_options or TargetOptions(cpu="native"))
+        self.optimizer = Optimizer(opt_level, self.target_machine)
+        base = binding.parse_assembly("")
+        base.triple = self.target_machine.triple
+        self.engine = binding.create_mcjit_compiler(base, self.target_machine)
+        self.entries = 0
+
+    def execute(self, source: str) -> int:
+        """Compile and run one entry, the value returned by its entry function."""
+        module = self.code_parser.parse(source)
+        symbols = self.symbol_table.symbols
+        first_new = len(symbols)
+        try:
+            create_symbol_table(module, self.symbol_table)
+            new_names = list(symbols)[first_new:]
+            self.assign_slots(new_names, first_new)
+            if self.fold:
+                fold_constants(module)
+            annotate_symbols(module, self.symbol_table)
+            if self.fold:
+                evaluate_pure_calls(module)
+            else:
+                check_memoized(memoized_functions(module.body), find_pure_functions(module))
+            entry = f"{MAIN_FUNCTION}.{self.entries}"
+            llvm_module = self.generate(module, new_names, entry)
+        except Exception:
+            self.forget(list(symbols)[first_new:])
+            raise
+
+        self.engine.add_module(llvm_module)
+        self.engine.finalize_object()
+        self.entries += 1
+        entry_function = ctypes.CFUNCTYPE(ctypes.c_int32)(self.engine.get_function_address(entry))
+        try:
+            return entry_function()
+        finally:
+            flush_c_stdout()
+
+    def assign_slots(self, new_names: List[str], first_slot: int):
+        # only the new symbols, the earlier ones keep their slots
+        for slot, name in enumerate(new_names, first_slot):
+            self.symbol_table.symbols[name].slot = slot
+            context = self.symbol_table._contexts.get(name)
+            if context is not None:
+                for table in context.walk():
+                    assign_context_slots(table)
+
+    def forget(self, names: List[str]):
+        for name in names:
+            del self.symbol_table.symbols[name]
+            self.symbol_table._contexts.pop(name, None)
+
+    def generate(self, module: Module, new_names: List[str], entry: str) -> binding.ModuleRef:
+        module_ir = ir.Module(name=entry)
+        set_module_target(module_ir, self.target_machine)
+        self.declare_earlier_symbols(module, module_ir, set(new_names))
+        create_main(module_ir, module.body, self.symbol_table, name=entry)
+
+        # nested functions stay private to the entry, their names may repeat
+        exported = set(new_names) | {entry}
+        for value in module_ir.global_values:
+            if value.name in exported:
+                value.linkage = ""
+            elif isinstance(value, ir.Function) and not value.is_declaration:
+                value.linkage = "internal"
+
+        llvm_module = binding.parse_assembly(str(module_ir))
+        llvm_module.verify()
+        self.optimizer.run(llvm_module)
+        return llvm_module
+
+    def declare_earlier_symbols(self, module: Module, module_ir: ir.Module, new_names: set):
+        """Declare the top level functions and globals of earlier entries
+        that `module` uses, their definitions are in the engine."""
+        declared: set = set()
+        for term, _ in function_nodes(module):
+            if not isinstance(term, (Call, Load, Store)) or term.symbol is None:
+                continue
+            symbol: Symbol = term.symbol
+            if symbol.load_type != "global" or symbol.name in new_names or symbol.name in declared:
+                continue
+            declared.add(symbol.name)
+            if isinstance(term, Call):
+                symbol.llvm_lite_pointer = ir.Function(module_ir, convert_types(symbol.type), name=symbol.name)
+            else:
+                symbol.llvm_lite_pointer = ir.GlobalVariable(module_ir, convert_types(symbol.type), name=symbol.name)
+
+
+def is_complete(source: str) -> bool:
+    """Whether the entry typed so far can be compiled, or needs more lines."""
+    stripped = source.strip()
+    return not stripped or (
+        source.count("{") <= source.count("}") and stripped[-1] in ";}"
+    )
+
+
+def create_repl_arg_parser():
+    parser = argparse.ArgumentParser(prog='mylang repl', description='Interactive MyLang session, every entry is JIT compiled on its own')
+    parser.add_argument('-O', dest='opt_level', choices=OPT_LEVELS, default='0', help='Optimization level of every entry: -O0, -O1, -O2, -O3 or -Os (default: -O0)')
+    parser.add_argument('--cpu', default='native', help='Target CPU name (default: native)')
+    parser.add_argument('--features', default='', help='Target CPU features, e.g. "+avx2,+fma" (default: all host features with --cpu native)')
+    parser.add_argument('--lexer', choices=LEXERS, default='fast', help='Lexer used by the front end (default: fast)')
+    parser.add_argument('--parser', choices=PARSERS, default='pratt', help='Parser used by the front end, pratt implies the fast lexer (default: pratt)')
+    parser.add_argument('--no-fold', dest='fold', action='store_false', help='Do not fold constants or evaluate calls of pure functions during compilation')
+    return parser
+
+
+def repl_main(argv: List[str]) -> int:
+    args = create_repl_arg_parser().parse_args(argv)
+    session = ReplSession(
+        args.opt_level,
+        TargetOptions(cpu=args.cpu, features=args.features),
+        CodeParser(args.lexer, args.parser),
+        args.fold,
+    )
+    interactive = sys.stdin.isatty()
+    if interactive:
+        try:
+            import readline  # noqa: F401  line editing and history for input()
+        except ImportError:
+            pass
+
+    lines: List[str] = []
+    while True:
+        try:
+            line = input(("... " if lines else ">>> ") if interactive else "")
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            print()
+            lines = []
+            continue
+        lines.append(line)
+        source = "\n".join(lines)
+        if not is_complete(source):
+            continue
+        lines = []
+        if not source.strip():
+            continue
+        try:
+            session.execute(source)
+        except Exception as error:
+            print(f"error: {error}", file=sys.stderr)
+
+    if interactive:
+        print()
+    return 0
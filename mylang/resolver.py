@@ -0,0 +1,142 @@
+"""Resolution pass run between `create_symbol_table` and code generation.
+
+It folds the constants of the AST (see mylang/folding.py), numbers the
+symbols of every context and records the resolved `Symbol` on each named
+AST node, so code generation reads `node.symbol` instead of searching the
+scope chain and never scans parameter lists for an index. Calls of pure
+functions with constant arguments are then evaluated (mylang/pure_calls.py).
+Both are skipped with `fold=False`.
+
+Slots, per context:
+    argument     position in the function parameters
+    dereference  position in the closure environment (`closure_parameters`)
+    local/global declaration order among the context's own variables
+"""
+from typing import Dict, List, Tuple
+
+from mylang.ast.ast_objects import (
+    Body,
+    Call,
+    Function,
+    FunctionType,
+    If,
+    Import,
+    Load,
+    Module,
+    Operator,
+    Return,
+    Store,
+    Term,
+    VariableDeclaration,
+    While,
+)
+from mylang.folding import fold_constants
+from mylang.pure_calls import check_memoized, evaluate_pure_calls, find_pure_functions, memoized_functions
+from mylang.symbol_table import SymbolTable
+
+
+def assign_slots(symbol_table: SymbolTable):
+    for table in symbol_table.walk():
+        assign_context_slots(table)
+
+
+def assign_context_slots(table: SymbolTable):
+    """Slots of the symbols of one context, without its nested contexts."""
+    environment: Dict[str, int] = {}
+    if table.context_name != table.module_context_name:
+        function_type = table.lookup(table.context_name).type
+        environment = {
+            parameter.name: index
+            for index, parameter in enumerate(function_type.closure_parameters)  # type: ignore
+        }
+
+    variable_count = 0
+    for symbol in table.symbols.values():
+        match symbol.load_type:
+            case "argument":
+                symbol.slot = symbol.arg_index
+            case "dereference":
+                symbol.slot = environment[symbol.name]
+            case _:
+                symbol.slot = variable_count
+                variable_count += 1
+
+
+def resolve_symbols(ast: Term, symbol_table: SymbolTable, fold: bool = True) -> SymbolTable:
+    """Annotate the AST built into `symbol_table` with the resolved symbols.
+    Without `fold` the AST is left as written (`--no-fold`)."""
+    if fold:
+        fold_constants(ast)
+    assign_slots(symbol_table)
+    annotate_symbols(ast, symbol_table)
+    if isinstance(ast, Module):
+        if fold:
+            evaluate_pure_calls(ast)
+        else:
+            check_memoized(memoized_functions(ast.body), find_pure_functions(ast))
+    return symbol_table
+
+
+def annotate_symbols(ast: Term, symbol_table: SymbolTable):
+    """Record the resolved symbols on the nodes of `ast`, a subtree of the
+    program in the context `symbol_table`. The slots must be assigned."""
+    stack: List[Tuple[Term, SymbolTable]] = [(ast, symbol_table)]
+    while stack:
+        term, table = stack.pop()
+        match term:
+            case Module() as module:
+                stack.append((module.body, table))
+
+            case Body() as body:
+                stack.extend((statement, table) for statement in reversed(body.statements))
+
+            case Function() as function:
+                function.symbol = table.lookup(function.name)
+                function.scope = table.get_context(function.name)
+                stack.append((function.body, function.scope))
+
+            case VariableDeclaration() as variable_declaration:
+                variable_declaration.symbol = table.lookup(variable_declaration.name)
+                stack.append((variable_declaration.value, table))
+
+            case Import() as import_statement:
+                import_statement.symbols = [
+                    table.lookup(function.name) for function in import_statement.interface or []
+                ]
+
+            case Load() as load:
+                load.symbol = table.lookup(load.name)
+
+            case Store() as store:
+                store.symbol = table.lookup(store.name)
+                stack.append((store.value, table))
+
+            case Call() as call:
+                if call.name not in table.c_globals:
+                    call.symbol = table.lookup(call.name)
+                    function_type: FunctionType = call.symbol.type  # type: ignore
+                    # the caller's symbols stored into the callee's environment
+                    call.environment = [
+                        table.lookup(parameter.name)
+                        for parameter in function_type.closure_parameters
+                    ]
+                stack.extend((argument, table) for argument in reversed(call.arguments))
+
+            case Operator() as operator:
+                stack.append((operator.right, table))
+                stack.append((operator.left, table))
+
+            case Return() as return_statement:
+                stack.append((return_statement.value, table))
+
+            case If() as if_statement:
+                if if_statement.otherwise:
+                    stack.append((if_statement.otherwise, table))
+                stack.append((if_statement.then, table))
+                stack.append((if_statement.condition, table))
+
+            case While() as while_statement:
+                stack.append((while_statement.body, table))
+                stack.append((while_statement.condition, table))
+            case _:
+                pass
@@ -0,0 +1,189 @@
+"""Compile daemon, `python -m mylang serve`.
+
+Keeps one process with the compiler imported, the parser tables loaded
+and LLVM initialized, and runs the CLI for the requests of
+`mylang.client` on a Unix domain socket. Connections are served
+concurrently by asyncio; the requests themselves run one at a time in a
+worker thread, because the CLI works with process wide state (the working
+directory, the output file descriptors of `--run`). The requests with
+`--run` execute the program in a forked child, so a program that crashes
+only takes the child down.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from mylang.client import FORWARDED_ENVIRONMENT, default_socket_path
+
+
+def warm_up():
+    """Pay the start up costs once: imports, parser tables, LLVM targets."""
+    from mylang.compiler import compile_code
+    from mylang.jit import load_libc
+    from mylang.parser.code_parser import CodeParser
+    from mylang.target import create_target_machine, initialize_llvm
+
+    initialize_llvm()
+    load_libc()
+    create_target_machine()
+    for lexer, parser in (("sly", "sly"), ("fast", "pratt")):
+        compile_code("print(1);", code_parser=CodeParser(lexer, parser))  # type: ignore
+
+
+def execute(message: Dict) -> Dict:
+    """Run the CLI for one request, capturing its output and exit code."""
+    argv: List[str] = list(message.get("argv", []))
+    if argv[:1] == ["serve"]:
+        return {"status": 2, "stdout": "", "stderr": "mylang serve: the daemon is already running\n"}
+    if argv[:1] == ["repl"]:
+        return {"status": 2, "stdout": "", "stderr": "mylang serve: the repl is interactive, run it with python -m mylang repl\n"}
+
+    # the programs of --run print through the C library, straight to fd 1
+    with tempfile.TemporaryFile() as program_output:
+        if "--run" in argv:
+            # a crashing program (a stack overflow) must not take the daemon down
+            response = execute_forked(message, program_output)
+        else:
+            response = run_cli(message, program_output)
+        program_output.seek(0)
+        output = program_output.read().decode("utf8", "replace")
+    response["stdout"] = output + response["stdout"]
+    return response
+
+
+def execute_forked(message: Dict, program_output) -> Dict:
+    """`run_cli` in a child process, which inherits the warm state."""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        try:
+            with os.fdopen(write_end, "w") as reply:
+                json.dump(run_cli(message, program_output), reply)
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as reply:
+        response = reply.read()
+    _, wait_status = os.waitpid(pid, 0)
+    if response:
+        return json.loads(response)
+    if os.WIFSIGNALED(wait_status):
+        signal_number = os.WTERMSIG(wait_status)
+        # the exit code a shell reports for a killed process
+        return {
+            "status": 128 + signal_number,
+            "stdout": "",
+            "stderr": f"mylang serve: the program was killed by {signal.Signals(signal_number).name}\n",
+        }
+    return {"status": os.WEXITSTATUS(wait_status) or 1, "stdout": "", "stderr": ""}
+
+
+def run_cli(message: Dict, program_output) -> Dict:
+    """Run the CLI with fd 1 on `program_output`, the response without the
+    program's output."""
+    from mylang.__main__ import main as cli_main
+    from mylang.jit import flush_c_stdout
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    cwd = os.getcwd()
+    environment = {name: os.environ.get(name) for name in FORWARDED_ENVIRONMENT}
+    saved_stdout = os.dup(1)
+    try:
+        os.chdir(message.get("cwd") or cwd)
+        for name in FORWARDED_ENVIRONMENT:
+            os.environ.pop(name, None)
+        os.environ.update(message.get("environment", {}))
+        os.dup2(program_output.fileno(), 1)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                status = cli_main(list(message.get("argv", []))) or 0
+            except SystemExit as exit:
+                status = exit.code if isinstance(exit.code, int) else 1
+            except Exception:
+                traceback.print_exc()
+                status = 1
+    finally:
+        flush_c_stdout()
+        os.dup2(saved_stdout, 1)
+        os.close(saved_stdout)
+        os.chdir(cwd)
+        for name, value in environment.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return {"status": status, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+class CompileServer:
+    def __init__(self, socket_path: Optional[str] = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.executor = ThreadPoolExecutor(1)
+        self.requests = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while line := await reader.readline():
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    response = {"status": 2, "stdout": "", "stderr": "mylang serve: malformed request\n"}
+                else:
+                    response = await loop.run_in_executor(self.executor, execute, message)
+                    self.requests += 1
+                writer.write(json.dumps(response).encode("utf8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            try:
+                connection.connect(self.socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+                return
+        raise Exception(f"A compile daemon is already listening on {self.socket_path}")
+
+    async def serve(self):
+        self.remove_stale_socket()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        print(f"mylang serve: listening on {self.socket_path}", file=sys.stderr)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.socket_path)
+            self.executor.shutdown()
+            print(f"mylang serve: stopped after {self.requests} requests", file=sys.stderr)
+
+
+def serve_main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog='mylang serve', description='Compile daemon for mylang.client')
+    parser.add_argument('--socket', default=default_socket_path(), help='Path of the Unix domain socket (default: $MYLANG_SOCKET, or mylang-<uid>.sock in $XDG_RUNTIME_DIR or the temporary directory)')
+    args = parser.parse_args(argv)
+    warm_up()
+    asyncio.run(CompileServer(args.socket).serve())
+    return 0
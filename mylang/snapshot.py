@@ -0,0 +1,359 @@
+"""Binary snapshots of a parsed and resolved program.
+
+A snapshot holds the AST as an `AstArena` and the resolved `SymbolTable`,
+so tools that analyze the same program over and over can skip the parser
+and the symbol passes. The file layout is:
+
+    header      magic, format version, byte order, source hash, and the
+                offset and length of every section
+    arrays      the arena's node arrays, raw and 8 byte aligned
+    tables      `marshal` blob with the names, types, parameter lists,
+                constants, `@memo` annotations and the symbol tables
+
+`load_snapshot` maps the file and the node arrays are memoryviews over the
+mapping, so loading allocates only the (small) tables. A loaded arena is
+read only.
+"""
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+
+from llvmlite import ir
+
+from mylang.ast.arena import AstArena
+from mylang.ast.ast_objects import (
+    BoolType,
+    FunctionType,
+    IntType,
+    Memo,
+    MyLangType,
+    NullType,
+    Parameter,
+)
+from mylang.cache import compiler_version
+from mylang.parser.code_parser import CodeParser
+from mylang.symbol_table import Symbol, SymbolTable
+from mylang.target import TargetOptions
+
+MAGIC = b"MYLSNAP\x00"
+FORMAT_VERSION = 2
+
+# (attribute, typecode) of the arena arrays, in file order
+ARRAYS = [
+    ("kinds", "B"),
+    ("names", "i"),
+    ("types", "i"),
+    ("values", "q"),
+    ("child_starts", "i"),
+    ("child_counts", "i"),
+    ("children", "i"),
+    ("statements", "i"),
+]
+# magic, format version, little endian flag, sha256 of the source, offset
+# and item count of every array, offset and size of the tables blob
+HEADER = struct.Struct("<8sHB32s" + "QQ" * len(ARRAYS) + "QQ")
+ALIGNMENT = 8
+
+LOAD_TYPES = ["global", "argument", "local", "dereference"]
+
+
+class TypeTag(IntEnum):
+    INT = 0
+    BOOL = 1
+    NULL = 2
+    FUNCTION = 3
+
+
+def source_hash(code: str) -> bytes:
+    digest = hashlib.sha256(compiler_version().encode("utf8") + b"\x00")
+    digest.update(code.encode("utf8"))
+    return digest.digest()
+
+
+@dataclass
+class Snapshot:
+    arena: AstArena
+    symbol_table: SymbolTable
+    source_hash: bytes
+
+    def to_ir(self, target_options: Optional[TargetOptions] = None, fold: bool = True) -> ir.Module:
+        from mylang.compiler import compile_arena
+
+        return compile_arena(self.arena, self.symbol_table, target_options, fold)
+
+
+def create_snapshot(code: str, code_parser: Optional[CodeParser] = None) -> Snapshot:
+    from mylang.compiler import resolve_arena
+
+    arena = (code_parser or CodeParser()).parse_arena(code)
+    return Snapshot(arena, resolve_arena(arena), source_hash(code))
+
+
+class TypeEncoder:
+    """Numbers the types and parameter lists, shared objects stay shared."""
+
+    def __init__(self):
+        self.types: List[tuple] = []
+        self.parameter_lists: List[list] = []
+        self._type_index: Dict[int, int] = {}
+        self._parameter_list_index: Dict[int, int] = {}
+
+    def type(self, value_type: MyLangType) -> int:
+        index = self._type_index.get(id(value_type))
+        if index is not None:
+            return index
+        match value_type:
+            case IntType():
+                record: tuple = (TypeTag.INT.value,)
+            case BoolType():
+                record = (TypeTag.BOOL.value,)
+            case NullType():
+                record = (TypeTag.NULL.value,)
+            case FunctionType() as function_type:
+                # the nested types get their indices first
+                record = (
+                    TypeTag.FUNCTION.value,
+                    self.parameter_list(function_type.parameters),
+                    self.type(function_type.return_type),
+                    self.parameter_list(function_type.closure_parameters),
+                )
+            case _:
+                raise Exception(f"Cannot store type {value_type} in a snapshot")
+        index = self._type_index[id(value_type)] = len(self.types)
+        self.types.append(record)
+        return index
+
+    def parameter_list(self, parameters: List[Parameter]) -> int:
+        index = self._parameter_list_index.get(id(parameters))
+        if index is not None:
+            return index
+        record = [(parameter.name, self.type(parameter.value_type)) for parameter in parameters]
+        index = self._parameter_list_index[id(parameters)] = len(self.parameter_lists)
+        self.parameter_lists.append(record)
+        return index
+
+
+def decode_types(
+    type_records: List[tuple], parameter_list_records: List[list]
+) -> Tuple[List[MyLangType], List[List[Parameter]]]:
+    # records only refer to earlier types, parameter lists are built on demand
+    types: List[MyLangType] = []
+    parameter_lists: List[Optional[List[Parameter]]] = [None] * len(parameter_list_records)
+
+    def parameter_list(index: int) -> List[Parameter]:
+        parameters = parameter_lists[index]
+        if parameters is None:
+            parameters = parameter_lists[index] = [
+                Parameter(name, types[type_index])
+                for name, type_index in parameter_list_records[index]
+            ]
+        return parameters
+
+    for record in type_records:
+        match record[0]:
+            case TypeTag.INT:
+                types.append(IntType())
+            case TypeTag.BOOL:
+                types.append(BoolType())
+            case TypeTag.NULL:
+                types.append(NullType())
+            case TypeTag.FUNCTION:
+                _, parameters, return_type, closure_parameters = record
+                types.append(
+                    FunctionType(
+                        parameter_list(parameters),
+                        types[return_type],
+                        parameter_list(closure_parameters),
+                    )
+                )
+    return types, [parameter_list(index) for index in range(len(parameter_list_records))]
+
+
+def encode_tables(snapshot: Snapshot) -> bytes:
+    arena = snapshot.arena
+    encoder = TypeEncoder()
+    arena_types = [encoder.type(value_type) for value_type in arena.type_table]
+    arena_parameter_lists = [
+        encoder.parameter_list(parameters) for parameters in arena.parameter_lists
+    ]
+
+    tables = []
+    table_index: Dict[int, int] = {}
+    for table in snapshot.symbol_table.walk():
+        parent = table._parent
+        table_index[id(table)] = len(tables)
+        tables.append(
+            (
+                table.context_name,
+                table_index[id(parent)] if parent else -1,
+                [
+                    (
+                        symbol.name,
+                        encoder.type(symbol.type),
+                        LOAD_TYPES.index(symbol.load_type),
+                        -1 if symbol.arg_index is None else symbol.arg_index,
+                        -1 if symbol.slot is None else symbol.slot,
+                    )
+                    for symbol in table.symbols.values()
+                ],
+            )
+        )
+
+    return marshal.dumps(
+        (
+            arena.name,
+            arena.strings,
+            [str(constant) for constant in arena.constants],
+            encoder.types,
+            encoder.parameter_lists,
+            arena_types,
+            arena_parameter_lists,
+            [(index, memo.capacity, memo.policy) for index, memo in arena.memos.items()],
+            tables,
+        )
+    )
+
+
+def decode_symbol_tables(tables: list, types: List[MyLangType]) -> SymbolTable:
+    decoded: List[SymbolTable] = []
+    for context_name, parent_index, symbols in tables:
+        parent = decoded[parent_index] if parent_index >= 0 else None
+        table = SymbolTable(context_name, parent)
+        if parent:
+            parent._contexts[context_name] = table
+        for name, type_index, load_type, arg_index, slot in symbols:
+            symbol = Symbol(
+                name,
+                types[type_index],
+                LOAD_TYPES[load_type],  # type: ignore
+                None if arg_index < 0 else arg_index,
+            )
+            symbol.slot = None if slot < 0 else slot
+            table.symbols[name] = symbol
+        decoded.append(table)
+    return decoded[0]
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def dump_snapshot(snapshot: Snapshot) -> bytes:
+    parts: List[bytes] = []
+    offset = HEADER.size + _padding(HEADER.size)
+    sections: List[int] = []
+    for name, typecode in ARRAYS:
+        data = getattr(snapshot.arena, name)
+        if isinstance(data, memoryview):
+            data = array(typecode, data)
+        raw = data.tobytes()
+        sections += [offset, len(data)]
+        parts.append(raw + bytes(_padding(len(raw))))
+        offset += len(parts[-1])
+    tables = encode_tables(snapshot)
+    sections += [offset, len(tables)]
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, sys.byteorder == "little", snapshot.source_hash, *sections
+    )
+    return b"".join([header, bytes(_padding(HEADER.size))] + parts + [tables])
+
+
+def save_snapshot(snapshot: Snapshot, path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(file_descriptor, "wb") as f:
+            f.write(dump_snapshot(snapshot))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def read_header(buffer) -> tuple:
+    if len(buffer) < HEADER.size:
+        raise Exception("Snapshot is truncated")
+    magic, version, little_endian, code_hash, *sections = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise Exception("Not a mylang snapshot")
+    if version != FORMAT_VERSION:
+        raise Exception(f"Unsupported snapshot version {version}")
+    if little_endian != (sys.byteorder == "little"):
+        raise Exception("Snapshot was written on a machine with another byte order")
+    ends = [
+        sections[2 * index] + sections[2 * index + 1] * array(typecode).itemsize
+        for index, (_, typecode) in enumerate(ARRAYS)
+    ]
+    ends.append(sections[-2] + sections[-1])
+    if max(ends) > len(buffer):
+        raise Exception("Snapshot is truncated")
+    return code_hash, sections
+
+
+def load_snapshot_buffer(buffer) -> Snapshot:
+    """Load a snapshot from a bytes-like object, the arena arrays are views
+    into it."""
+    code_hash, sections = read_header(buffer)
+    view = memoryview(buffer)
+    arena = AstArena()
+    for index, (name, typecode) in enumerate(ARRAYS):
+        offset, count = sections[2 * index], sections[2 * index + 1]
+        itemsize = array(typecode).itemsize
+        setattr(arena, name, view[offset : offset + count * itemsize].cast(typecode))
+
+    tables_offset, tables_size = sections[-2:]
+    (
+        arena.name,
+        arena.strings,
+        constants,
+        type_records,
+        parameter_list_records,
+        arena_types,
+        arena_parameter_lists,
+        memos,
+        tables,
+    ) = marshal.loads(view[tables_offset : tables_offset + tables_size])
+    types, parameter_lists = decode_types(type_records, parameter_list_records)
+    arena.constants = [int(constant) for constant in constants]
+    arena.type_table = [types[index] for index in arena_types]
+    arena.parameter_lists = [parameter_lists[index] for index in arena_parameter_lists]
+    arena.memos = {index: Memo(capacity, policy) for index, capacity, policy in memos}
+    return Snapshot(arena, decode_symbol_tables(tables, types), code_hash)
+
+
+def load_snapshot(path: str) -> Snapshot:
+    with open(path, "rb") as f:
+        # the mapping stays open as long as the arena's views refer to it
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return load_snapshot_buffer(buffer)
+
+
+def load_or_create_snapshot(
+    code: str, path: str, code_parser: Optional[CodeParser] = None
+) -> Tuple[Snapshot, bool]:
+    """The snapshot of `code` stored at `path`, created and saved when the
+    file is missing, unreadable or was taken from another source. Returns
+    the snapshot and whether it was loaded."""
+    try:
+        snapshot = load_snapshot(path)
+        if snapshot.source_hash == source_hash(code):
+            return snapshot, True
+    except Exception:
+        # missing, truncated, stale or from another format version
+        pass
+
+    snapshot = create_snapshot(code, code_parser)
+    try:
+        save_snapshot(snapshot, path)
+    except OSError:
+        pass
+    return snapshot, False
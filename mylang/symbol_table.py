@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, List, Literal, Optional, Tuple
+from typing import Dict, Iterator, List, Literal, Optional, Tuple
 
 from mylang.ast.ast_objects import (
     Body,
@@ -7,6 +7,7 @@ from mylang.ast.ast_objects import (
     Function,
     FunctionType,
     If,
+    Import,
     MyLangType,
     Load,
     Module,
@@ -17,6 +18,7 @@ from mylang.ast.ast_objects import (
     Store,
     Term,
     VariableDeclaration,
+    While,
 )
 from mylang.parser.code_parser import CodeParser
 
@@ -31,6 +33,8 @@ class Symbol:
     load_type: LoadType
     arg_index: Optional[int] = None
     llvm_lite_pointer: Optional[object] = None
+    # argument, environment or variable index, set by mylang.resolver
+    slot: Optional[int] = None
 
     def copy(self) -> "Symbol":
         return Symbol(self.name, self.type, self.load_type)
@@ -65,7 +69,7 @@ class SymbolTable:
     def context_type(self) -> Literal["module", "function", "closure"]:
         if self.context_name == self.module_context_name:
             return "module"
-        if len(self.dereference_variables) > 0:
+        if any(symbol.load_type == "dereference" for symbol in self.symbols.values()):
             return "closure"
 
         return "function"
@@ -88,12 +92,12 @@ class SymbolTable:
             self._contexts[name] = SymbolTable(name, self)
 
     def lookup(self, name: str) -> Symbol:
-        symbol = self.symbols.get(name)
-        if symbol:
-            return symbol
-
-        if self._parent:
-            return self._parent.lookup(name)
+        table: Optional[SymbolTable] = self
+        while table:
+            symbol = table.symbols.get(name)
+            if symbol:
+                return symbol
+            table = table._parent
 
         raise Exception(f"Symbol {name} not found in {self.context_name}")
 
@@ -106,108 +110,142 @@ class SymbolTable:
     def reference(self, name: str) -> Symbol:
         if name in self.c_globals:
             return Symbol(name, NullType(), "global")
-        if name == self.context_name:
-            return self.lookup(name)
-        
-        symbol = self.symbols.get(name)
-        if symbol:
-            return symbol
 
-        if self._parent:
-            symbol = self._parent.reference(name)
-            if symbol.load_type != "global":
-                clojure_symbol = symbol.copy()
-                clojure_symbol.load_type = "dereference"
-                function_symbol = self.lookup(self.context_name)
-                function_symbol.type.closure_parameters.append( # type: ignore
-                    Parameter(name, clojure_symbol.type)
-                )
-                self.symbols[name] = clojure_symbol
-                return clojure_symbol.copy()
+        # walk up to the declaring context, then capture the symbol in every
+        # context in between, outermost first
+        capturing: List[SymbolTable] = []
+        table = self
+        while True:
+            if name == table.context_name:
+                symbol = table.lookup(name)
+                break
+            symbol = table.symbols.get(name)
+            if symbol:
+                break
+            if not table._parent:
+                raise Exception(f"Symbol {name} was not declared")
+            capturing.append(table)
+            table = table._parent
+
+        if symbol.load_type == "global":
             return symbol
-
-        raise Exception(f"Symbol {name} was not declared")
+        for table in reversed(capturing):
+            clojure_symbol = symbol.copy()
+            clojure_symbol.load_type = "dereference"
+            function_symbol = table.lookup(table.context_name)
+            function_symbol.type.closure_parameters.append( # type: ignore
+                Parameter(name, clojure_symbol.type)
+            )
+            table.symbols[name] = clojure_symbol
+            symbol = clojure_symbol.copy()
+        return symbol
+
+    def walk(self) -> Iterator["SymbolTable"]:
+        """This table and all nested contexts, depth first in declaration order."""
+        stack: List[SymbolTable] = [self]
+        while stack:
+            table = stack.pop()
+            yield table
+            stack.extend(reversed(table._contexts.values()))
 
     def get_all_functions(self, functions: Optional[List[Tuple[str, FunctionType]]]) -> List[Tuple[str, FunctionType]]:
         functions = []
-        for symbol in self.symbols.values():
-            if isinstance(symbol.type, FunctionType):
-                functions.append((symbol.name, symbol.type))
-        for context in self._contexts.values():
-            functions.extend(context.get_all_functions(functions))
-        
+        for table in self.walk():
+            for symbol in table.symbols.values():
+                if isinstance(symbol.type, FunctionType):
+                    functions.append((symbol.name, symbol.type))
+
         return functions
     
     def compute_closures_parameters(self):
-        try:
-            context_function = self.lookup(self.context_name).type
-        except:
-            context_function = None
-
-        if isinstance(context_function, FunctionType):     
-            closure_parameters: list[Parameter] = []   
-            for symbol in self.symbols.values():
-                if symbol.load_type == "dereference":
-                    closure_parameters.append(Parameter(symbol.name, symbol.type))
-            context_function.closure_parameters = closure_parameters
-        
-        for context in self._contexts.values():
-            context.compute_closures_parameters()
+        for table in self.walk():
+            try:
+                context_function = table.lookup(table.context_name).type
+            except:
+                context_function = None
+
+            if isinstance(context_function, FunctionType):     
+                closure_parameters: list[Parameter] = []   
+                for symbol in table.symbols.values():
+                    if symbol.load_type == "dereference":
+                        closure_parameters.append(Parameter(symbol.name, symbol.type))
+                context_function.closure_parameters = closure_parameters
 
 
 def create_symbol_table(
     ast: Term, symbol_table: SymbolTable | None = None
 ) -> SymbolTable:
+    """Declare and resolve every name in `ast`.
+
+    Uses an explicit stack of (term, table) instead of recursion, so the
+    nesting depth of the program is not limited by the python stack.
+    """
     symbol_table = symbol_table or SymbolTable("module")
-    match ast:
-        case Module() as module:
-            symbol_table = create_symbol_table(module.body, symbol_table)
-            return symbol_table
-
-        case Body() as body:
-            for statement in body.statements:
-                symbol_table = create_symbol_table(statement, symbol_table)
-
-        case Function() as function:
-            symbol_table.declare(function.name, function.value_type)
-            function_symbol_table = symbol_table.get_context(function.name)
-            for index, argument in enumerate(function.parameters):
-                function_symbol_table.declare(
-                    argument.name, argument.value_type, "argument", index
+    stack: List[Tuple[Term, SymbolTable]] = [(ast, symbol_table)]
+    while stack:
+        term, table = stack.pop()
+        # children are pushed in reverse, so they are visited in source order
+        match term:
+            case Module() as module:
+                stack.append((module.body, table))
+
+            case Body() as body:
+                stack.extend((statement, table) for statement in reversed(body.statements))
+
+            case Function() as function:
+                table.declare(function.name, function.value_type)
+                function_symbol_table = table.get_context(function.name)
+                for index, argument in enumerate(function.parameters):
+                    function_symbol_table.declare(
+                        argument.name, argument.value_type, "argument", index
+                    )
+
+                stack.append((function.body, function_symbol_table))
+
+            case VariableDeclaration() as variable_declaration:
+                table.declare(
+                    variable_declaration.name, variable_declaration.value_type
                 )
 
-            create_symbol_table(function.body, function_symbol_table)
-
-        case VariableDeclaration() as variable_declaration:
-            symbol_table.declare(
-                variable_declaration.name, variable_declaration.value_type
-            )
-
-        case Load() as load:
-            symbol_table.reference(load.name)
-
-        case Store() as store:
-            symbol_table.reference(store.name)
-
-        case Call() as call:
-            symbol_table.reference(call.name)
-            for argument in call.arguments:
-                create_symbol_table(argument, symbol_table)
-
-        case Operator() as operator:
-            create_symbol_table(operator.left, symbol_table)
-            create_symbol_table(operator.right, symbol_table)
-
-        case Return() as return_statement:
-            create_symbol_table(return_statement.value, symbol_table)
-
-        case If() as if_statement:
-            create_symbol_table(if_statement.condition, symbol_table)
-            create_symbol_table(if_statement.then, symbol_table)
-            if if_statement.otherwise:
-                create_symbol_table(if_statement.otherwise, symbol_table)
-        case _:
-            pass
+            case Import() as import_statement:
+                if table.context_name != table.module_context_name:
+                    raise Exception(f"Import of {import_statement.module} is only allowed at the top level")
+                if import_statement.interface is None:
+                    raise Exception(
+                        f"Module {import_statement.module} is not loaded, "
+                        "programs with imports are compiled with `mylang build`"
+                    )
+                for function in import_statement.interface:
+                    table.declare(function.name, function.value_type)
+
+            case Load() as load:
+                table.reference(load.name)
+
+            case Store() as store:
+                table.reference(store.name)
+
+            case Call() as call:
+                table.reference(call.name)
+                stack.extend((argument, table) for argument in reversed(call.arguments))
+
+            case Operator() as operator:
+                stack.append((operator.right, table))
+                stack.append((operator.left, table))
+
+            case Return() as return_statement:
+                stack.append((return_statement.value, table))
+
+            case If() as if_statement:
+                if if_statement.otherwise:
+                    stack.append((if_statement.otherwise, table))
+                stack.append((if_statement.then, table))
+                stack.append((if_statement.condition, table))
+
+            case While() as while_statement:
+                stack.append((while_statement.body, table))
+                stack.append((while_statement.condition, table))
+            case _:
+                pass
 
     return symbol_table
 
@@ -0,0 +1,108 @@
+"""Self-recursive calls in tail position, lowered to loops.
+
+Recursion is the only way to loop, so a function that returns a call of
+itself would grow the native stack on every iteration. Code generation
+turns such a function into a loop instead: the parameters live in stack
+slots, and `return f(args);` stores the new arguments and branches back to
+the top of the body.
+
+`return x op f(args);`, with an associative and commutative `op`, becomes
+a loop too: the function gets an accumulator, starting at the identity of
+`op`. The recursive return folds `x` into it and loops, every other return
+`return value;` returns `accumulator op value`. So `n * fact(n - 1)`
+multiplies into the accumulator and `fib(n - 1) + fib(n - 2)` loops on its
+second call. `f(args) op x` is taken as well when `x` makes no calls, as
+evaluating it before the arguments then makes no difference.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from llvmlite import ir
+
+from mylang.ast.ast_objects import (
+    BinOpName,
+    BoolType,
+    Call,
+    Function,
+    If,
+    IntType,
+    Operator,
+    Return,
+    Term,
+    While,
+)
+
+# identity of each operator that can accumulate
+ACCUMULATORS: Dict[BinOpName, int] = {"add": 0, "mul": 1, "or": 0, "xor": 0, "and": -1}
+
+
+@dataclass
+class TailLoop:
+    # id of every return turned into a jump: the self call and the operand
+    # folded into the accumulator, if any
+    calls: Dict[int, Tuple[Call, Optional[Term]]]
+    # the operator of the accumulating returns, None without accumulator
+    operator: Optional[Operator] = None
+    # set by code generation
+    block: Optional[ir.Block] = None
+    parameters: List[ir.Value] = field(default_factory=list)
+    accumulator: Optional[ir.Value] = None
+
+
+def own_returns(function: Function) -> List[Return]:
+    """The return statements of the function, not of its nested functions."""
+    returns: List[Return] = []
+    stack: List[Term] = list(function.body.statements)
+    while stack:
+        match stack.pop():
+            case Return() as return_statement:
+                returns.append(return_statement)
+            case If() as if_statement:
+                stack.extend(if_statement.then.statements)
+                if if_statement.otherwise:
+                    stack.extend(if_statement.otherwise.statements)
+            case While() as while_statement:
+                stack.extend(while_statement.body.statements)
+    return returns
+
+
+def makes_calls(term: Term) -> bool:
+    stack = [term]
+    while stack:
+        match stack.pop():
+            case Call():
+                return True
+            case Operator() as operator:
+                stack.append(operator.left)
+                stack.append(operator.right)
+    return False
+
+
+def find_tail_loop(function: Function) -> Optional[TailLoop]:
+    """How to lower `function` to a loop, None if it has no self call in
+    tail position. Needs the resolved symbols."""
+
+    def is_self_call(term: Term) -> bool:
+        return isinstance(term, Call) and term.symbol is function.symbol
+
+    calls: Dict[int, Tuple[Call, Optional[Term]]] = {}
+    accumulating: Dict[int, Tuple[Call, Operator, Term]] = {}
+    for return_statement in own_returns(function):
+        value = return_statement.value
+        if is_self_call(value):
+            calls[id(return_statement)] = (value, None)  # type: ignore
+        elif isinstance(value, Operator) and value.op in ACCUMULATORS:
+            if is_self_call(value.right):
+                accumulating[id(return_statement)] = (value.right, value, value.left)  # type: ignore
+            elif is_self_call(value.left) and not makes_calls(value.right):
+                accumulating[id(return_statement)] = (value.left, value, value.right)  # type: ignore
+
+    operator: Optional[Operator] = None
+    # one accumulator, holding values of the function's return type
+    operators = {node.op for _, node, _ in accumulating.values()}
+    if len(operators) == 1 and isinstance(function.return_type, (IntType, BoolType)):
+        for key, (call, operator, operand) in accumulating.items():
+            calls[key] = (call, operand)
+    if not calls:
+        return None
+    return TailLoop(calls, operator)
@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from llvmlite import binding, ir
+
+_llvm_initialized = False
+
+
+def initialize_llvm():
+    global _llvm_initialized
+    if _llvm_initialized:
+        return
+    binding.initialize()
+    # every target, for cross compilation with --target
+    binding.initialize_all_targets()
+    binding.initialize_all_asmprinters()
+    binding.initialize_native_target()
+    binding.initialize_native_asmprinter()
+    _llvm_initialized = True
+
+
+@dataclass
+class TargetOptions:
+    """Code generation target, empty values mean the LLVM defaults.
+
+    `cpu="native"` selects the host CPU and, unless `features` is given,
+    all the features it supports.
+    """
+
+    triple: Optional[str] = None
+    cpu: str = ""
+    features: str = ""
+
+    def resolve(self) -> "TargetOptions":
+        initialize_llvm()
+        triple = self.triple or binding.get_default_triple()
+        cpu = self.cpu
+        features = self.features
+        if cpu == "native":
+            cpu = binding.get_host_cpu_name()
+            if not features:
+                features = binding.get_host_cpu_features().flatten()
+        return TargetOptions(triple, cpu, features)
+
+
+def create_target_machine(
+    target_options: Optional[TargetOptions] = None, reloc: str = "default"
+) -> binding.TargetMachine:
+    target_options = (target_options or TargetOptions()).resolve()
+    target = binding.Target.from_triple(target_options.triple)
+    return target.create_target_machine(
+        cpu=target_options.cpu, features=target_options.features, reloc=reloc
+    )
+
+
+def set_module_target(module_ir: ir.Module, target_machine: binding.TargetMachine):
+    module_ir.triple = target_machine.triple
+    module_ir.data_layout = str(target_machine.target_data)
+
+
+def parse_module(module_ir: ir.Module) -> binding.ModuleRef:
+    initialize_llvm()
+    llvm_module = binding.parse_assembly(str(module_ir))
+    llvm_module.verify()
+    return llvm_module
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# ten times the python recursion limit; the JIT takes minutes at 10^5
+# (see benchmarks/deep_programs.py for the compile times at that depth)
+DEPTH = 10_000
+
+
+def operator_chain(depth: int) -> str:
+    # a global operand, so the chain is not folded away before code generation
+    chain = " + ".join("a" for _ in range(depth))
+    return f"a: int = 1;\nprint({chain});\n"
+
+
+def nested_functions(depth: int) -> str:
+    # every function calls the one it defines, the innermost returns the
+    # `x` it captures through all of them
+    opening = "function f0(x: int) -> int {\n" + "".join(
+        f"function f{index}() -> int {{\n" for index in range(1, depth)
+    )
+    closing = "return x;\n}\n" + "".join(
+        f"return f{index}();\n}}\n" for index in reversed(range(1, depth))
+    )
+    return f"{opening}{closing}print(f0(7));\n"
+
+
+def nested_ifs(depth: int) -> str:
+    opening = f"if (a < {depth}) {{\na = a + 1;\n" * depth
+    closing = "}\n" * depth
+    return f"a: int = 0;\n{opening}print(a);\n{closing}"
+
+
+def run(source: str, lexer: str, parser: str, tmp_path) -> list:
+    path = tmp_path / "deep.mylang"
+    path.write_text(source)
+    output = subprocess.run(
+        [sys.executable, "-m", "mylang", str(path), "--run", "--lexer", lexer, "--parser", parser],
+        env=dict(os.environ, PYTHONPATH=ROOT), check=True, capture_output=True, text=True,
+    ).stdout
+    return output.split()
+
+
+@pytest.mark.parametrize(
+    "generate, expected",
+    [(operator_chain, DEPTH), (nested_functions, 7), (nested_ifs, DEPTH)],
+    ids=["operator chain", "nested functions", "nested ifs"],
+)
+@pytest.mark.parametrize("lexer, parser", [("sly", "sly"), ("fast", "pratt")])
+def test_deep_program(generate, expected, lexer, parser, tmp_path):
+    assert run(generate(DEPTH), lexer, parser, tmp_path) == [str(expected)]
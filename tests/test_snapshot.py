@@ -0,0 +1,194 @@
+import os
+import sys
+
+import pytest
+
+from mylang.ast.ast_objects import Function, Memo
+from mylang.compiler import compile_code
+from mylang.parser.code_parser import CodeParser
+from mylang.snapshot import (
+    FORMAT_VERSION,
+    HEADER,
+    create_snapshot,
+    dump_snapshot,
+    load_or_create_snapshot,
+    load_snapshot,
+    load_snapshot_buffer,
+    read_header,
+    save_snapshot,
+)
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "examples", "example.mylang")
+
+LARGE_LITERALS = """big: int = 9223372036854775807;
+small: int = 0 - 9223372036854775807;
+function shift(n: int) -> int {
+    return n + 4611686018427387904;
+}
+print(shift(big));
+print(small);
+"""
+
+MEMO_AND_CLOSURES = """@memo
+function fib(n: int) -> int {
+    if (n < 2) {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+@memo(64, keep)
+function binomial(n: int, k: int) -> int {
+    if (k == 0) {
+        return 1;
+    }
+    if (k == n) {
+        return 1;
+    }
+    return binomial(n - 1, k - 1) + binomial(n - 1, k);
+}
+function counter(start: int) -> int {
+    count: int = start;
+    function step() -> int {
+        count = count + 1;
+        return count;
+    }
+    step();
+    return step();
+}
+size: int = 20;
+print(fib(size), binomial(size, 10), counter(size));
+"""
+
+
+def example_code() -> str:
+    with open(EXAMPLE) as f:
+        return f.read()
+
+
+def describe_tables(symbol_table) -> list:
+    return [
+        (
+            table.context_name,
+            [
+                (symbol.name, symbol.load_type, symbol.arg_index, symbol.slot, repr(symbol.type))
+                for symbol in table.symbols.values()
+            ],
+        )
+        for table in symbol_table.walk()
+    ]
+
+
+def round_trip(code: str, code_parser=None):
+    snapshot = create_snapshot(code, code_parser)
+    return snapshot, load_snapshot_buffer(dump_snapshot(snapshot))
+
+
+@pytest.mark.parametrize(
+    "code", [example_code(), LARGE_LITERALS, MEMO_AND_CLOSURES], ids=["example", "large literals", "memo and closures"]
+)
+@pytest.mark.parametrize("lexer, parser", [("sly", "sly"), ("fast", "pratt")])
+def test_round_trip(code, lexer, parser):
+    code_parser = CodeParser(lexer, parser)  # type: ignore
+    snapshot, loaded = round_trip(code, code_parser)
+    assert loaded.source_hash == snapshot.source_hash
+    assert loaded.arena.to_module() == snapshot.arena.to_module() == code_parser.parse(code)
+    assert loaded.arena.memos == snapshot.arena.memos
+    assert describe_tables(loaded.symbol_table) == describe_tables(snapshot.symbol_table)
+    # the arena path, pure calls are not evaluated there
+    expected_ir = str(compile_code(code, code_parser=code_parser, arena=True))
+    assert str(loaded.to_ir()) == str(snapshot.to_ir()) == expected_ir
+
+
+def test_memo_annotations_survive():
+    _, loaded = round_trip(MEMO_AND_CLOSURES)
+    memos = {
+        statement.name: statement.memo
+        for statement in loaded.arena.to_module().body.statements
+        if isinstance(statement, Function)
+    }
+    assert memos == {"fib": Memo(), "binomial": Memo(64, "keep"), "counter": None}
+    ir_text = str(loaded.to_ir())
+    assert '@"fib.memo"' in ir_text and '@"binomial.compute"' in ir_text
+
+
+def test_closure_environment_survives():
+    snapshot, loaded = round_trip(MEMO_AND_CLOSURES)
+    step = loaded.symbol_table.get_context("counter").lookup("step")
+    assert [parameter.name for parameter in step.type.closure_parameters] == ["count"]
+    assert describe_tables(loaded.symbol_table) == describe_tables(snapshot.symbol_table)
+
+
+def test_load_or_create(tmp_path):
+    path = str(tmp_path / "program.snapshot")
+    code = example_code()
+    first, loaded = load_or_create_snapshot(code, path)
+    assert not loaded and os.path.exists(path)
+    second, loaded = load_or_create_snapshot(code, path)
+    assert loaded
+    assert str(second.to_ir()) == str(first.to_ir())
+
+
+def test_stale_source_is_recreated(tmp_path):
+    path = str(tmp_path / "program.snapshot")
+    save_snapshot(create_snapshot("print(1);"), path)
+    snapshot, loaded = load_or_create_snapshot("print(2);", path)
+    assert not loaded
+    assert load_snapshot(path).source_hash == snapshot.source_hash
+    _, loaded = load_or_create_snapshot("print(2);", path)
+    assert loaded
+
+
+def rewrite_header(data: bytes, **fields) -> bytes:
+    magic, version, little_endian, code_hash, *sections = HEADER.unpack_from(data)
+    values = dict(magic=magic, version=version, little_endian=little_endian, code_hash=code_hash)
+    values.update(fields)
+    header = HEADER.pack(values["magic"], values["version"], values["little_endian"], values["code_hash"], *sections)
+    return header + data[HEADER.size:]
+
+
+@pytest.fixture(scope="module")
+def dumped() -> bytes:
+    return dump_snapshot(create_snapshot(example_code()))
+
+
+def test_header_accepts_valid(dumped):
+    code_hash, _ = read_header(dumped)
+    assert code_hash == create_snapshot(example_code()).source_hash
+
+
+@pytest.mark.parametrize("size", [0, HEADER.size - 1])
+def test_header_rejects_short_header(dumped, size):
+    with pytest.raises(Exception, match="truncated"):
+        read_header(dumped[:size])
+
+
+def test_header_rejects_truncated_body(dumped):
+    with pytest.raises(Exception, match="truncated"):
+        read_header(dumped[: len(dumped) - 1])
+    with pytest.raises(Exception, match="truncated"):
+        load_snapshot_buffer(dumped[: HEADER.size + 8])
+
+
+def test_header_rejects_other_files(dumped):
+    with pytest.raises(Exception, match="Not a mylang snapshot"):
+        read_header(rewrite_header(dumped, magic=b"NOTSNAP\x00"))
+
+
+def test_header_rejects_other_versions(dumped):
+    with pytest.raises(Exception, match=f"Unsupported snapshot version {FORMAT_VERSION + 1}"):
+        read_header(rewrite_header(dumped, version=FORMAT_VERSION + 1))
+
+
+def test_header_rejects_other_byte_order(dumped):
+    with pytest.raises(Exception, match="byte order"):
+        read_header(rewrite_header(dumped, little_endian=sys.byteorder != "little"))
+
+
+def test_unreadable_file_is_recreated(tmp_path, dumped):
+    path = str(tmp_path / "program.snapshot")
+    with open(path, "wb") as f:
+        f.write(rewrite_header(dumped, version=FORMAT_VERSION + 1))
+    _, loaded = load_or_create_snapshot(example_code(), path)
+    assert not loaded
+    _, loaded = load_or_create_snapshot(example_code(), path)
+    assert loaded